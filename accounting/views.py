@@ -9,7 +9,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 
 from main import constants
 from main import messages as MSG
-from main.utils import Pagination, logUserActivity, exportAsCsvExcel
+from main.utils import KeysetPage, Pagination, logUserActivity, exportAsCsvExcel
 
 from .filters import BondFilter
 from .forms import AccountForm, BondForm
@@ -76,9 +76,9 @@ def bondListPage(request: HttpRequest) -> HttpResponse:
         except EmptyResultSet:
             MSG.NO_DATA(request)
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1, 10)
-    page_obj: QuerySet[Bond] = pagination.getPageObject()
+    pagination = Pagination(queryset, 10, keyset=True,
+                            cursor=request.GET.get('cursor'))
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
 
     context: dict[str, Any] = {'bondFilter': bondFilter,
@@ -1,5 +1,6 @@
 import logging
 from logging import Logger
+from typing import Any
 
 from django.contrib.auth import get_user, SESSION_KEY
 from django.core.cache import cache
@@ -8,15 +9,14 @@ from django.http import (HttpResponsePermanentRedirect,
                          HttpRequest,
                          Http404)
 from django.shortcuts import redirect
-from django.urls import reverse, resolve
 from django.utils.deprecation import MiddlewareMixin
 
 from main import constants
 from main import messages as MSG
+from main.auth_context import (AuthContext, getAuthContext, getAuthContextKeys,
+                               readAuthContext)
+from main.route_policy import RoutePolicy, getRoutePolicy, isAdminPath
 from main.utils import getClientIp
-from member.models import Person
-
-from .models import CompanyUser
 
 logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
 
@@ -30,52 +30,47 @@ class AllowedUserMiddleware(MiddlewareMixin):
             return HttpResponseForbidden("Access Denied")
 
         if request.user.is_authenticated:
-            requested_page: str = resolve(request.path_info).url_name
+            policy: RoutePolicy = getRoutePolicy(request)
             if not self.isAllowedToAccessAdmin(request):
                 raise Http404
 
-            if requested_page == constants.PAGES.UNAUTHORIZED_PAGE:
+            if policy.url_name == constants.PAGES.UNAUTHORIZED_PAGE:
                 return None
 
             if request.user.is_superuser:
-                if requested_page in constants.NON_STAFF_RESTRICTED_PAGES and requested_page not in constants.STAFF_RESTRICTED_PAGES:
+                if policy.non_staff_only:
                     return redirect(constants.PAGES.INDEX_PAGE)
                 return None
 
+            auth_context: AuthContext = getAuthContext(request)
             if request.user.is_staff:
-                if requested_page in constants.STAFF_PERMISSIONS["COMMON"]:
+                if policy.staff_common:
                     return None
 
-                try:
-                    company_user: CompanyUser = CompanyUser.getCompanyUserByUserObject(
-                        request.user)
-                    if requested_page in constants.RESTRICTED_PAGES and requested_page not in company_user.role.permissions:
-                        logger.warning(
-                            f'The company user {company_user} tried to access non allowed page for this user.')
-                        return redirect(constants.PAGES.UNAUTHORIZED_PAGE)
-                except CompanyUser.DoesNotExist:
+                if not auth_context.has_company_user:
                     MSG.SOMETHING_WRONG(request)
                     logger.warning(
                         f"The staff user [{request.user}] has no company user!!")
                     return redirect(constants.PAGES.LOGOUT)
+                if policy.restricted and policy.url_name not in auth_context.permissions:
+                    logger.warning(
+                        f'The company user {request.user} tried to access non allowed page for this user.')
+                    return redirect(constants.PAGES.UNAUTHORIZED_PAGE)
             else:
-                if requested_page not in constants.RESTRICTED_PAGES:
+                if not policy.restricted:
                     return None
 
-                if requested_page in constants.NON_STAFF_PERMISSIONS["COMMON"]:
+                if policy.non_staff_common:
                     return None
 
-                user_data = Person.getUserData(request.user)
-                has_membership: bool = user_data.get('has_membership')
-
-                if requested_page in constants.NON_STAFF_PERMISSIONS['WITH_MEMBERSHIP_ONLY'] and has_membership:
+                if policy.membership_only and auth_context.has_membership:
                     return None
 
                 return redirect(constants.PAGES.UNAUTHORIZED_PAGE)
         return None
 
     def isAllowedToAccessAdmin(self, request: HttpRequest) -> bool:
-        if request.path.startswith(reverse('admin:index')):
+        if isAdminPath(request):
             if request.user.is_superuser:
                 return True
             else:
@@ -92,10 +87,17 @@ class CacheUserMiddleware(MiddlewareMixin):
         if not hasattr(request, 'session') or not request.session.get(SESSION_KEY):
             return
 
+        # The user and its auth context in one round trip
         CACHED_USER_KEY = "USER:%s" % request.session[SESSION_KEY]
-        request._cached_user = cache.get(CACHED_USER_KEY)
+        cached: dict[str, Any] = cache.get_many(
+            [CACHED_USER_KEY] + getAuthContextKeys(request.session[SESSION_KEY]))
+        auth_context: AuthContext | None = readAuthContext(
+            cached, request.session[SESSION_KEY])
+        if auth_context is not None:
+            request._auth_context = auth_context
+
+        request._cached_user = cached.get(CACHED_USER_KEY)
         if request._cached_user:
-            cache.touch(CACHED_USER_KEY)
             return
 
         request._cached_user = get_user(request)
@@ -1,4 +1,4 @@
-from typing import Set
+from typing import Iterable, Set
 
 from django.contrib.auth.models import Group, User
 from django.core.cache import cache
@@ -18,17 +18,21 @@ class Role(BaseModel):
     def permissions(self) -> Set[str]:
         permissions: Set[str] = cache.get(f'ROLE_{self.id}')
         if not permissions:
-            permissions = set()
             groups: Set[str] = self.groups.all().values_list('name', flat=True)
-            for group in groups:
-                for permission in constants.STAFF_PERMISSIONS[group]:
-                    permissions.add(permission)
-
+            permissions = self.getGroupsPermissions(groups)
             cache.set(f'ROLE_{self.id}', permissions,
                       constants.DEFAULT_CACHE_EXPIRE)
 
         return permissions
 
+    @staticmethod
+    def getGroupsPermissions(groups: Iterable[str]) -> Set[str]:
+        permissions: Set[str] = set()
+        for group in groups:
+            for permission in constants.STAFF_PERMISSIONS[group]:
+                permissions.add(permission)
+        return permissions
+
     def getArStrPermissions(self) -> str:
         permissions: Set[str] = set()
         groups: QuerySet[Group] = self.groups.all()
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from main.security_events import SecurityEventsApplication  # NOQA: E402
+
+# The security events stream of the monitor page is served outside Django
+application = SecurityEventsApplication(django_application)
@@ -1,4 +1,5 @@
 import re
+import sys
 from os import environ
 
 from core.settings.base import *
@@ -14,6 +15,47 @@ PROJECT_VERSION = '2.0.2'
 # Site Under Maintenance
 UNDER_MAINTENANCE = False
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# Run the background tasks in the calling thread while testing
+BACKGROUND_TASKS_INLINE = TESTING
+
+# IP geolocation from a local CSV (first ip, last ip, country) or MaxMind
+# (.mmdb) file instead of the online API
+IP_GEOLOCATION_DATABASE = environ.get('IP_GEOLOCATION_DATABASE')
+
+# The dotted path of a provider class used instead of the two above, the
+# stub looks nothing up while testing
+IP_GEOLOCATION_PROVIDER = 'main.geolocation.StubProvider' if TESTING \
+    else environ.get('IP_GEOLOCATION_PROVIDER')
+
+# Overrides of the audit entries retention by action name, (days kept in
+# the hot table, days kept in the archive), see main.audit
+AUDIT_RETENTION = {}
+
+# Overrides of the request flood thresholds by dimension ('ip', 'subnet' or
+# 'user_agent'), one per window of 1s, 10s, 60s and 1h, see
+# main.anomaly_detector
+ANOMALY_THRESHOLDS = {}
+
+# The processes validating the uploaded photographs, 0 to validate them in
+# the request, see main.image_pool
+IMAGE_WORKERS = int(environ.get('IMAGE_WORKERS', 2))
+
+# Removes the background of the photographs put on the membership cards,
+# see main.background_removal
+BACKGROUND_REMOVAL_BACKEND = environ.get(
+    'BACKGROUND_REMOVAL_BACKEND', 'main.background_removal.RemoveBgBackend')
+
+# Profile a sample of the requests, see main.profiling
+REQUEST_PROFILING = environ.get('REQUEST_PROFILING') == "TRUE"
+
+if REQUEST_PROFILING:
+    MIDDLEWARE = ['main.profiling.ProfilingMiddleware', *MIDDLEWARE]
+    CACHES['default']['OPTIONS']['REDIS_CLIENT_CLASS'] = 'main.profiling.ProfiledRedis'
+    TEMPLATES[0]['BACKEND'] = 'main.profiling.ProfiledDjangoTemplates'
+    TEMPLATES[0]['NAME'] = 'django'
+
 # Internationalization
 WSGI_APPLICATION = 'core.wsgi.application'
 
@@ -1,7 +1,9 @@
 
 CRONJOBS = [
     # Main app
-    ('00 00 * * *', 'main.cron.setMagicNumber'),
+    ('45 23 * * *', 'main.cron.rollupAuditEntries'),
+    ('00 00 * * *', 'main.cron.archiveAuditEntries'),
+    ('*/10 * * * *', 'main.cron.liftExpiredBlocks'),
     ('00 22 * * 1', 'main.cron.DBBackup'),
     ('00 23 * * 1', 'main.cron.cleanupOldLogs'),
     ('00 00 * * 2', 'main.cron.uploadDBBackupToGoogleDrive'),
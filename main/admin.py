@@ -1,7 +1,8 @@
 from django.contrib.admin import ModelAdmin, register
 
 from .constants import BASE_MODEL_FIELDS, ROWS_PER_PAGE, BLOCK_TYPES
-from .models import AuditEntry, BlockedClient
+from .models import (AuditEntry, AuditEntryArchive, BackgroundRemoval, BlockedClient,
+                     BlockedNetwork, LoginLockout)
 
 
 @register(AuditEntry)
@@ -20,6 +21,11 @@ class AuditEntryAdmin(ModelAdmin):
         return False
 
 
+@register(AuditEntryArchive)
+class AuditEntryArchiveAdmin(AuditEntryAdmin):
+    pass
+
+
 @register(BlockedClient)
 class BlockedClientAdmin(ModelAdmin):
     list_display: tuple[str, ...] = ('user_agent', 'ip', 'blockType',
@@ -40,3 +46,44 @@ class BlockedClientAdmin(ModelAdmin):
 
     def has_add_permission(self, *args, **kwargs) -> bool:
         return False
+
+
+@register(BlockedNetwork)
+class BlockedNetworkAdmin(ModelAdmin):
+    list_display: tuple[str, ...] = ('network', 'note', *BASE_MODEL_FIELDS)
+    list_filter: tuple[str, ...] = ('created',)
+    search_fields: tuple[str, ...] = ('network', 'note')
+    list_per_page: int = ROWS_PER_PAGE
+    exclude: tuple[str, ...] = BASE_MODEL_FIELDS
+
+
+@register(LoginLockout)
+class LoginLockoutAdmin(ModelAdmin):
+    list_display: tuple[str, ...] = ('ip', 'username', 'failures',
+                                     'locked_until', *BASE_MODEL_FIELDS)
+    list_filter: tuple[str, ...] = ('locked_until',)
+    search_fields: tuple[str, ...] = ('ip', 'username')
+    list_per_page: int = ROWS_PER_PAGE
+    exclude: tuple[str, ...] = BASE_MODEL_FIELDS
+
+    def has_add_permission(self, *args, **kwargs) -> bool:
+        return False
+
+    def has_change_permission(self, *args, **kwargs) -> bool:
+        return False
+
+
+@register(BackgroundRemoval)
+class BackgroundRemovalAdmin(ModelAdmin):
+    list_display: tuple[str, ...] = ('digest', 'backend', 'image',
+                                     *BASE_MODEL_FIELDS)
+    list_filter: tuple[str, ...] = ('backend',)
+    search_fields: tuple[str, ...] = ('digest',)
+    list_per_page: int = ROWS_PER_PAGE
+    exclude: tuple[str, ...] = BASE_MODEL_FIELDS
+
+    def has_add_permission(self, *args, **kwargs) -> bool:
+        return False
+
+    def has_change_permission(self, *args, **kwargs) -> bool:
+        return False
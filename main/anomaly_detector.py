@@ -0,0 +1,208 @@
+"""
+Detects request floods per IP, per subnet and per user agent.
+
+Every request is counted over the last second, 10 seconds, minute and hour
+of each of its keys. The counts are kept in count-min sketches, so the
+memory stays the same however many distinct IPs or user agents a flood
+uses, at the cost of counts that can be a little over the true ones, never
+under. A sliding window is made of `BUCKETS` parts, the oldest one is
+dropped when a new part starts.
+
+The counts are kept in the memory of the process, so with several workers
+every one of them watches its own share of the requests.
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from hashlib import blake2b
+import ipaddress
+from threading import Lock
+import time
+from typing import Callable, Final
+
+from django.conf import settings
+
+# The sliding windows in seconds
+RESOLUTIONS: Final[tuple[int, ...]] = (1, 10, 60, 3600)
+BUCKETS: Final[int] = 6
+SKETCH_WIDTH: Final[int] = 1024
+SKETCH_DEPTH: Final[int] = 4
+
+DIMENSION_IP: Final[str] = 'ip'
+DIMENSION_SUBNET: Final[str] = 'subnet'
+DIMENSION_USER_AGENT: Final[str] = 'user_agent'
+
+# The requests allowed in every resolution, None to not watch it. The
+# second of an IP is left to the exact per second limit of the middleware.
+DEFAULT_ANOMALY_THRESHOLDS: Final[dict[str, tuple[int | None, ...]]] = {
+    DIMENSION_IP: (None, 250, 900, 10000),
+    DIMENSION_SUBNET: (200, 600, 2400, 30000),
+    DIMENSION_USER_AGENT: (300, 1500, 6000, None),
+}
+
+# A subnet or user agent flood blocks only the IPs that sent at least this
+# part of its threshold, not every visitor behind the same NAT or using the
+# same browser
+SHARE_DIVISOR: Final[int] = 20
+
+
+def getSketchIndexes(key: str, width: int = SKETCH_WIDTH,
+                     depth: int = SKETCH_DEPTH) -> list[int]:
+    """
+    The counter of the key in every row, from two hashes of one digest.
+    """
+    digest: bytes = blake2b(key.encode(), digest_size=16).digest()
+    first: int = int.from_bytes(digest[:8], 'little')
+    second: int = int.from_bytes(digest[8:], 'little') | 1
+    return [row * width + (first + row * second) % width
+            for row in range(depth)]
+
+
+class CountMinSketch:
+    """
+    Counts the keys in `depth` rows of `width` counters. The count of a key
+    is the lowest of its counters, one per row.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH) -> None:
+        self.width: int = width
+        self.depth: int = depth
+        self.counters: array = array('I', bytes(4 * width * depth))
+
+    def add(self, indexes: list[int], count: int = 1) -> None:
+        for index in indexes:
+            self.counters[index] += count
+
+    def estimate(self, indexes: list[int]) -> int:
+        return min(self.counters[index] for index in indexes)
+
+
+class SlidingSketch:
+    """
+    Count-min sketch over the last `span` seconds, made of `buckets` parts
+    of `span / buckets` seconds each. A part keeps only the counters it
+    changed, and their sum over the live parts is kept up to date, so a
+    count costs a lookup per row.
+    """
+
+    def __init__(self, span: float, buckets: int = BUCKETS,
+                 width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH) -> None:
+        self.bucket_span: float = span / buckets
+        self.buckets: list[dict[int, int]] = [{} for _ in range(buckets)]
+        # The epoch of every bucket, -1 for an empty one
+        self.epochs: list[int] = [-1] * buckets
+        self.totals: CountMinSketch = CountMinSketch(width, depth)
+
+    def add(self, indexes: list[int], now: float) -> int:
+        """
+        Counts the key and returns its count over the window.
+        """
+        epoch: int = int(now / self.bucket_span)
+        for slot, bucket_epoch in enumerate(self.epochs):
+            if bucket_epoch != -1 and bucket_epoch <= epoch - len(self.buckets):
+                self.expire(slot)
+
+        slot: int = epoch % len(self.buckets)
+        self.epochs[slot] = epoch
+        bucket: dict[int, int] = self.buckets[slot]
+        for index in indexes:
+            bucket[index] = bucket.get(index, 0) + 1
+        self.totals.add(indexes)
+        return self.totals.estimate(indexes)
+
+    def expire(self, slot: int) -> None:
+        counters: array = self.totals.counters
+        for index, count in self.buckets[slot].items():
+            counters[index] -= count
+        self.buckets[slot] = {}
+        self.epochs[slot] = -1
+
+
+@dataclass(frozen=True)
+class Anomaly:
+    dimension: str
+    key: str
+    # The window in seconds
+    resolution: int
+    count: int
+    threshold: int
+
+
+def getSubnet(ip: str) -> str:
+    """
+    The /24 network of an IPv4 address, or the /64 network of an IPv6 one.
+    """
+    if ip.count('.') == 3:
+        return ip.rsplit('.', 1)[0] + '.0/24'
+    try:
+        return str(ipaddress.ip_network(f'{ip}/64', strict=False))
+    except ValueError:
+        return ip
+
+
+def getAnomalyThresholds() -> dict[str, tuple[int | None, ...]]:
+    thresholds: dict[str, tuple[int | None, ...]] = dict(
+        DEFAULT_ANOMALY_THRESHOLDS)
+    thresholds.update(getattr(settings, 'ANOMALY_THRESHOLDS', {}))
+    return thresholds
+
+
+class AnomalyDetector:
+    """
+    Counts every request by its IP, its subnet and its user agent. The
+    thresholds are by dimension, one per resolution, and default to the
+    `ANOMALY_THRESHOLDS` setting over `DEFAULT_ANOMALY_THRESHOLDS`.
+    """
+
+    def __init__(self, thresholds: dict[str, tuple[int | None, ...]] | None = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.lock: Lock = Lock()
+        self.clock: Callable[[], float] = clock
+        self.thresholds: dict[str, tuple[int | None, ...]] = getAnomalyThresholds()
+        self.thresholds.update(thresholds or {})
+        # Every dimension has its own sketches, so a busy dimension does not
+        # inflate the counts of the others
+        self.sketches: dict[str, list[SlidingSketch]] = {
+            dimension: [SlidingSketch(resolution) for resolution in RESOLUTIONS]
+            for dimension in (DIMENSION_IP, DIMENSION_SUBNET, DIMENSION_USER_AGENT)
+        }
+
+    def observe(self, ip: str, user_agent: str) -> Anomaly | None:
+        """
+        Counts the request and returns the anomaly the client should be
+        blocked for, if any.
+        """
+        keys: dict[str, str] = {
+            DIMENSION_IP: ip,
+            DIMENSION_SUBNET: getSubnet(ip),
+            DIMENSION_USER_AGENT: user_agent,
+        }
+        now: float = self.clock()
+        counts: dict[str, list[int]] = {}
+        with self.lock:
+            for dimension, sketches in self.sketches.items():
+                indexes: list[int] = getSketchIndexes(keys[dimension])
+                counts[dimension] = [sketch.add(indexes, now)
+                                     for sketch in sketches]
+
+        for dimension in (DIMENSION_IP, DIMENSION_SUBNET, DIMENSION_USER_AGENT):
+            for i, threshold in enumerate(self.thresholds[dimension]):
+                count: int = counts[dimension][i]
+                if threshold is None or count <= threshold:
+                    continue
+                if dimension != DIMENSION_IP and counts[DIMENSION_IP][i] \
+                        < threshold // SHARE_DIVISOR:
+                    continue
+                return Anomaly(dimension, keys[dimension], RESOLUTIONS[i],
+                               count, threshold)
+        return None
+
+
+_anomaly_detector: AnomalyDetector | None = None
+
+
+def getAnomalyDetector() -> AnomalyDetector:
+    global _anomaly_detector
+    if _anomaly_detector is None:
+        _anomaly_detector = AnomalyDetector()
+    return _anomaly_detector
@@ -1,7 +1,8 @@
 from django.apps import AppConfig
 from django.contrib.auth.signals import (user_logged_in, user_logged_out,
                                          user_login_failed)
-from django.db.models.signals import post_migrate
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save)
 
 
 class MainConfig(AppConfig):
@@ -17,4 +18,16 @@ class MainConfig(AppConfig):
 
         post_migrate.connect(signals.createGroups, sender=self)
 
+        # Invalidate the cached auth contexts
+        from django.contrib.auth.models import User
+        from company_user.models import CompanyUser, Role
+        from member.models import Person
+
+        for signal in (post_save, post_delete):
+            signal.connect(signals.onUserChanged, sender=User)
+            signal.connect(signals.onRoleChanged, sender=Role)
+            signal.connect(signals.onCompanyUserChanged, sender=CompanyUser)
+            signal.connect(signals.onPersonChanged, sender=Person)
+        m2m_changed.connect(signals.onRoleChanged, sender=Role.groups.through)
+
         return super().ready()
@@ -0,0 +1,213 @@
+"""
+The retention and the daily counts of the audit entries.
+
+The recent entries of every action are kept in the hot `AuditEntry` table,
+which the requests query. The nightly cron moves the older ones to
+`AuditEntryArchive` in chunks, and deletes them from the archive when their
+retention ends. Only the traffic actions, e.g. the posts and the logins, are
+ever deleted. The staff and the financial actions are archived forever,
+nothing else keeps them as the database backups exclude both tables. The
+retention of an action can be overridden by its name in the
+`AUDIT_RETENTION` setting, e.g. {'NORMAL_POST': (7, 0)}.
+
+The entries are counted by day, action and country in `AuditRollup`. The
+audit entry writer adds every batch it inserts to the counts, and the
+nightly cron recounts the last days from the entries, catching the ones
+saved directly and the countries located after the insert.
+"""
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+import logging
+from logging import Logger
+from typing import Final, Iterable
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from . import constants
+from .models import AuditEntry, AuditEntryArchive, AuditRollup
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+ARCHIVE_CHUNK_SIZE: Final[int] = 1000
+# The nightly recount covers yesterday and today
+ROLLUP_REBUILD_DAYS: Final[int] = 2
+
+
+@dataclass(frozen=True)
+class AuditRetention:
+    # Days kept in the hot table, None to keep them there
+    hot_days: int | None
+    # Days kept in the archive after the hot days, 0 to delete the entries
+    # instead of archiving them and None to keep them
+    archive_days: int | None
+
+
+DEFAULT_AUDIT_RETENTION: Final[AuditRetention] = AuditRetention(90, None)
+# The archived traffic actions are deleted after two years
+TRAFFIC_AUDIT_RETENTION: Final[AuditRetention] = AuditRetention(90, 730)
+
+_AUDIT_RETENTION: Final[dict[str, AuditRetention]] = {
+    # One per visitor, the Visitor table was filled from them
+    constants.ACTION.FIRST_VISIT: AuditRetention(None, None),
+    constants.ACTION.LOGGED_IN: TRAFFIC_AUDIT_RETENTION,
+    constants.ACTION.LOGGED_OUT: TRAFFIC_AUDIT_RETENTION,
+    constants.ACTION.LOGGED_FAILED: TRAFFIC_AUDIT_RETENTION,
+    constants.ACTION.NORMAL_POST: AuditRetention(7, 0),
+    constants.ACTION.SUSPICIOUS_POST: AuditRetention(365, None),
+    constants.ACTION.ATTACK_ATTEMPT: AuditRetention(365, None),
+}
+
+
+def getAuditRetention(action: str) -> AuditRetention:
+    name: str = constants.ACTION_STR[int(action)]
+    overridden: tuple[int | None, int | None] | None = getattr(
+        settings, 'AUDIT_RETENTION', {}).get(name)
+    if overridden is not None:
+        return AuditRetention(*overridden)
+    return _AUDIT_RETENTION.get(action, DEFAULT_AUDIT_RETENTION)
+
+
+def _archiveChunk(action: str, before: timezone.datetime, archive: bool,
+                  chunk_size: int) -> int:
+    with transaction.atomic():
+        entries: list[AuditEntry] = list(AuditEntry.objects.filter(
+            action=action, created__lt=before).order_by('id')[:chunk_size])
+        if not entries:
+            return 0
+        if archive:
+            AuditEntryArchive.objects.bulk_create([
+                AuditEntryArchive(ip=entry.ip, user_agent=entry.user_agent,
+                                  country=entry.country, action=entry.action,
+                                  username=entry.username,
+                                  created=entry.created,
+                                  updated=entry.updated)
+                for entry in entries
+            ])
+        AuditEntry.objects.filter(
+            id__in=[entry.id for entry in entries]).delete()
+    return len(entries)
+
+
+def _pruneChunk(action: str, before: timezone.datetime, chunk_size: int) -> int:
+    ids: list[int] = list(AuditEntryArchive.objects.filter(
+        action=action, created__lt=before).order_by('id').values_list(
+        'id', flat=True)[:chunk_size])
+    if ids:
+        AuditEntryArchive.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archiveAuditEntries(chunk_size: int = ARCHIVE_CHUNK_SIZE) -> dict[str, tuple[int, int]]:
+    """
+    Moves the entries past their hot days to the archive, or deletes them,
+    and deletes the archived entries past their retention, a chunk per
+    transaction. Returns the moved and the deleted count of every action.
+    """
+    now: timezone.datetime = timezone.now()
+    result: dict[str, tuple[int, int]] = {}
+    for action in constants.ACTION:
+        retention: AuditRetention = getAuditRetention(action)
+        if retention.hot_days is None:
+            continue
+
+        moved: int = 0
+        hot_before: timezone.datetime = now - \
+            timezone.timedelta(days=retention.hot_days)
+        archive: bool = retention.archive_days != 0
+        while count := _archiveChunk(action, hot_before, archive, chunk_size):
+            moved += count
+
+        pruned: int = 0
+        if retention.archive_days is not None:
+            archive_before: timezone.datetime = hot_before - \
+                timezone.timedelta(days=retention.archive_days)
+            while count := _pruneChunk(action, archive_before, chunk_size):
+                pruned += count
+
+        if moved or pruned:
+            result[constants.ACTION_STR[int(action)]] = (moved, pruned)
+    return result
+
+
+def incrementAuditRollups(entries: Iterable[AuditEntry]) -> None:
+    """
+    Adds the inserted entries to the counts of their days.
+    """
+    counts: Counter[tuple[date, str, str]] = Counter(
+        (entry.created.date(), entry.action, entry.country) for entry in entries)
+    for (day, action, country), count in counts.items():
+        rollup = AuditRollup.objects.filter(
+            day=day, action=action, country=country)
+        if rollup.update(count=F('count') + count, updated=timezone.now()):
+            continue
+        try:
+            with transaction.atomic():
+                AuditRollup.objects.create(day=day, action=action,
+                                           country=country, count=count)
+        except IntegrityError:
+            # Created by another writer in the meantime
+            rollup.update(count=F('count') + count, updated=timezone.now())
+
+
+def rebuildAuditRollups(start: date, end: date) -> int:
+    """
+    Recounts the days from start to end from the hot and the archived
+    entries. A day older than the hot days of `NORMAL_POST` loses its
+    deleted posts. Returns the number of the counts.
+    """
+    counts: Counter[tuple[date, str, str]] = Counter()
+    for model in (AuditEntry, AuditEntryArchive):
+        rows = model.objects.filter(
+            created__gte=datetime.combine(start, datetime.min.time()),
+            created__lt=datetime.combine(end + timedelta(days=1),
+                                         datetime.min.time())
+        ).annotate(day=TruncDate('created')).values(
+            'day', 'action', 'country').annotate(count=Count('id'))
+        for row in rows:
+            counts[(row['day'], row['action'], row['country'])] += row['count']
+
+    with transaction.atomic():
+        AuditRollup.objects.filter(day__range=(start, end)).delete()
+        AuditRollup.objects.bulk_create([
+            AuditRollup(day=day, action=action, country=country, count=count)
+            for (day, action, country), count in counts.items()
+        ])
+    return len(counts)
+
+
+def countAuditEntries(actions: Iterable[str], start: date | None = None,
+                      end: date | None = None) -> int:
+    """
+    Counts the entries of the actions from start to end, both included.
+    """
+    rollups = AuditRollup.objects.filter(action__in=list(actions))
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lte=end)
+    return rollups.aggregate(total=Sum('count'))['total'] or 0
+
+
+def getAuditSeries(action: str, start: date, end: date,
+                   monthly: bool = False) -> dict[date, int]:
+    """
+    Returns the count of the entries of the action by day, or by the first
+    day of the month, from start to end. The periods without entries are
+    left out.
+    """
+    rollups = AuditRollup.objects.filter(action=action,
+                                         day__range=(start, end))
+    if monthly:
+        rollups = rollups.annotate(period=TruncMonth('day'))
+    else:
+        rollups = rollups.annotate(period=F('day'))
+    return {
+        row['period']: row['total'] for row in
+        rollups.values('period').annotate(total=Sum('count')).order_by()
+    }
@@ -0,0 +1,135 @@
+"""
+Streams the audit entries as a gzip compressed CSV or a Parquet file.
+
+The entries are read in chunks of ids greater than the last one read, as
+the MySQL driver buffers the whole result of a query even through
+`.iterator()`. Every chunk is written and handed to the response before
+the next one is read, so the memory stays the same whatever the number of
+entries. Parquet needs the optional pyarrow package.
+"""
+from __future__ import annotations
+import csv
+from datetime import date, datetime, timedelta
+import io
+from importlib.util import find_spec
+from typing import Final, Iterable, Iterator
+import zlib
+
+from . import constants
+from .models import AuditEntry, AuditEntryArchive
+
+EXPORT_CHUNK_SIZE: Final[int] = 5000
+
+CSV_FORMAT: Final[str] = 'csv'
+PARQUET_FORMAT: Final[str] = 'parquet'
+
+AUDIT_EXPORT_FIELDS: Final[tuple[str, ...]] = (
+    'created', 'action', 'ip', 'country', 'username', 'user_agent')
+
+AuditRow = tuple[datetime, str, str, str, str | None, str | None]
+
+
+def isParquetAvailable() -> bool:
+    # Without importing pyarrow, which is heavy to load
+    return find_spec('pyarrow') is not None
+
+
+def iterAuditRows(start: date | None = None, end: date | None = None,
+                  actions: Iterable[str] | None = None, archived: bool = False,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[list[AuditRow]]:
+    """
+    Yields the entries from start to end, both included, in chunks. The
+    archived entries come first, as they are the older ones.
+    """
+    for model in (AuditEntryArchive, AuditEntry) if archived else (AuditEntry,):
+        queryset = model.objects.all()
+        if start is not None:
+            queryset = queryset.filter(created__gte=datetime.combine(
+                start, datetime.min.time()))
+        if end is not None:
+            queryset = queryset.filter(created__lt=datetime.combine(
+                end + timedelta(days=1), datetime.min.time()))
+        if actions:
+            queryset = queryset.filter(action__in=list(actions))
+
+        last_id: int = 0
+        while True:
+            rows: list[tuple] = list(queryset.filter(id__gt=last_id).order_by(
+                'id').values_list('id', *AUDIT_EXPORT_FIELDS)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield [(created, constants.ACTION_STR[int(action)], *values)
+                   for _, created, action, *values in rows]
+
+
+def streamCsv(chunks: Iterable[list[AuditRow]]) -> Iterator[bytes]:
+    """
+    Writes the chunks as a gzip compressed CSV file.
+    """
+    # A gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31)
+    buffer: io.StringIO = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(AUDIT_EXPORT_FIELDS)
+    for rows in chunks:
+        writer.writerows(
+            (created.isoformat(sep=' ', timespec='seconds'), *values)
+            for created, *values in rows)
+        data: bytes = compressor.compress(buffer.getvalue().encode())
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            yield data
+    yield compressor.compress(buffer.getvalue().encode()) + compressor.flush()
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    A write only file keeping what was written until it is taken.
+    """
+
+    def __init__(self) -> None:
+        self.data: bytearray = bytearray()
+        self.position: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.data += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data: bytes = bytes(self.data)
+        self.data.clear()
+        return data
+
+
+def streamParquet(chunks: Iterable[list[AuditRow]]) -> Iterator[bytes]:
+    """
+    Writes every chunk as a row group of a Parquet file.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([
+        ('created', pyarrow.timestamp('s')),
+        *[(field, pyarrow.string()) for field in AUDIT_EXPORT_FIELDS[1:]],
+    ])
+    sink: _StreamSink = _StreamSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in chunks:
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type)
+                 for column, field in zip(zip(*rows), schema)],
+                schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import logging
+from logging import Logger
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from . import constants
+from .menu_manager import MenuItem, buildUserMenus
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+AUTH_CONTEXT_KEY: str = "AUTH_CONTEXT:%s"
+# Bumped to drop the auth contexts of all the users at once, every auth
+# context is cached with the version it was built at
+AUTH_CONTEXT_VERSION_KEY: str = "AUTH_CONTEXT_VERSION"
+
+
+@dataclass(frozen=True)
+class AuthContext:
+    """
+    What the middlewares and the templates need to know about a logged in
+    user, cached as one entry per user.
+    """
+    user_id: int
+    is_staff: bool
+    is_superuser: bool
+    # Staff users only
+    has_company_user: bool
+    groups: frozenset[str]
+    permissions: frozenset[str]
+    # Non staff users only
+    has_membership: bool
+    menu: tuple[MenuItem, ...]
+
+
+def buildAuthContext(user: User) -> AuthContext:
+    from company_user.models import CompanyUser, Role
+    from member.models import Person
+
+    has_company_user: bool = False
+    groups: frozenset[str] = frozenset()
+    has_membership: bool = False
+    if user.is_staff:
+        try:
+            company_user: CompanyUser = CompanyUser.objects.select_related(
+                'role').prefetch_related('role__groups').get(user=user)
+            has_company_user = True
+            groups = frozenset(group.name for group in
+                               company_user.role.groups.all())
+        except CompanyUser.DoesNotExist:
+            pass
+    else:
+        try:
+            user_data: dict[str, Any] = Person.getUserData(user)
+            has_membership = bool(user_data.get('has_membership'))
+        except Person.DoesNotExist:
+            pass
+
+    menu_groups: frozenset[str] = frozenset(constants.GROUPS) \
+        if user.is_superuser else groups
+    return AuthContext(
+        user_id=user.pk,
+        is_staff=user.is_staff,
+        is_superuser=user.is_superuser,
+        has_company_user=has_company_user,
+        groups=groups,
+        permissions=frozenset(Role.getGroupsPermissions(groups)),
+        has_membership=has_membership,
+        menu=tuple(buildUserMenus(user.is_staff, menu_groups, has_membership)),
+    )
+
+
+def getAuthContextKeys(user_id: int | str) -> list[str]:
+    return [AUTH_CONTEXT_KEY % user_id, AUTH_CONTEXT_VERSION_KEY]
+
+
+def readAuthContext(cached: dict[str, Any], user_id: int | str) -> AuthContext | None:
+    """
+    Returns the auth context of the user from the values of its keys, or
+    None if it is not cached or was built before the current version.
+    """
+    entry: tuple[int, AuthContext] | None = cached.get(AUTH_CONTEXT_KEY % user_id)
+    if entry is None:
+        return None
+    version, auth_context = entry
+    if version != cached.get(AUTH_CONTEXT_VERSION_KEY, 0):
+        return None
+    return auth_context
+
+
+def getAuthContext(request: HttpRequest) -> AuthContext | None:
+    """
+    Returns the auth context of the requester, kept on the request, or None
+    if the requester is not logged in.
+    """
+    if not request.user.is_authenticated:
+        return None
+
+    # May be read by `CacheUserMiddleware` along with the user
+    auth_context: AuthContext | None = getattr(request, '_auth_context', None)
+    if auth_context is not None and auth_context.user_id == request.user.pk:
+        return auth_context
+
+    cached: dict[str, Any] = cache.get_many(getAuthContextKeys(request.user.pk))
+    auth_context = readAuthContext(cached, request.user.pk)
+    if auth_context is None:
+        auth_context = buildAuthContext(request.user)
+        # Built after a bump the version was read before, it is dropped
+        cache.set(AUTH_CONTEXT_KEY % request.user.pk,
+                  (cached.get(AUTH_CONTEXT_VERSION_KEY, 0), auth_context),
+                  constants.DEFAULT_CACHE_EXPIRE)
+    request._auth_context = auth_context
+    return auth_context
+
+
+def invalidateAuthContext(user_id: int | None = None) -> None:
+    """
+    Drops the cached auth context of a user, or of all the users.
+    """
+    if user_id is None:
+        if not cache.add(AUTH_CONTEXT_VERSION_KEY, 1, None):
+            cache.incr(AUTH_CONTEXT_VERSION_KEY)
+    else:
+        cache.delete(AUTH_CONTEXT_KEY % user_id)
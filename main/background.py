@@ -0,0 +1,216 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+import atexit
+import logging
+from logging import Logger
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+import time
+from typing import Any, Callable, Final
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import constants
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+# How long a request thread waits for a free place in a full queue before
+# running the task itself.
+_SUBMIT_TIMEOUT: Final[float] = 0.05
+_SHUTDOWN_TIMEOUT: Final[float] = 10
+
+
+class WorkQueue:
+    """
+    A bounded pool of daemon threads running the tasks which the response
+    does not need to wait for. When the queue is full the submitting thread
+    runs the task itself, so a burst slows the requests down instead of
+    piling up unbounded work.
+    """
+
+    def __init__(self, name: str, workers: int = 2, max_size: int = 1000) -> None:
+        self.name: str = name
+        self.workers: int = workers
+        self.tasks: Queue = Queue(maxsize=max_size)
+        self.threads: list[Thread] = []
+        self.lock: Lock = Lock()
+
+    def submit(self, task: Callable[..., Any], *args, **kwargs) -> None:
+        if settings.BACKGROUND_TASKS_INLINE:
+            self._run(task, args, kwargs)
+            return
+
+        self._start()
+        try:
+            self.tasks.put((task, args, kwargs), timeout=_SUBMIT_TIMEOUT)
+        except Full:
+            logger.warning(f"The work queue '{self.name}' is full, "
+                           + f"running '{task.__name__}' in the caller thread.")
+            self._run(task, args, kwargs)
+
+    def shutdown(self, timeout: float = _SHUTDOWN_TIMEOUT) -> None:
+        with self.lock:
+            threads: list[Thread] = self.threads
+            self.threads = []
+        for _ in threads:
+            self.tasks.put(None)
+        deadline: float = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _start(self) -> None:
+        if self.threads:
+            return
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread: Thread = Thread(target=self._work, daemon=True,
+                                        name=f'{self.name}-{i}')
+                thread.start()
+                self.threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            item: tuple | None = self.tasks.get()
+            if item is None:
+                break
+            self._run(*item)
+            close_old_connections()
+
+    def _run(self, task: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            task(*args, **kwargs)
+        except Exception as e:
+            logger.exception(e)
+
+
+class BatchWorker(ABC):
+    """
+    A single daemon thread handing the queued items to `process` in batches,
+    a batch is processed when it is full or when `interval` seconds passed
+    since its first item.
+    """
+
+    def __init__(self, name: str, batch_size: int = 100, interval: float = 1, max_size: int = 10_000) -> None:
+        self.name: str = name
+        self.batch_size: int = batch_size
+        self.interval: float = interval
+        self.items: Queue = Queue(maxsize=max_size)
+        self.thread: Thread | None = None
+        self.lock: Lock = Lock()
+
+    @abstractmethod
+    def process(self, batch: list) -> None: ...
+
+    def put(self, item: Any) -> None:
+        if settings.BACKGROUND_TASKS_INLINE:
+            self._process([item])
+            return
+
+        self._start()
+        try:
+            self.items.put(item, timeout=_SUBMIT_TIMEOUT)
+        except Full:
+            logger.warning(f"The '{self.name}' queue is full, "
+                           + "processing the item in the caller thread.")
+            self._process([item])
+
+    def shutdown(self, timeout: float = _SHUTDOWN_TIMEOUT) -> None:
+        with self.lock:
+            thread: Thread | None = self.thread
+            self.thread = None
+        if thread is not None:
+            self.items.put(None)
+            thread.join(timeout)
+
+    def _start(self) -> None:
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self._work, daemon=True,
+                                     name=self.name)
+                self.thread.start()
+
+    def _work(self) -> None:
+        stopping: bool = False
+        while not stopping:
+            item: Any = self.items.get()
+            if item is None:
+                break
+
+            batch: list = [item]
+            deadline: float = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.items.get(
+                        timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+            close_old_connections()
+
+    def _process(self, batch: list) -> None:
+        try:
+            self.process(batch)
+        except Exception as e:
+            logger.exception(e)
+
+
+class AuditEntryWriter(BatchWorker):
+    """
+    Collects the audit entries of the requests and inserts them with one
+    `bulk_create` per batch.
+    """
+
+    def __init__(self) -> None:
+        super().__init__('audit-entry-writer')
+
+    def write(self, entry) -> None:
+        self.put(entry)
+
+    def process(self, batch: list) -> None:
+        from .audit import incrementAuditRollups
+        from .geolocation import getGeolocationService
+        from .models import AuditEntry
+        from .security_events import publishAuditEntries
+        from .visitors import recordVisitors
+
+        geolocation = getGeolocationService()
+        for entry in batch:
+            entry.country = geolocation.getCountry(str(entry.ip)) or entry.country
+        AuditEntry.objects.bulk_create(batch)
+        incrementAuditRollups(batch)
+        recordVisitors(batch)
+        publishAuditEntries(batch)
+
+        for ip in {str(entry.ip) for entry in batch if entry.country == '-'}:
+            geolocation.locate(ip)
+
+
+_work_queue: WorkQueue = WorkQueue('background-tasks')
+_audit_entry_writer: AuditEntryWriter = AuditEntryWriter()
+
+
+def getWorkQueue() -> WorkQueue:
+    return _work_queue
+
+
+def getAuditEntryWriter() -> AuditEntryWriter:
+    return _audit_entry_writer
+
+
+@atexit.register
+def _flushOnShutdown() -> None:
+    # The entries first, their inserting queues the geolocation of their IPs
+    from .geolocation import shutdownGeolocationService
+    _audit_entry_writer.shutdown()
+    shutdownGeolocationService()
+    _work_queue.shutdown()
@@ -0,0 +1,213 @@
+"""
+Removes the background of the photographs put on the membership cards.
+
+The backend is the `BACKGROUND_REMOVAL_BACKEND` setting, remove.bg by
+default. While remove.bg has no API key the rembg package removes the
+background locally when it is installed, otherwise the background is kept.
+
+The result of a paid or slow backend is stored under
+`MEDIA_DIR.BACKGROUND_REMOVED_DIR`, named by the digest of the photograph
+pixels, and indexed in the `BackgroundRemoval` table. Rendering the card of
+the same photograph again reads the stored result instead of calling the
+backend.
+"""
+from __future__ import annotations
+from hashlib import sha256
+from importlib.util import find_spec
+from io import BytesIO
+import logging
+from logging import Logger
+from typing import Final, Protocol
+
+from django.conf import settings
+from django.core.files.storage import Storage
+from django.utils.module_loading import import_string
+from PIL import Image as Img
+from PIL.Image import Image
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import constants
+from .image_processing import ImageProcessingError
+from .models import BackgroundRemoval
+from .utils import writeFileAtomically
+from parameter.service import getParameterValue
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+_API_URL: Final[str] = 'https://api.remove.bg/v1.0/removebg'
+# (connect, read) seconds
+_API_TIMEOUT: Final[tuple[float, float]] = (5, 30)
+_API_RETRIES: Final[int] = 2
+
+
+class BackgroundRemover(Protocol):
+    # Stored with the results, changing it computes them again
+    name: str
+    # Whether the results are stored
+    cached: bool
+
+    def isAvailable(self) -> bool: ...
+
+    def removeBackground(self, image: Image) -> Image: ...
+
+
+class KeepBackground:
+    """
+    Returns the photograph as is, the last fallback.
+    """
+    name: str = 'none'
+    cached: bool = False
+
+    def isAvailable(self) -> bool:
+        return True
+
+    def removeBackground(self, image: Image) -> Image:
+        return image
+
+
+class StubBackend:
+    """
+    Returns the photograph as is and counts the calls, for the tests.
+    """
+    name: str = 'stub'
+    cached: bool = True
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    def isAvailable(self) -> bool:
+        return True
+
+    def removeBackground(self, image: Image) -> Image:
+        self.calls += 1
+        return image.copy()
+
+
+class RembgBackend:
+    """
+    Removes the background locally with the optional rembg package, the
+    model is loaded once per process.
+    """
+    name: str = 'rembg'
+    cached: bool = True
+
+    def __init__(self) -> None:
+        self.session = None
+
+    def isAvailable(self) -> bool:
+        # Without importing rembg, which loads onnxruntime
+        return find_spec('rembg') is not None
+
+    def removeBackground(self, image: Image) -> Image:
+        from rembg import new_session, remove
+
+        if self.session is None:
+            self.session = new_session()
+        return remove(image, session=self.session)
+
+
+class RemoveBgBackend:
+    """
+    Removes the background with the remove.bg API over one pooled session,
+    retrying the failed connections and the server errors.
+    """
+    name: str = 'removebg'
+    cached: bool = True
+
+    def __init__(self) -> None:
+        self.session: requests.Session = requests.Session()
+        retry: Retry = Retry(
+            total=_API_RETRIES, backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'POST'}))
+        self.session.mount('https://', HTTPAdapter(max_retries=retry))
+
+    def getApiKey(self) -> str:
+        return getParameterValue(constants.PARAMETERS.REMOVE_BG_API_KEY)
+
+    def isAvailable(self) -> bool:
+        return self.getApiKey() != "None"
+
+    def removeBackground(self, image: Image) -> Image:
+        image_io: BytesIO = BytesIO()
+        image.convert('RGBA').save(image_io, format="PNG")
+        try:
+            response = self.session.post(
+                _API_URL,
+                files={'image_file': image_io.getvalue()},
+                data={'size': 'auto'},
+                headers={'X-Api-Key': self.getApiKey()},
+                timeout=_API_TIMEOUT,
+            )
+        except requests.RequestException as error:
+            raise ImageProcessingError(f"Remove.bg request failed: {error}")
+        logger.info(f"   - Response Code: {response.status_code}")
+        if response.status_code != requests.codes.ok:
+            raise ImageProcessingError(
+                f"Response Code: {response.status_code} - Error: {response.text}")
+        return Img.open(BytesIO(response.content))
+
+
+_background_removers: dict[str, BackgroundRemover] = {}
+
+
+def getBackgroundRemover() -> BackgroundRemover:
+    """
+    The configured backend, or its fallback while it is not available.
+    """
+    for path in (settings.BACKGROUND_REMOVAL_BACKEND,
+                 'main.background_removal.RembgBackend'):
+        if path not in _background_removers:
+            _background_removers[path] = import_string(path)()
+        if _background_removers[path].isAvailable():
+            return _background_removers[path]
+    logger.warning("No background removal available, the background is kept.")
+    return KeepBackground()
+
+
+def getImageDigest(image: Image) -> str:
+    digest = sha256(f"{image.mode}:{image.size}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def getStorage() -> Storage:
+    return BackgroundRemoval._meta.get_field('image').storage
+
+
+def removeBackground(image: Image) -> Image:
+    """
+    Returns the photograph with its background removed, stored once per
+    photograph and backend.
+    """
+    background_remover: BackgroundRemover = getBackgroundRemover()
+    if not background_remover.cached:
+        return background_remover.removeBackground(image)
+
+    digest: str = getImageDigest(image)
+    storage: Storage = getStorage()
+    removal: BackgroundRemoval | None = BackgroundRemoval.objects.filter(
+        digest=digest, backend=background_remover.name).first()
+    if removal is not None:
+        try:
+            with storage.open(removal.image.name) as file:
+                logger.info("   - Background Removed Before")
+                return Img.open(BytesIO(file.read()))
+        except FileNotFoundError:
+            logger.warning(f"The background removed file {removal.image.name} "
+                           + "is missing, removing the background again.")
+            removal.delete()
+
+    result: Image = background_remover.removeBackground(image)
+    result_io: BytesIO = BytesIO()
+    result.save(result_io, format="PNG")
+    name: str = "%s/%s/%s-%s.png" % (constants.MEDIA_DIR.BACKGROUND_REMOVED_DIR,
+                                     digest[:2], digest, background_remover.name)
+    writeFileAtomically(storage, name, result_io.getvalue())
+    # Another process may have stored the same photograph meanwhile
+    BackgroundRemoval.objects.bulk_create([BackgroundRemoval(
+        digest=digest, backend=background_remover.name, image=name)],
+        ignore_conflicts=True)
+    return result
@@ -0,0 +1,411 @@
+from __future__ import annotations
+from bisect import bisect_right
+from dataclasses import dataclass, field
+import ipaddress
+import logging
+from logging import Logger
+from threading import Lock, Thread
+import time
+from typing import Final, Iterable
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from . import constants
+from .models import BlockedClient, BlockedNetwork
+from .security_events import (createSecurityEvent, publishSecurityEvent,
+                              publishSecurityEvents)
+from parameter.service import getParameterValue
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
+
+# The listener compares the version key at least every this many seconds,
+# in case a published message was missed while reconnecting.
+_VERSION_CHECK_INTERVAL: Final[int] = 30
+BULK_CHUNK_SIZE: Final[int] = 500
+
+
+class NetworkIndex:
+    """
+    The blocked networks as sorted and merged address intervals of every IP
+    version, so a lookup is a binary search however many networks there are.
+    """
+
+    def __init__(self, networks: Iterable[str]) -> None:
+        intervals: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            try:
+                parsed = ipaddress.ip_network(network, strict=False)
+            except ValueError:
+                logger.warning(f"Invalid blocked network [{network}] ignored.")
+                continue
+            intervals[parsed.version].append(
+                (int(parsed.network_address), int(parsed.broadcast_address)))
+
+        self.starts: dict[int, list[int]] = {}
+        self.ends: dict[int, list[int]] = {}
+        for version, ranges in intervals.items():
+            merged: list[list[int]] = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [start for start, _ in merged]
+            self.ends[version] = [end for _, end in merged]
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts in self.starts.values())
+
+    def __contains__(self, ip: str) -> bool:
+        if not len(self):
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        value: int = int(address)
+        i: int = bisect_right(self.starts[address.version], value) - 1
+        return i >= 0 and value <= self.ends[address.version][i]
+
+
+class Blocklist:
+    """
+    Process local snapshot of the blocked clients, so checking a client
+    that is not blocked costs no cache nor database call. The snapshot is
+    rebuilt lazily after it is invalidated by a block change in this process,
+    or in any other process through the Redis version key and its channel.
+
+    The blocked IPs are an exact dictionary rather than a Bloom filter in
+    front of one, its lookup is already constant time without I/O and a
+    Bloom filter in Python would cost more than the lookup it saves.
+    """
+
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.version: int | None = None
+        self.entries: dict[str, tuple[str, timezone.datetime]] | None = None
+        self.networks: NetworkIndex = NetworkIndex(())
+        # Blocked in this process, kept across the rebuilds until their row
+        # written in the background is read
+        self.marked: dict[str, tuple[str, timezone.datetime]] = {}
+
+    def invalidate(self) -> None:
+        self.entries = None
+
+    def getEntries(self) -> dict[str, tuple[str, timezone.datetime]]:
+        entries = self.entries
+        if entries is not None:
+            return entries
+
+        with self.lock:
+            if self.entries is None:
+                self.version = cache.get(constants.CACHE.BLOCKLIST_VERSION, 0)
+                self.networks = NetworkIndex(
+                    BlockedNetwork.objects.values_list('network', flat=True))
+                entries: dict[str, tuple[str, timezone.datetime]] = {
+                    ip: (block_type, updated)
+                    for ip, block_type, updated in BlockedClient.objects.exclude(
+                        block_type=constants.BLOCK_TYPES.UNBLOCKED
+                    ).values_list('ip', 'block_type', 'updated')
+                }
+                for ip, entry in list(self.marked.items()):
+                    if ip in entries:
+                        del self.marked[ip]
+                    else:
+                        entries[ip] = entry
+                self.entries = entries
+                logger.info(f"Blocklist snapshot rebuilt with {len(self.entries)} "
+                            + f"blocked clients and {len(self.networks)} "
+                            + f"network ranges, version {self.version}.")
+            return self.entries
+
+    def getNetworks(self) -> NetworkIndex:
+        self.getEntries()
+        return self.networks
+
+    def markBlocked(self, ip: str) -> None:
+        """
+        Blocks the client in this process until a rebuilt snapshot reads the
+        block written in the background.
+        """
+        entry: tuple[str, timezone.datetime] = (
+            constants.BLOCK_TYPES.TEMPORARY, timezone.now())
+        with self.lock:
+            self.marked[ip] = entry
+        entries = dict(self.getEntries())
+        entries[ip] = entry
+        self.entries = entries
+
+    def markUnblocked(self, ip: str) -> None:
+        with self.lock:
+            self.marked.pop(ip, None)
+        entries = dict(self.getEntries())
+        entries.pop(ip, None)
+        self.entries = entries
+
+    def isBlocked(self, ip: str) -> bool:
+        return ip in self.getEntries() or ip in self.getNetworks()
+
+    def isTemporaryBlockEnded(self, ip: str) -> bool:
+        entry: tuple[str, timezone.datetime] | None = self.getEntries().get(ip)
+        if entry is None:
+            return False
+
+        block_type, updated = entry
+        if block_type != constants.BLOCK_TYPES.TEMPORARY:
+            return False
+
+        return updated + timezone.timedelta(days=getParameterValue(
+            constants.PARAMETERS.TEMPORARY_BLOCK_PERIOD)) <= timezone.now()
+
+
+def _listenForChanges(blocklist: Blocklist) -> None:
+    from django_redis import get_redis_connection
+
+    while True:
+        try:
+            pubsub = get_redis_connection('default').pubsub(
+                ignore_subscribe_messages=True)
+            pubsub.subscribe(cache.make_key(constants.CACHE.BLOCKLIST_VERSION))
+            # Changes made while not subscribed
+            blocklist.invalidate()
+            while True:
+                message = pubsub.get_message(timeout=_VERSION_CHECK_INTERVAL)
+                if message is not None or blocklist.version != cache.get(
+                        constants.CACHE.BLOCKLIST_VERSION, 0):
+                    blocklist.invalidate()
+        except Exception as e:
+            logger.exception(e)
+            blocklist.invalidate()
+            time.sleep(_VERSION_CHECK_INTERVAL)
+
+
+_blocklist: Blocklist | None = None
+_blocklist_lock: Lock = Lock()
+
+
+def getBlocklist() -> Blocklist:
+    global _blocklist
+    if _blocklist is not None:
+        return _blocklist
+
+    with _blocklist_lock:
+        if _blocklist is None:
+            blocklist: Blocklist = Blocklist()
+            try:
+                from django_redis import get_redis_connection
+                get_redis_connection('default')
+                Thread(target=_listenForChanges, args=(blocklist,),
+                       daemon=True).start()
+            except (ImportError, NotImplementedError):
+                logger.warning("The default cache is not Redis, the blocklist "
+                               + "changes of other processes will not be seen.")
+            _blocklist = blocklist
+    return _blocklist
+
+
+def blockClient(ip: str, user_agent: str, indefinitely: bool = False) -> None:
+    block_type: str = constants.BLOCK_TYPES.TEMPORARY
+    if BlockedClient.isExists(ip=ip):
+        blocked_client: BlockedClient = BlockedClient.get(ip=ip)
+        blocked_times: int = blocked_client.blocked_times
+        conditions = (
+            indefinitely,
+            not (blocked_times < getParameterValue(
+                constants.PARAMETERS.MAX_TEMPORARY_BLOCK) - 1)
+        )
+        if any(conditions):
+            block_type = constants.BLOCK_TYPES.INDEFINITELY
+        temp_val: int = 1 if blocked_client.block_type != getParameterValue(
+            constants.PARAMETERS.MAX_TEMPORARY_BLOCK) else 0
+        blocked_client.setBlockedTimes(blocked_times + temp_val)
+        blocked_client.setBlockType(block_type)
+    else:
+        if indefinitely:
+            block_type = constants.BLOCK_TYPES.INDEFINITELY
+        BlockedClient.create(ip=ip,
+                             user_agent=user_agent,
+                             block_type=block_type
+                             )
+    logger.warning(f"Client at IP address [{ip}] "
+                   + f"was {block_type} blocked")
+    publishSecurityEvent(constants.SECURITY_EVENT.BLOCK, ip,
+                         detail=constants.BLOCK_TYPES_AR[int(block_type)])
+
+
+def unblockClient(ip: str) -> None:
+    # An update, saving would locate the client again
+    if not BlockedClient.objects.filter(ip=ip).exclude(
+            block_type=constants.BLOCK_TYPES.UNBLOCKED).update(
+            block_type=constants.BLOCK_TYPES.UNBLOCKED, updated=timezone.now()):
+        return
+    bumpBlocklistVersion()
+    publishSecurityEvent(constants.SECURITY_EVENT.UNBLOCK, ip)
+
+
+def _chunks(values: list, size: int = BULK_CHUNK_SIZE) -> Iterable[list]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def liftExpiredBlocks() -> int:
+    """
+    Unblocks the clients whose temporary block ended, in one update per
+    chunk, and returns their count. The middleware still unblocks a client
+    lazily if it comes back before the sweep.
+    """
+    expired_before: timezone.datetime = timezone.now() - timezone.timedelta(
+        days=getParameterValue(constants.PARAMETERS.TEMPORARY_BLOCK_PERIOD))
+    expired: list[tuple[int, str]] = list(BlockedClient.objects.filter(
+        block_type=constants.BLOCK_TYPES.TEMPORARY,
+        updated__lte=expired_before).values_list('id', 'ip'))
+
+    lifted: list[str] = []
+    for chunk in _chunks(expired):
+        ids: dict[int, str] = dict(chunk)
+        count: int = BlockedClient.objects.filter(
+            id__in=list(ids), block_type=constants.BLOCK_TYPES.TEMPORARY,
+            updated__lte=expired_before
+        ).update(block_type=constants.BLOCK_TYPES.UNBLOCKED,
+                 updated=timezone.now())
+        if count:
+            lifted += ids.values()
+
+    if lifted:
+        bumpBlocklistVersion()
+        publishSecurityEvents([
+            createSecurityEvent(constants.SECURITY_EVENT.UNBLOCK, ip)
+            for ip in lifted])
+    return len(lifted)
+
+
+@dataclass
+class BlocklistChange:
+    ips: int = 0
+    networks: int = 0
+    invalid: list[str] = field(default_factory=list)
+
+
+def parseBlocklist(text: str) -> tuple[list[str], list[str], list[str]]:
+    """
+    Reads one IP or CIDR range per line, anything after a '#' is a comment.
+    Returns the IPs, the networks and the invalid lines.
+    """
+    ips: dict[str, None] = {}
+    networks: dict[str, None] = {}
+    invalid: list[str] = []
+    for line in text.splitlines():
+        value: str = line.split('#', 1)[0].strip()
+        if not value:
+            continue
+        try:
+            network = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            invalid.append(value)
+            continue
+        if network.prefixlen == network.max_prefixlen:
+            ips[str(network.network_address)] = None
+        else:
+            networks[str(network)] = None
+    return list(ips), list(networks), invalid
+
+
+def importBlocklist(text: str, note: str | None = None) -> BlocklistChange:
+    """
+    Blocks the listed IPs and networks indefinitely.
+    """
+    ips, networks, invalid = parseBlocklist(text)
+    change: BlocklistChange = BlocklistChange(invalid=invalid)
+    now: timezone.datetime = timezone.now()
+    for chunk in _chunks(ips):
+        existing: set[str] = set(BlockedClient.objects.filter(
+            ip__in=chunk).values_list('ip', flat=True))
+        change.ips += BlockedClient.objects.filter(ip__in=existing).exclude(
+            block_type=constants.BLOCK_TYPES.INDEFINITELY
+        ).update(block_type=constants.BLOCK_TYPES.INDEFINITELY,
+                 blocked_times=F('blocked_times') + 1, updated=now)
+        change.ips += len(BlockedClient.objects.bulk_create([
+            BlockedClient(ip=ip, block_type=constants.BLOCK_TYPES.INDEFINITELY)
+            for ip in chunk if ip not in existing
+        ]))
+
+    for chunk in _chunks(networks):
+        existing = set(BlockedNetwork.objects.filter(
+            network__in=chunk).values_list('network', flat=True))
+        change.networks += len(BlockedNetwork.objects.bulk_create([
+            BlockedNetwork(network=network, note=note)
+            for network in chunk if network not in existing
+        ], ignore_conflicts=True))
+
+    if change.ips or change.networks:
+        bumpBlocklistVersion()
+        detail: str = constants.BLOCK_TYPES_AR[int(
+            constants.BLOCK_TYPES.INDEFINITELY)]
+        publishSecurityEvents([
+            createSecurityEvent(constants.SECURITY_EVENT.BLOCK, value,
+                                detail=detail)
+            for value in ips + networks])
+    return change
+
+
+def removeFromBlocklist(text: str) -> BlocklistChange:
+    """
+    Unblocks the listed IPs and deletes the listed networks.
+    """
+    ips, networks, invalid = parseBlocklist(text)
+    change: BlocklistChange = BlocklistChange(invalid=invalid)
+    for chunk in _chunks(ips):
+        change.ips += BlockedClient.objects.filter(ip__in=chunk).exclude(
+            block_type=constants.BLOCK_TYPES.UNBLOCKED
+        ).update(block_type=constants.BLOCK_TYPES.UNBLOCKED,
+                 updated=timezone.now())
+    for chunk in _chunks(networks):
+        change.networks += BlockedNetwork.objects.filter(
+            network__in=chunk).delete()[0]
+
+    if change.ips or change.networks:
+        bumpBlocklistVersion()
+        publishSecurityEvents([
+            createSecurityEvent(constants.SECURITY_EVENT.UNBLOCK, value)
+            for value in ips + networks])
+    return change
+
+
+def exportBlocklist() -> str:
+    """
+    The blocked networks and IPs, one per line, in the format read by
+    `importBlocklist`.
+    """
+    lines: list[str] = [
+        f"{network}  # {note}" if note else network
+        for network, note in BlockedNetwork.objects.order_by(
+            'network').values_list('network', 'note').iterator()
+    ]
+    lines += [
+        f"{ip}  # {constants.BLOCK_TYPES_AR[int(block_type)]}"
+        for ip, block_type in BlockedClient.objects.exclude(
+            block_type=constants.BLOCK_TYPES.UNBLOCKED
+        ).order_by('id').values_list('ip', 'block_type').iterator()
+    ]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def bumpBlocklistVersion() -> None:
+    """
+    Invalidates the blocklist snapshot of this process and announces the
+    new version to the other processes.
+    """
+    if not cache.add(constants.CACHE.BLOCKLIST_VERSION, 1, None):
+        cache.incr(constants.CACHE.BLOCKLIST_VERSION)
+
+    if _blocklist is not None:
+        _blocklist.invalidate()
+
+    try:
+        from django_redis import get_redis_connection
+        get_redis_connection('default').publish(
+            cache.make_key(constants.CACHE.BLOCKLIST_VERSION), 1)
+    except (ImportError, NotImplementedError):
+        pass
@@ -0,0 +1,148 @@
+"""
+Renders the membership cards.
+
+The template is decoded and the fonts are loaded once per thread, so once
+per worker process, and every card starts from a copy of the decoded
+template. PIL draws the photograph and the English text, then cairo, which
+shapes the Arabic text, draws on a buffer holding the same pixels in its
+own format. PIL reads the buffer back and encodes the JPEG once, nothing is
+written to the disk.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+import sys
+from threading import local
+from typing import Final
+
+import arabic_reshaper
+import cairo
+from bidi.algorithm import get_display
+from django.conf import settings
+from PIL import Image as Img
+from PIL import ImageDraw as ImgDraw
+from PIL import ImageFont
+from PIL.Image import Image
+from PIL.ImageDraw import ImageDraw
+from PIL.ImageFont import FreeTypeFont
+
+CARD_JPEG_QUALITY: Final[int] = 85
+CARD_PHOTOGRAPH_SIZE: Final[tuple[int, int]] = (230, 230)
+BLACK: Final[tuple[int, ...]] = (0, 0, 0)
+WHITE: Final[tuple[int, ...]] = (255, 255, 255)
+ARABIC_FONT_FACE: Final[str] = "Noto Naskh Arabic"
+ARABIC_FONT_SIZE: Final[int] = 36
+# cairo keeps a pixel in a native endian 32 bits word, the unused byte on top
+CAIRO_RAW_MODE: Final[str] = 'BGRX' if sys.byteorder == 'little' else 'XRGB'
+
+# The fonts are not safe to share between threads
+_card_renderers: local = local()
+
+
+def getTemplatePath() -> Path:
+    return settings.MEDIA_ROOT / 'templates/membership_template.jpg'
+
+
+def getFontsDir() -> Path:
+    return settings.STATICFILES_DIRS[0] / 'fonts'
+
+
+@dataclass(frozen=True)
+class MembershipCardData:
+    name_ar: str
+    name_en: str
+    city_ar: str
+    city_en: str
+    membership_type_ar: str
+    membership_type_en: str
+    issue_date: str
+    expire_date: str
+    card_number: str
+
+
+class CardRenderer:
+    """
+    Draws the data of a member on the membership card template.
+    """
+
+    def __init__(self, template_path: Path | None = None,
+                 fonts_dir: Path | None = None) -> None:
+        fonts_dir = fonts_dir or getFontsDir()
+        with Img.open(template_path or getTemplatePath()) as template:
+            self.template: Image = template.convert('RGB')
+        self.arabic_font: FreeTypeFont = ImageFont.truetype(
+            str(fonts_dir / "NotoNaskhArabic-Regular.ttf"), ARABIC_FONT_SIZE)
+        self.english_fonts: dict[int, FreeTypeFont] = {
+            size: ImageFont.truetype(str(fonts_dir / "FiraSans-Regular.ttf"), size)
+            for size in (26, 28, 32)
+        }
+
+    def render(self, photograph: Image, card: MembershipCardData) -> bytes:
+        """
+        Returns the card as JPEG, the photograph is pasted with its alpha
+        channel as the mask.
+        """
+        image: Image = self.template.copy()
+        if photograph.size != CARD_PHOTOGRAPH_SIZE:
+            photograph = photograph.resize(CARD_PHOTOGRAPH_SIZE)
+        image.paste(photograph, (41, 240),
+                    mask=photograph.convert('RGBA').split()[-1])
+
+        draw: ImageDraw = ImgDraw.Draw(image)
+        draw.text((430, 255), card.name_en,
+                  font=self.english_fonts[28], fill=BLACK)
+        draw.text((402, 314), card.city_en,
+                  font=self.english_fonts[28], fill=BLACK)
+        draw.text((608, 377), card.membership_type_en,
+                  font=self.english_fonts[28], fill=BLACK)
+        draw.text((615, 435), card.issue_date,
+                  font=self.english_fonts[32], fill=BLACK)
+        draw.text((505, 518), card.card_number,
+                  font=self.arabic_font, fill=WHITE)
+        draw.text((472, 586), card.expire_date,
+                  font=self.english_fonts[26], fill=WHITE)
+
+        self.drawArabicText(image, (
+            (card.name_ar, 950, 238),
+            (card.city_ar, 940, 338),
+            (card.membership_type_ar, 856, 409),
+        ))
+
+        image_io: BytesIO = BytesIO()
+        image.save(image_io, format="JPEG", quality=CARD_JPEG_QUALITY)
+        return image_io.getvalue()
+
+    def drawArabicText(self, image: Image,
+                       texts: tuple[tuple[str, int, int], ...]) -> None:
+        """
+        Draws every text ending at its x, at its y, on the image in place.
+        """
+        width, height = image.size
+        # A 32 bits pixel is always aligned, the rows are not padded
+        stride: int = width * 4
+        buffer: bytearray = bytearray(image.tobytes('raw', CAIRO_RAW_MODE))
+        surface = cairo.ImageSurface.create_for_data(
+            buffer, cairo.FORMAT_RGB24, width, height, stride)
+        context = cairo.Context(surface)
+        context.select_font_face(ARABIC_FONT_FACE)
+        context.set_font_size(ARABIC_FONT_SIZE)
+        context.set_source_rgb(*BLACK)
+        for text, right, top in texts:
+            reshaped: str = get_display(arabic_reshaper.reshape(text),
+                                        base_dir='L')
+            context.move_to(right - self.arabic_font.getlength(reshaped), top)
+            context.show_text(reshaped)
+        surface.flush()
+        surface.finish()
+        # The decoder only reads immutable bytes
+        image.frombytes(bytes(buffer), 'raw', CAIRO_RAW_MODE, stride, 1)
+
+
+def getCardRenderer() -> CardRenderer:
+    card_renderer: CardRenderer | None = getattr(
+        _card_renderers, 'card_renderer', None)
+    if card_renderer is None:
+        card_renderer = CardRenderer()
+        _card_renderers.card_renderer = card_renderer
+    return card_renderer
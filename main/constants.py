@@ -167,6 +167,19 @@ BLOCK_TYPES_AR: Final[tuple[str, ...]] = (
     'حظر مؤقت',
     'حظر مؤبد',
 )
+SECURITY_EVENT = _NT('str', [
+    'BLOCK',
+    'UNBLOCK',
+    'ATTACK_ATTEMPT',
+    'SUSPICIOUS_POST',
+    'LOGGED_FAILED',
+])(
+    'block',
+    'unblock',
+    'attack_attempt',
+    'suspicious_post',
+    'logged_failed',
+)
 DATA_TYPE = _NT('str', [
     'STRING',
     'INTEGER',
@@ -267,6 +280,7 @@ MEDIA_DIR = _NT('str', [
     'EMAIL_ATTACHMENTS_DIR',
     'PUBLIC_DIR',
     'FORMS_HEADERS_DIR',
+    'BACKGROUND_REMOVED_DIR',
 ])(
     'documents/images/photographs',
     'documents/images/passportImages',
@@ -279,6 +293,7 @@ MEDIA_DIR = _NT('str', [
     'broadcast/emailAttachment',
     'public/',
     'public/forms',
+    'documents/images/backgroundRemoved',
 )
 _MIME_TYPE: dict[str, str] = {
     'AVI': 'video/x-msvideo',
@@ -609,7 +624,12 @@ PAGES = _NT('str', [
     # Monitor pages
     'MONITOR_PAGE',
     'ACTIVITY_LOG_PAGE',
+    'EXPORT_ACTIVITY_LOG_PAGE',
     'BLOCK_LIST_PAGE',
+    'IMPORT_BLOCK_LIST_PAGE',
+    'EXPORT_BLOCK_LIST_PAGE',
+    'PROFILING_PAGE',
+    'SECURITY_EVENTS_STREAM',
 
     # Company user pages
     'COMPANY_USERS_PAGE',
@@ -685,7 +705,12 @@ PAGES = _NT('str', [
     # Monitor pages
     'MonitorPage',
     'ActivityLogPage',
+    'ExportActivityLogPage',
     'BlockListPage',
+    'ImportBlockListPage',
+    'ExportBlockListPage',
+    'ProfilingPage',
+    'SecurityEventsStream',
 
     # Company user pages
     'CompanyUsersPage',
@@ -758,6 +783,7 @@ TEMPLATES = _NT('str', [
     'MONITOR_PAGE_TEMPLATE',
     'ACTIVITY_LOG_PAGE_TEMPLATE',
     'BLOCK_LIST_PAGE_TEMPLATE',
+    'PROFILING_PAGE_TEMPLATE',
 
     # Company user templates
     'COMPANY_USERS_PAGE_TEMPLATE',
@@ -829,6 +855,7 @@ TEMPLATES = _NT('str', [
     f'{_main_app__templates_folder}/monitor.html',
     f'{_main_app__templates_folder}/activity_log.html',
     f'{_main_app__templates_folder}/block_list.html',
+    f'{_main_app__templates_folder}/profiling.html',
 
     # Company user templates
     f'{_main_app__templates_folder}/company_users.html',
@@ -874,7 +901,6 @@ PARAMETERS = _NT('str', [
     "TEMPORARY_BLOCK_PERIOD",
     "TIME_OUT_PERIOD",
     "BETWEEN_POST_REQUESTS_TIME",
-    "MAGIC_NUMBER",
     "MEMBERSHIP_EXPIRE_PERIOD",
     "THREE_CHARACTER_PREFIX_FOR_MEMBERSHIP",
     "MEMBER_FORM_POST_LIMIT",
@@ -885,6 +911,7 @@ PARAMETERS = _NT('str', [
     "MEMBERSHIP_TRANSFER_INFO_IMAGE",
     "REQUEST_MAX_LIMIT_PER_SECOND",
     "DEFAULT_PAYMENT_ACCOUNT",
+    "PROFILING_SAMPLE_RATE",
 ])(
     "ALLOWED_LOGGED_IN_ATTEMPTS",
     "ALLOWED_LOGGED_IN_ATTEMPTS_RESET",
@@ -892,7 +919,6 @@ PARAMETERS = _NT('str', [
     "TEMPORARY_BLOCK_PERIOD",
     "TIME_OUT_PERIOD",
     "BETWEEN_POST_REQUESTS_TIME",
-    "MAGIC_NUMBER",
     "MEMBERSHIP_EXPIRE_PERIOD",
     "THREE_CHARACTER_PREFIX_FOR_MEMBERSHIP",
     "MEMBER_FORM_POST_LIMIT",
@@ -903,13 +929,18 @@ PARAMETERS = _NT('str', [
     "MEMBERSHIP_TRANSFER_INFO_IMAGE",
     "REQUEST_MAX_LIMIT_PER_SECOND",
     "DEFAULT_PAYMENT_ACCOUNT",
+    "PROFILING_SAMPLE_RATE",
 )
 CACHE = _NT('str', [
-    "LAST_AUDIT_ENTRY_QUERYSET",
     "ALLOWED_ClIENTS",
+    "BLOCKLIST_VERSION",
+    "PARAMETERS_VERSION",
+    "SECURITY_EVENTS",
 ])(
-    "LAST_AUDIT_ENTRY_QUERYSET",
     "ALLOWED_ClIENTS",
+    "BLOCKLIST_VERSION",
+    "PARAMETERS_VERSION",
+    "SECURITY_EVENTS",
 )
 STAFF_PERMISSIONS: Final[dict[str, tuple[str, ...]]] = {
     "COMMON": (
@@ -935,7 +966,12 @@ STAFF_PERMISSIONS: Final[dict[str, tuple[str, ...]]] = {
     GROUPS.MONITOR: (
         PAGES.MONITOR_PAGE,
         PAGES.ACTIVITY_LOG_PAGE,
+        PAGES.EXPORT_ACTIVITY_LOG_PAGE,
         PAGES.BLOCK_LIST_PAGE,
+        PAGES.IMPORT_BLOCK_LIST_PAGE,
+        PAGES.EXPORT_BLOCK_LIST_PAGE,
+        PAGES.PROFILING_PAGE,
+        PAGES.SECURITY_EVENTS_STREAM,
     ),
     GROUPS.COMPANY_USER: (
         PAGES.COMPANY_USERS_PAGE,
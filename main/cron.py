@@ -5,62 +5,39 @@ from typing import Final
 
 from django.conf import settings
 from django.core.management import call_command
-from django.core.cache import cache
 from django.db.models.query import QuerySet
 from django.utils import timezone
 
 from member.models import Person
-from parameter.models import Parameter
 
-from . import constants
+from . import audit, constants
+from .blocklist import liftExpiredBlocks as _liftExpiredBlocks
 from .google import GoogleDriveService, FileResources, MIME_TYPE
-from .models import AuditEntry
-from parameter.service import getParameterValue
 
 logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
 
 
-def setMagicNumber() -> None:
-    """
-    # ------------------------------------------------------------- #
-    # This is the last object that is not included of the specified #
-    # period of allowed logged in attempts reset                    #
-    # Ex. if the parameter 'ALLOWED_LOGGED_IN_ATTEMPTS_RESET'       #
-    # set to 7 days, the last object that will be reset, It will be #
-    # saved in the in 'MAGIC_NUMBER' parameter, to make the search  #
-    # in the table 'AuditEntry' faster and more scalable            #
-    # ------------------------------------------------------------- #
-    """
-    logger.info('=========== CRON START SETTING MAGIC NUMBER ===========')
-    magic_number: int = getParameterValue(constants.PARAMETERS.MAGIC_NUMBER)
-    reset_days: int = getParameterValue(
-        constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS_RESET)
-    last_audit_entry: QuerySet[AuditEntry] = AuditEntry.filter(
-        id__gte=magic_number,
-        created__range=(timezone.now() - timezone.timedelta(days=reset_days),
-                        timezone.now()))
-    try:
-        magic_number = last_audit_entry[0].id
-    except IndexError:
-        try:
-            magic_number = AuditEntry.getLastInsertedObject().id
-        except AttributeError:
-            magic_number = 1
-
-    # cleanup unsuspicious post requests
-    AuditEntry.filter(
-        id__lt=magic_number,
-        action=constants.ACTION.NORMAL_POST
-    ).delete()
-
-    # This is the only time which a parameter updated in code
-    pram = Parameter.get(name=constants.PARAMETERS.MAGIC_NUMBER)
-    pram.value = magic_number  # NOQA
-    pram.save()
-    # Reset the last audit entry cache
-    cache.delete(constants.CACHE.LAST_AUDIT_ENTRY_QUERYSET)
-    logger.info(f'Magic Number Updated to [{magic_number}].')
-    logger.info('=========== CRON FINISH SETTING MAGIC NUMBER ===========')
+def archiveAuditEntries() -> None:
+    logger.info('=========== CRON START ARCHIVING AUDIT ENTRIES ===========')
+    for action, (moved, deleted) in audit.archiveAuditEntries().items():
+        logger.info(f"{action}: {moved} entries moved out of the hot table, "
+                    + f"{deleted} archived entries deleted.")
+    logger.info('=========== CRON FINISH ARCHIVING AUDIT ENTRIES ===========')
+
+
+def rollupAuditEntries() -> None:
+    logger.info('=========== CRON START AUDIT ROLLUPS ===========')
+    today = timezone.now().date()
+    count: int = audit.rebuildAuditRollups(
+        today - timezone.timedelta(days=audit.ROLLUP_REBUILD_DAYS - 1), today)
+    logger.info(f"Recounted {count} audit rollups.")
+    logger.info('=========== CRON FINISH AUDIT ROLLUPS ===========')
+
+
+def liftExpiredBlocks() -> None:
+    logger.info('=========== CRON START LIFTING EXPIRED BLOCKS ===========')
+    logger.info(f"{_liftExpiredBlocks()} temporary blocks lifted.")
+    logger.info('=========== CRON FINISH LIFTING EXPIRED BLOCKS ===========')
 
 
 def DBBackup() -> None:
@@ -69,7 +46,7 @@ def DBBackup() -> None:
     try:
         options: dict[str, str] = {
             'servername': 'yemeni-community-indonesia',
-            'exclude_tables': 'main_auditentry'
+            'exclude_tables': 'main_auditentry,main_auditentryarchive'
         }
         call_command('dbbackup', **options)
 
@@ -0,0 +1,254 @@
+from __future__ import annotations
+from bisect import bisect_right
+import csv
+from ipaddress import ip_address
+import logging
+from logging import Logger
+from pathlib import Path
+from threading import Lock
+from typing import Final, Protocol
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils.module_loading import import_string
+import requests
+
+from . import constants
+from .background import BatchWorker
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+_API_URL: Final[str] = "https://api.iplocation.net/?ip=%s"
+_API_TIMEOUT: Final[float] = 5
+_UNKNOWN_COUNTRY: Final[str] = 'unknown'
+
+
+def _normalizeCountry(country: str | None) -> str:
+    if not country or country == '-':
+        return _UNKNOWN_COUNTRY
+    if country.startswith("United Kingdom"):
+        return 'United Kingdom'
+    return country[:30]
+
+
+class GeolocationProvider(Protocol):
+    def lookup(self, ip: str) -> str | None: ...
+
+
+class IpLocationApiProvider:
+    """
+    Looks the IPs up with api.iplocation.net over one pooled session.
+    """
+
+    def __init__(self) -> None:
+        self.session: requests.Session = requests.Session()
+        self.calls: int = 0
+        self.failed_calls: int = 0
+
+    def lookup(self, ip: str) -> str | None:
+        self.calls += 1
+        try:
+            response = self.session.get(_API_URL % ip, timeout=_API_TIMEOUT)
+        except requests.RequestException as e:
+            self.failed_calls += 1
+            logger.error(f"IP [{ip}] location request failed: {e}")
+            return None
+
+        if response.status_code != requests.codes.ok:
+            self.failed_calls += 1
+            logger.error("Response Code: [" + str(response.status_code)
+                         + "] | Response: " + response.text)
+            return None
+
+        return _normalizeCountry(response.json().get('country_name'))
+
+
+class OfflineProvider:
+    """
+    Looks the IPs up in a local file, either a MaxMind database (.mmdb)
+    which requires the `maxminddb` package, or a CSV file of
+    (first ip, last ip, country) rows.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path: Path = Path(path)
+        self.calls: int = 0
+        self.failed_calls: int = 0
+        self.reader = None
+        self.starts: list[int] = []
+        self.ranges: list[tuple[int, str]] = []
+
+        if self.path.suffix.lower() == '.mmdb':
+            import maxminddb
+            self.reader = maxminddb.open_database(str(self.path))
+        else:
+            rows: list[tuple[int, int, str]] = []
+            with open(self.path, newline='', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    try:
+                        rows.append((int(ip_address(row[0].strip())),
+                                     int(ip_address(row[1].strip())),
+                                     row[2].strip()))
+                    except (ValueError, IndexError):
+                        # Header or malformed row
+                        continue
+            rows.sort()
+            self.starts = [start for start, _, _ in rows]
+            self.ranges = [(end, country) for _, end, country in rows]
+            logger.info(f"Loaded {len(rows)} IP ranges from '{self.path}'.")
+
+    def lookup(self, ip: str) -> str | None:
+        self.calls += 1
+        if self.reader is not None:
+            record: dict | None = self.reader.get(ip)
+            if not record or 'country' not in record:
+                return _UNKNOWN_COUNTRY
+            return _normalizeCountry(record['country']['names'].get('en'))
+
+        address: int = int(ip_address(ip))
+        i: int = bisect_right(self.starts, address) - 1
+        if i >= 0 and address <= self.ranges[i][0]:
+            return _normalizeCountry(self.ranges[i][1])
+        return _UNKNOWN_COUNTRY
+
+
+class StubProvider:
+    """
+    Looks nothing up, e.g. while testing.
+    """
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.failed_calls: int = 0
+
+    def lookup(self, ip: str) -> str | None:
+        self.calls += 1
+        return None
+
+
+class GeolocationService(BatchWorker):
+    """
+    Resolves the country of the client IPs in batches on a single worker.
+    An IP is looked up in the in-memory cache, then the `IpLocation` table,
+    and only then with the provider. The rows of the audit entries and the
+    blocked clients are updated with one UPDATE per country in a batch.
+    """
+
+    def __init__(self, provider: GeolocationProvider, max_cached: int = 10_000,
+                 ttl: int = constants.DEFAULT_CACHE_EXPIRE) -> None:
+        super().__init__('geolocation')
+        self.provider: GeolocationProvider = provider
+        # Not thread safe, a read evicts the expired IPs
+        self.countries: TTLCache = TTLCache(maxsize=max_cached, ttl=ttl)
+        self.countries_lock: Lock = Lock()
+        self.pending: set[str] = set()
+        self.pending_lock: Lock = Lock()
+        self.lookups: int = 0
+        self.cache_hits: int = 0
+        self.table_hits: int = 0
+
+    def getCountry(self, ip: str) -> str | None:
+        """
+        Returns the country of the IP if it is in the in-memory cache.
+        """
+        self.lookups += 1
+        with self.countries_lock:
+            country: str | None = self.countries.get(ip)
+        if country is not None:
+            self.cache_hits += 1
+        return country
+
+    def locate(self, ip: str) -> None:
+        """
+        Queues the IP to be resolved and its rows updated, an IP which is
+        already queued is not queued again.
+        """
+        with self.pending_lock:
+            if ip in self.pending:
+                return
+            self.pending.add(ip)
+        self.put(ip)
+
+    def process(self, batch: list[str]) -> None:
+        from .models import AuditEntry, BlockedClient, IpLocation
+
+        with self.pending_lock:
+            self.pending.difference_update(batch)
+
+        countries: dict[str, str] = {}
+        missing: list[str] = []
+        with self.countries_lock:
+            for ip in batch:
+                country: str | None = self.countries.get(ip)
+                if country is None:
+                    missing.append(ip)
+                else:
+                    countries[ip] = country
+
+        if missing:
+            for ip, country in IpLocation.objects.filter(
+                    ip__in=missing).values_list('ip', 'country'):
+                countries[ip] = country
+                self.table_hits += 1
+
+            new_locations: list[IpLocation] = []
+            for ip in missing:
+                if ip in countries:
+                    continue
+                country = self.provider.lookup(ip)
+                if country is None:
+                    continue
+                countries[ip] = country
+                new_locations.append(IpLocation(ip=ip, country=country))
+            IpLocation.objects.bulk_create(new_locations,
+                                           ignore_conflicts=True)
+
+        ips_by_country: dict[str, list[str]] = {}
+        with self.countries_lock:
+            self.countries.update(countries)
+        for ip, country in countries.items():
+            ips_by_country.setdefault(country, []).append(ip)
+
+        for country, ips in ips_by_country.items():
+            for model in (AuditEntry, BlockedClient):
+                model.objects.filter(ip__in=ips, country='-').update(
+                    country=country)
+
+        logger.debug(f"Geolocation metrics: {self.getMetrics()}")
+
+    def getMetrics(self) -> dict[str, int | float]:
+        return {
+            'lookups': self.lookups,
+            'cache_hits': self.cache_hits,
+            'cache_hit_rate': self.cache_hits / self.lookups if self.lookups else 0,
+            'table_hits': self.table_hits,
+            'outbound_calls': self.provider.calls,
+            'failed_outbound_calls': self.provider.failed_calls,
+        }
+
+
+_geolocation_service: GeolocationService | None = None
+_geolocation_service_lock: Lock = Lock()
+
+
+def getGeolocationService() -> GeolocationService:
+    global _geolocation_service
+    if _geolocation_service is not None:
+        return _geolocation_service
+
+    with _geolocation_service_lock:
+        if _geolocation_service is None:
+            provider: GeolocationProvider
+            if settings.IP_GEOLOCATION_PROVIDER:
+                provider = import_string(settings.IP_GEOLOCATION_PROVIDER)()
+            elif settings.IP_GEOLOCATION_DATABASE:
+                provider = OfflineProvider(settings.IP_GEOLOCATION_DATABASE)
+            else:
+                provider = IpLocationApiProvider()
+            _geolocation_service = GeolocationService(provider)
+    return _geolocation_service
+
+
+def shutdownGeolocationService() -> None:
+    if _geolocation_service is not None:
+        _geolocation_service.shutdown()
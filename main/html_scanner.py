@@ -0,0 +1,81 @@
+from __future__ import annotations
+import re
+from typing import Final, Iterable, Protocol
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import constants
+
+# The posted values longer than this are rejected as if they contained HTML
+DEFAULT_MAX_FIELD_LENGTH: Final[int] = 1_048_576
+
+
+class HtmlScanner(Protocol):
+    def containsHtml(self, value: str) -> bool: ...
+
+
+class TagScanner:
+    """
+    Detects what `constants.HTML_TAGS_PATTERN` matches, a tag followed by a
+    closing tag, with each tag on a single line. Unlike the pattern it scans
+    every character a bounded number of times, so the time is linear in the
+    length of the value whatever it contains.
+    """
+
+    def containsHtml(self, value: str) -> bool:
+        end: int = self._findTagEnd(value, 0, '<')
+        return end != -1 and self._findTagEnd(value, end, '</') != -1
+
+    @staticmethod
+    def _findTagEnd(value: str, start: int, opening: str) -> int:
+        """
+        Returns the index after the first tag starting at or after `start`,
+        or -1. A tag is `opening` followed by a '>' on the same line.
+        """
+        closing: int = -1
+        while True:
+            tag_start: int = value.find(opening, start)
+            if tag_start == -1:
+                return -1
+            if closing <= tag_start:
+                closing = value.find('>', tag_start + len(opening))
+                if closing == -1:
+                    return -1
+            new_line: int = value.find('\n', tag_start, closing)
+            if new_line == -1:
+                return closing + 1
+            start = new_line + 1
+
+
+class RegexScanner:
+    """
+    Searches the values with a regular expression compiled once.
+    """
+
+    def __init__(self, pattern: str = constants.HTML_TAGS_PATTERN) -> None:
+        self.pattern: re.Pattern[str] = re.compile(pattern)
+
+    def containsHtml(self, value: str) -> bool:
+        return self.pattern.search(value) is not None
+
+
+_html_scanner: HtmlScanner = import_string(
+    getattr(settings, 'HTML_SCANNER', 'main.html_scanner.TagScanner'))()
+
+
+def isThereHtml(values: Iterable[str],
+                max_field_length: int = DEFAULT_MAX_FIELD_LENGTH) -> bool:
+    """
+    Returns on the first value containing HTML, the values up to
+    `max_field_length` are scanned whole and the longer ones are treated as
+    containing HTML, so no part of a posted value is left unscanned.
+    """
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        if len(value) > max_field_length:
+            return True
+        if _html_scanner.containsHtml(value):
+            return True
+    return False
@@ -0,0 +1,94 @@
+"""
+Validates the uploaded photographs in a pool of worker processes.
+
+The face detection holds the CPU for a while, in the request it would hold
+a web worker too and the registrations submitted at the same time would
+queue behind it. The photographs are validated in `IMAGE_WORKERS` spawned
+processes instead, each one loading the face detection cascade once, and
+the request waits for the result at most `PHOTOGRAPH_TIMEOUT` seconds.
+
+The size of a photograph is checked from its headers in the request, so an
+undersized one is rejected without being decoded nor sent to the pool.
+"""
+from __future__ import annotations
+import atexit
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from logging import Logger
+from multiprocessing import get_context
+from threading import Lock
+from typing import IO, Final
+
+from django.conf import settings
+
+from . import constants
+from .image_processing import ImageProcessingError, ImageProcessor
+from .image_worker import initializeWorker, validateAndResizePhotograph
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+PHOTOGRAPH_TIMEOUT: Final[float] = 20
+
+_image_pool: ProcessPoolExecutor | None = None
+_image_pool_lock: Lock = Lock()
+
+
+def getImagePool() -> ProcessPoolExecutor | None:
+    """
+    Returns the pool, None when the photographs are validated in the
+    request, e.g. while testing.
+    """
+    global _image_pool
+    if settings.BACKGROUND_TASKS_INLINE or not settings.IMAGE_WORKERS:
+        return None
+    if _image_pool is not None:
+        return _image_pool
+
+    with _image_pool_lock:
+        if _image_pool is None:
+            # Spawned, forking a process running threads may copy held locks
+            _image_pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=get_context('spawn'),
+                initializer=initializeWorker)
+    return _image_pool
+
+
+@atexit.register
+def shutdownImagePool() -> None:
+    global _image_pool
+    with _image_pool_lock:
+        image_pool: ProcessPoolExecutor | None = _image_pool
+        _image_pool = None
+    if image_pool is not None:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def validatePhotograph(fp: IO[bytes], timeout: float = PHOTOGRAPH_TIMEOUT) -> bytes:
+    """
+    Validates, crops and resizes the photograph as
+    `ImageProcessor.validateAndResizePhotograph` in a worker process.
+    """
+    # Not closed, that would close the uploaded file too
+    ImageProcessor.checkPhotographSize(fp)
+    fp.seek(0)
+    image_pool: ProcessPoolExecutor | None = getImagePool()
+    if image_pool is None:
+        return ImageProcessor.validateAndResizePhotograph(fp)
+
+    future: Future = image_pool.submit(validateAndResizePhotograph, fp.read())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        logger.warning("The photograph validation timed out.")
+        raise ImageProcessingError(
+            "الخادم مشغول حاليا، يرجى المحاولة مرة أخرى بعد قليل")
+    except BrokenProcessPool:
+        # A worker died, e.g. killed for its memory, the next call starts
+        # a new pool
+        logger.exception("The image pool is broken.")
+        shutdownImagePool()
+        raise ImageProcessingError(
+            "الخادم مشغول حاليا، يرجى المحاولة مرة أخرى بعد قليل")
@@ -16,88 +16,125 @@
 * E-Mail: msmabk11@gmail.com
 * Version: 1.0.0
 """
-import os
+from math import ceil
 
 from io import BytesIO
 from logging import Logger
 from pathlib import Path
 from typing import Final
-from tempfile import NamedTemporaryFile as TemporaryFile
+from threading import local
 
-import arabic_reshaper
 import logging
-import requests
-import cairo
 import cv2
 
-from bidi.algorithm import get_display
-from django.conf import settings
 from numpy import array as numpyArray
 from numpy import ndarray as NDArray
 
 from PIL import Image as Img
 from PIL import ImageDraw as ImgDraw
-from PIL import ImageFont, ImageOps
+from PIL import ImageOps
 from PIL.Image import Image
 from PIL.ImageDraw import ImageDraw
 
-from main.constants import PARAMETERS
-from parameter.service import getParameterValue
+from main.card_renderer import MembershipCardData, getCardRenderer
 
 logger: Logger = logging.getLogger("YCI.Main")
 
 
+PHOTOGRAPH_WIDTH: Final[int] = 400
+PHOTOGRAPH_HEIGHT: Final[int] = 400
+# The ratio of the first resizing is a multiple of 1 / RESIZE_ACCURACY,
+# higher is closer to the expected size
+RESIZE_ACCURACY: Final[int] = 10
+# The faces are detected on a thumbnail this many times smaller
+DETECTION_SCALE: Final[int] = 2
+# Larger photographs take too long to decode, no camera needs that many
+PHOTOGRAPH_MAX_PIXELS: Final[int] = 50_000_000
+CASCADE_PATH: Final[Path] = Path(cv2.__file__).parent.absolute(
+) / 'data/haarcascade_frontalface_default.xml'
+
+# The cascade is not safe to share between threads
+_face_cascades: local = local()
+
+
+def getPhotographWorkingSize(width: int, height: int) -> tuple[int, int]:
+    """
+    The size the photograph is resized to before the face detection, its
+    shorter side scaled down to a little over the expected one, the ratio
+    being a multiple of 1 / `RESIZE_ACCURACY`.
+    """
+    shorter: int = min(width, height)
+    expected: int = PHOTOGRAPH_HEIGHT if width > height else PHOTOGRAPH_WIDTH
+    # The number of 1 / RESIZE_ACCURACY steps of the expected size the
+    # shorter side is over it, the last partial step left out
+    steps: int = max(ceil(shorter * RESIZE_ACCURACY / expected) - 1, 1)
+    ratio: float = steps / RESIZE_ACCURACY
+    return (int(width / ratio), int(height / ratio))
+
+
 class ImageProcessingError(Exception):
     pass
 
 
+def getFaceCascade():
+    """
+    The face detection cascade, loaded once per thread, so once per image
+    worker process.
+    """
+    face_cascade = getattr(_face_cascades, 'face_cascade', None)
+    if face_cascade is None:
+        face_cascade = cv2.CascadeClassifier(str(CASCADE_PATH))
+        _face_cascades.face_cascade = face_cascade
+    return face_cascade
+
+
 class ImageProcessor:
 
     @staticmethod
-    def validateAndResizePhotograph(fp: str | bytes | Path) -> bytes:
-        EXPECTED_WIDTH: Final[int] = 400
-        EXPECTED_HIGHT: Final[int] = 400
-        # higher is better, but coste more processing
-        RESIZE_ACCURACY: Final[int] = 10
-        CASCADE_PATH: Final[Path] = Path(cv2.__file__).parent.absolute(
-        ) / 'data/haarcascade_frontalface_default.xml'
-
-        # first image resizing
+    def checkPhotographSize(fp: str | bytes | Path) -> Image:
+        """
+        Checks the size of the photograph from its headers only, the pixels
+        are decoded when the returned image is first used.
+        """
         image: Image = Img.open(fp)
         width, height = image.size
-        ratio: int = 0
-
-        if width < EXPECTED_WIDTH or height < EXPECTED_HIGHT:
+        if width < PHOTOGRAPH_WIDTH or height < PHOTOGRAPH_HEIGHT:
             raise ImageProcessingError(
-                f"عذرا، يجب أن يكون حجم الصورة ({EXPECTED_WIDTH}X{EXPECTED_HIGHT})px او اكثر")
-
-        temp = width
-        expected = EXPECTED_WIDTH
-        if width > height:
-            temp = height
-            expected = EXPECTED_HIGHT
-
-        while temp > expected / RESIZE_ACCURACY:
-            ratio += 1 / RESIZE_ACCURACY
-            temp -= expected / RESIZE_ACCURACY
+                f"عذرا، يجب أن يكون حجم الصورة ({PHOTOGRAPH_WIDTH}X{PHOTOGRAPH_HEIGHT})px او اكثر")
+        if width * height > PHOTOGRAPH_MAX_PIXELS:
+            raise ImageProcessingError(
+                "عذرا، أبعاد الصورة كبيرة جدا، يرجى اختيار صورة أصغر")
+        return image
 
-        if ratio < 0:
-            ratio = 1
+    @staticmethod
+    def validateAndResizePhotograph(fp: str | bytes | Path) -> bytes:
+        EXPECTED_WIDTH: Final[int] = PHOTOGRAPH_WIDTH
+        EXPECTED_HIGHT: Final[int] = PHOTOGRAPH_HEIGHT
 
-        size: tuple[int, int] = (int(width / ratio), int(height / ratio))
-        image: Image = image.resize(size)
+        # first image resizing
+        image: Image = ImageProcessor.checkPhotographSize(fp)
+        width, height = image.size
+        size: tuple[int, int] = getPhotographWorkingSize(width, height)
+        # A JPEG is decoded at the smallest 1/2, 1/4 or 1/8 scale still
+        # larger than the size, the other formats are decoded in full
+        image.draft('RGB', size)
+        image = image.resize(size, reducing_gap=3.0)
 
         # Face detection
-        # Validate the photograph (it has a person face)
-        face_cascade = cv2.CascadeClassifier(str(CASCADE_PATH))
-        gray: NDArray = cv2.cvtColor(numpyArray(image), cv2.COLOR_BGR2GRAY)
-        faces: NDArray = face_cascade.detectMultiScale(
-            gray,
-            1.1,
-            minNeighbors=10,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
+        # Validate the photograph (it has a person face), on a grayscale
+        # thumbnail, the faces are mapped back to the resized image
+        face_cascade = getFaceCascade()
+        gray: NDArray = numpyArray(image.convert('L').reduce(DETECTION_SCALE))
+        faces: list[tuple[int, ...]] = [
+            tuple(int(value) * DETECTION_SCALE for value in face)
+            for face in face_cascade.detectMultiScale(
+                gray,
+                1.1,
+                minNeighbors=10,
+                minSize=(30 // DETECTION_SCALE, 30 // DETECTION_SCALE),
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
+        ]
 
         if len(faces) == 1:
             x, y, width, height = faces[0]
@@ -167,26 +204,9 @@ class ImageProcessor:
         
         logger.info("***** Generate Membership Card Started *****")
 
-        BLACK: Final[tuple[int, ...]] = (0, 0, 0)
-        WHITE: Final[tuple[int, ...]] = (255, 255, 255)
-        STATIC_ROOT: Path = settings.STATICFILES_DIRS[0]
-        MEMBERSHIP_TEMPLATE: Path = settings.MEDIA_ROOT / \
-            'templates/membership_template.jpg'
-        FONTS_DIR: Path = STATIC_ROOT / 'fonts'
-
         # init
-        logger.info("== Initializing Image Processing Started ==")
         image: Image = Img.open(fp)
         logger.info("   - Person Image Initialized")
-        template: Image = Img.open(MEMBERSHIP_TEMPLATE)
-        logger.info("   - Template Image Initialized")
-        draw_interface: ImageDraw = ImgDraw.Draw(template)
-        arabic_font = ImageFont.truetype(
-            str(FONTS_DIR / "NotoNaskhArabic-Regular.ttf"), 36)
-        english_font = ImageFont.truetype(
-            str(FONTS_DIR / "FiraSans-Regular.ttf"), 28)
-        logger.info("   - Fonts Initialized")
-        logger.info("== Initializing Image Processing Done ==")
 
         # Rounded image
         logger.info("Rounding Personal Image Started")
@@ -198,148 +218,20 @@ class ImageProcessor:
         image.putalpha(mask)
         logger.info("Rounding Personal Image Done")
 
-        # Request remove background image from 'remove.bg' website
+        # Remove the background, once per photograph
         logger.info("== Remove Person Image Background Started ==")
-        logger.info("   - Start Request Remove Image Background")
-        api_key: str = getParameterValue(PARAMETERS.REMOVE_BG_API_KEY)
-        logger.info(f"   - API Key: {api_key[:5]}***************")
-        if api_key != "None":
-            image_io: BytesIO = BytesIO()
-            image = image.convert('RGBA')
-            image.save(image_io, format="PNG", quality=85)
-            logger.info("   - Sending Request")
-            response = requests.post(
-                'https://api.remove.bg/v1.0/removebg',
-                files={'image_file': image_io.getvalue()},
-                data={'size': 'auto'},
-                headers={'X-Api-Key': api_key},
-            )
-            logger.info(f"   - Response Code: {response.status_code}")
-            if response.status_code == requests.codes.ok:
-                logger.info("   - Resize Image After Response")
-                image: Image = Img.open(
-                    BytesIO(response.content)
-                ).resize((230, 230))
-            else:
-                raise ImageProcessingError(
-                    f"Response Code: {response.status_code} - Error: {response.text}"
-                )
-        else:
-            logger.warning("API KEY IS NONE, SKIP REMOVE IMAGE BACKGROUND")
-            image = image.resize((230, 230))
+        # Imported here, the background removal index is a model
+        from main.background_removal import removeBackground
+        image = removeBackground(image)
         logger.info("== Remove Person Image Background Done ==")
 
         logger.info("== Start Processing Membership Card Data Started ==")
-        # Put the rounded cleared bg image to the membership template
-        template.paste(
-            image,
-            (41, 240),
-            mask=image.convert('RGBA').split()[-1]
-        )
+        card: MembershipCardData = MembershipCardData(
+            name_ar, name_en, city_ar, city_en, membership_type_ar,
+            membership_type_en, issue_date, expire_date, card_number)
+        card_image: bytes = getCardRenderer().render(image, card)
         image.close()
-        logger.info("   - Personal Image Processing Done")
-
-        # name english
-        draw_interface.text((430, 255), name_en,
-                            font=english_font, fill=BLACK)
-        logger.info("   - Name English Done")
-
-        # city english
-        draw_interface.text((402, 314),
-                            city_en, font=english_font, fill=BLACK)
-        logger.info("   - City English Done")
-
-        # membership type english
-        draw_interface.text((608, 377),
-                            membership_type_en, font=english_font, fill=BLACK)
-        logger.info("   - Membership Type English Done")
-
-        # issue date
-        english_font = ImageFont.truetype(
-            str(FONTS_DIR / "FiraSans-Regular.ttf"), 32)
-        draw_interface.text((615, 435), issue_date,
-                            font=english_font, fill=BLACK)
-        logger.info("   - Issue Date Done")
-
-        # card number
-        draw_interface.text((505, 518), card_number,
-                            font=arabic_font, fill=WHITE)
-        logger.info("   - Card Number Done")
-
-        # expire date
-        english_font = ImageFont.truetype(
-            str(FONTS_DIR / "FiraSans-Regular.ttf"), 26)
-        draw_interface.text((472, 586), expire_date,
-                            font=english_font, fill=WHITE)
-        logger.info("   - Expire Date Done")
-
-        # Convert to JPEG and return image in bytes
-        logger.info("   - Converting Image To Bytes For Arabic Data Processing")
-        image_io: BytesIO = BytesIO()
-        template = template.convert('RGB')
-        template.save(image_io, format="PNG", quality=85)
-        template.close()
-
-        temp_file_name = ""
-        with TemporaryFile(suffix='.png', delete=False) as temp_file:
-
-            temp_file_name = temp_file.name
-            temp_file.write(image_io.getvalue())
-            image_io.seek(0)
-            image_io.truncate(0)
-
-            # Initialize cairo settings
-            logger.info("   - Initialize Cairo Settings Bytes For Arabic Data Processing")
-            surface = cairo.ImageSurface.create_from_png(temp_file_name)
-            context = cairo.Context(surface)
-            context.select_font_face("Noto Naskh Arabic")
-            context.set_font_size(36)
-            context.set_source_rgb(*BLACK)
-
-            # Name Arabic
-            name_ar_reshaped = get_display(
-                arabic_reshaper.reshape(name_ar), base_dir='L')
-            text_size = draw_interface.textlength(
-                name_ar_reshaped, arabic_font)
-            context.move_to(950 - text_size, 238)
-            context.show_text(name_ar_reshaped)
-            logger.info("   - Name Arabic Done")
-
-            # City Arabic
-            city_ar_reshaped = get_display(
-                arabic_reshaper.reshape(city_ar), base_dir='L')
-            text_size = draw_interface.textlength(
-                city_ar_reshaped, arabic_font)
-            context.move_to(940 - text_size, 338)
-            context.show_text(city_ar_reshaped)
-            logger.info("   - City Arabic Done")
-
-            # Membership Type Arabic
-            membership_type_ar_reshaped = get_display(
-                arabic_reshaper.reshape(membership_type_ar), base_dir='L')
-            text_size = draw_interface.textlength(
-                membership_type_ar_reshaped, arabic_font)
-            context.move_to(856 - text_size, 409)
-            context.show_text(membership_type_ar_reshaped)
-            logger.info("   - Membership Type Arabic Done")
-
-            # Save the surface to the temp file
-            logger.info("   - Finishing Cairo Process")
-            surface.write_to_png(temp_file_name)
-            surface.finish()
-            surface.flush()
-            logger.info("== Start Processing Membership Card Data Done ==")
-
-        # Convert to JPEG
-        logger.info("Converting Image to JPEG Format")
-        image: NDArray = cv2.imread(temp_file_name)
-        quality: tuple[int, int] = (int(cv2.IMWRITE_JPEG_QUALITY), 85)
-        image: NDArray = cv2.imencode(".jpg", image, quality)[1]
-
-        # Delete temp file
-        logger.info("Cleanup...")
-        if os.path.isfile(temp_file_name):
-            os.remove(temp_file_name)
+        logger.info("== Start Processing Membership Card Data Done ==")
 
         logger.info("***** Generate Membership Card Done *****")
-        return image.tobytes()
+        return card_image
@@ -0,0 +1,29 @@
+"""
+The functions run by the image worker processes, see main.image_pool. A
+spawned process imports this module before Django is set up, so the rest
+of the project is only imported in the functions.
+"""
+from io import BytesIO
+
+
+def initializeWorker() -> None:
+    import django
+    django.setup()
+
+    from .image_processing import getFaceCascade
+    getFaceCascade()
+
+
+def validateAndResizePhotograph(data: bytes) -> bytes:
+    from .image_processing import ImageProcessor
+    return ImageProcessor.validateAndResizePhotograph(BytesIO(data))
+
+
+def generateMembershipCard(data: bytes, card) -> bytes:
+    """
+    Generates the card of the `MembershipCardData` from the photograph.
+    """
+    from dataclasses import astuple
+
+    from .image_processing import ImageProcessor
+    return ImageProcessor.generateMembershipCardImage(BytesIO(data), *astuple(card))
@@ -0,0 +1,235 @@
+"""
+Counts the failed logins of every IP and username and locks them out.
+
+A failed login increments the counters of its IP and its username, which
+are reset after `ALLOWED_LOGGED_IN_ATTEMPTS_RESET` days without failures.
+From `ALLOWED_LOGGED_IN_ATTEMPTS` failures on, every new failure locks the
+IP or the username out for `LOCKOUT_BASE_SECONDS` doubled for each failure
+over the allowed ones, up to `LOCKOUT_MAX_SECONDS` for the IP and
+`USERNAME_LOCKOUT_MAX_SECONDS` for the username. Anyone can fail to log in
+as a known username, so its owner is kept out for minutes, not a day. The
+login view checks the locks before checking the password, so a credential
+stuffing burst does not cost a password hash per attempt.
+
+The counters and the locks are cache keys, read and updated in one cache
+call. Every lockout is also recorded in the `LoginLockout` table for the
+staff to review.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+import logging
+from logging import Logger
+from typing import Any, Final
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import constants
+from .models import LoginLockout
+from parameter.service import getParameterValue
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
+
+LOCKOUT_BASE_SECONDS: Final[int] = 60
+LOCKOUT_MAX_SECONDS: Final[int] = constants.DEFAULT_CACHE_EXPIRE
+USERNAME_LOCKOUT_MAX_SECONDS: Final[int] = 15 * 60
+# The request attribute the IP failures are kept in for the middleware
+LOGIN_FAILURES_ATTRIBUTE: Final[str] = 'login_failures'
+
+# ------------------------------------------------------------------------- #
+# KEYS = [failures key, lock key, failures key, lock key, ...]              #
+# ARGV = [reset (s), allowed attempts, base lock (s), max lock (s) of the   #
+#         first pair, max lock (s) of the second pair]                      #
+# Every failures key is incremented and its expiry renewed, a key past the  #
+# allowed attempts sets its lock key for the doubled lock period. Returns   #
+# the failures and the lock period of every pair, 0 when not locked.        #
+# ------------------------------------------------------------------------- #
+_FAILED_LOGIN_SCRIPT: Final[str] = """
+local reset = tonumber(ARGV[1])
+local allowed = tonumber(ARGV[2])
+local base = tonumber(ARGV[3])
+local result = {}
+for i = 1, #KEYS, 2 do
+    local max = tonumber(ARGV[3 + (i + 1) / 2])
+    local failures = redis.call('INCR', KEYS[i])
+    redis.call('EXPIRE', KEYS[i], reset)
+    local lock = 0
+    if failures >= allowed then
+        lock = base
+        for _ = 1, failures - allowed do
+            lock = lock * 2
+            if lock >= max then
+                lock = max
+                break
+            end
+        end
+        redis.call('SET', KEYS[i + 1], failures, 'EX', lock)
+    end
+    result[#result + 1] = failures
+    result[#result + 1] = lock
+end
+return result
+"""
+
+
+def getFailuresKey(ip: str) -> str:
+    # The key the middleware also reads with the rate limits
+    return "FAIL_LOGIN:%s" % ip
+
+
+def getLockKey(ip: str) -> str:
+    return "LOGIN_LOCK:%s" % ip
+
+
+def getUsernameFailuresKey(username: str) -> str:
+    return "FAIL_LOGIN_USER:%s" % username.lower()[:150]
+
+
+def getUsernameLockKey(username: str) -> str:
+    return "LOGIN_LOCK_USER:%s" % username.lower()[:150]
+
+
+def getLockoutSeconds(failures: int, allowed_attempts: int,
+                      max_seconds: int = LOCKOUT_MAX_SECONDS) -> int:
+    """
+    The lock period after the failure, 0 while there are attempts left.
+    """
+    if failures < allowed_attempts:
+        return 0
+    # The shift is bounded, the lock is capped long before
+    doublings: int = min(failures - allowed_attempts, 32)
+    return min(LOCKOUT_BASE_SECONDS << doublings, max_seconds)
+
+
+@dataclass(frozen=True)
+class LoginFailure:
+    ip_failures: int
+    # None when the attempt had no username
+    username_failures: int | None
+    ip_lock_seconds: int
+    username_lock_seconds: int
+
+
+def _getSettings() -> tuple[int, int]:
+    reset: int = constants.DEFAULT_CACHE_EXPIRE * getParameterValue(
+        constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS_RESET)
+    allowed_attempts: int = getParameterValue(
+        constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS)
+    return reset, allowed_attempts
+
+
+class CacheLoginThrottle:
+    """
+    Login throttle working on any Django cache backend, it costs a few
+    cache calls per failure. The increments are atomic on the backends
+    supporting it, e.g. Redis and Memcached.
+    """
+
+    def recordFailure(self, ip: str, username: str | None) -> LoginFailure:
+        reset, allowed_attempts = _getSettings()
+        keys: list[tuple[str, str, int]] = [
+            (getFailuresKey(ip), getLockKey(ip), LOCKOUT_MAX_SECONDS)]
+        if username:
+            keys.append((getUsernameFailuresKey(username),
+                         getUsernameLockKey(username),
+                         USERNAME_LOCKOUT_MAX_SECONDS))
+
+        values: list[int] = []
+        for failures_key, lock_key, max_seconds in keys:
+            cache.add(failures_key, 0, reset)
+            try:
+                failures: int = cache.incr(failures_key)
+            except ValueError:
+                # Expired between the add and the increment
+                cache.set(failures_key, 1, reset)
+                failures = 1
+            cache.touch(failures_key, reset)
+            lock: int = getLockoutSeconds(failures, allowed_attempts,
+                                          max_seconds)
+            if lock:
+                cache.set(lock_key, failures, lock)
+            values += [failures, lock]
+        return _toLoginFailure(values)
+
+    def isLocked(self, ip: str, username: str | None) -> bool:
+        keys: list[str] = [getLockKey(ip)]
+        if username:
+            keys.append(getUsernameLockKey(username))
+        return bool(cache.get_many(keys))
+
+    def reset(self, username: str) -> None:
+        cache.delete_many([getUsernameFailuresKey(username),
+                           getUsernameLockKey(username)])
+
+
+class RedisLoginThrottle(CacheLoginThrottle):
+    """
+    Counts the failures and sets the locks of the IP and the username in a
+    single Lua call.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.script = connection.register_script(_FAILED_LOGIN_SCRIPT)
+
+    def recordFailure(self, ip: str, username: str | None) -> LoginFailure:
+        reset, allowed_attempts = _getSettings()
+        keys: list[str] = [getFailuresKey(ip), getLockKey(ip)]
+        if username:
+            keys += [getUsernameFailuresKey(username),
+                     getUsernameLockKey(username)]
+        values: list[Any] = self.script(
+            keys=[cache.make_key(key) for key in keys],
+            args=[reset, allowed_attempts, LOCKOUT_BASE_SECONDS,
+                  LOCKOUT_MAX_SECONDS, USERNAME_LOCKOUT_MAX_SECONDS])
+        return _toLoginFailure([int(value) for value in values])
+
+
+def _toLoginFailure(values: list[int]) -> LoginFailure:
+    has_username: bool = len(values) > 2
+    return LoginFailure(
+        ip_failures=values[0],
+        username_failures=values[2] if has_username else None,
+        ip_lock_seconds=values[1],
+        username_lock_seconds=values[3] if has_username else 0,
+    )
+
+
+def recordLockouts(ip: str, username: str | None, failure: LoginFailure) -> None:
+    """
+    Inserts the lockouts the failure started, run in the background.
+    """
+    now: timezone.datetime = timezone.now()
+    lockouts: list[LoginLockout] = []
+    if failure.ip_lock_seconds:
+        lockouts.append(LoginLockout(
+            ip=ip, failures=failure.ip_failures,
+            locked_until=now + timezone.timedelta(
+                seconds=failure.ip_lock_seconds)))
+    if failure.username_lock_seconds:
+        lockouts.append(LoginLockout(
+            ip=ip, username=username[:150], failures=failure.username_failures,
+            locked_until=now + timezone.timedelta(
+                seconds=failure.username_lock_seconds)))
+    LoginLockout.objects.bulk_create(lockouts)
+
+
+_login_throttle: CacheLoginThrottle | None = None
+
+
+def getLoginThrottle() -> CacheLoginThrottle:
+    """
+    Returns the Redis throttle when the default cache is a Redis cache,
+    otherwise falls back to the per key cache throttle.
+    """
+    global _login_throttle
+    if _login_throttle is None:
+        try:
+            from django_redis import get_redis_connection
+            _login_throttle = RedisLoginThrottle(
+                get_redis_connection('default'))
+        except (ImportError, NotImplementedError):
+            logger.warning("The default cache is not Redis, "
+                           + "falling back to the per key login throttle.")
+            _login_throttle = CacheLoginThrottle()
+    return _login_throttle
@@ -0,0 +1,54 @@
+import time
+from typing import Callable
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from main.html_scanner import HtmlScanner, RegexScanner, TagScanner
+
+# Inputs which make a backtracking pattern slow, built for a given length
+ADVERSARIAL_INPUTS: dict[str, Callable[[int], str]] = {
+    'plain text': lambda n: ('نص عادي بدون وسوم ' * n)[:n],
+    'opening brackets': lambda n: '<' * n,
+    'unclosed tag': lambda n: '<a>' + 'x' * n,
+    'unclosed tag lines': lambda n: '<a>' + '\n' * n,
+    'bracket lines': lambda n: '<\n' * (n // 2) + '>',
+    'closing tag at the end': lambda n: '<a>' + 'x\n' * (n // 2) + '</a>',
+}
+
+
+class Command(BaseCommand):
+    help = "Measures the worst case latency of the POST HTML scanners."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1_000, 10_000, 100_000],
+                            help="Lengths of the scanned values.")
+        parser.add_argument('--regex-max-size', type=int, default=10_000,
+                            help="Longest value scanned with the regex, "
+                            + "longer values may take minutes.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        scanners: dict[str, HtmlScanner] = {
+            'tag scanner': TagScanner(),
+            'regex': RegexScanner(),
+        }
+
+        self.stdout.write(f"{'Input':<26}{'Length':>10}{'Scanner':>14}"
+                          + f"{'Found':>8}{'Worst (ms)':>14}")
+        for input_name, build in ADVERSARIAL_INPUTS.items():
+            for size in options['sizes']:
+                value: str = build(size)
+                for scanner_name, scanner in scanners.items():
+                    if isinstance(scanner, RegexScanner) and size > options['regex_max_size']:
+                        continue
+
+                    worst: float = 0
+                    for _ in range(options['repeat']):
+                        start: float = time.perf_counter()
+                        found: bool = scanner.containsHtml(value)
+                        worst = max(worst, time.perf_counter() - start)
+
+                    self.stdout.write(
+                        f"{input_name:<26}{len(value):>10}{scanner_name:>14}"
+                        + f"{str(found):>8}{worst * 1000:>14.3f}")
@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from pathlib import Path
+from typing import Callable
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from main.image_worker import initializeWorker
+
+SAMPLE_CARD: tuple[str, ...] = (
+    "محمد عبدالله", "Mohammed Abdullah", "جاكرتا", "Jakarta", "عضو عامل",
+    "Active Member", "2026-01-01", "2027-01-01", "YCI0000001")
+
+
+def _legacyRender(photograph, card) -> bytes:
+    """
+    The card rendering before the renderer: the template and the fonts are
+    loaded per card, and the card goes through a PNG file for cairo.
+    """
+    import os
+    from io import BytesIO
+    from tempfile import NamedTemporaryFile
+
+    import arabic_reshaper
+    import cairo
+    import cv2
+    from bidi.algorithm import get_display
+    from PIL import Image as Img
+    from PIL import ImageDraw as ImgDraw
+    from PIL import ImageFont
+
+    from main.card_renderer import getFontsDir, getTemplatePath
+
+    fonts_dir: Path = getFontsDir()
+    template = Img.open(getTemplatePath())
+    draw = ImgDraw.Draw(template)
+    arabic_font = ImageFont.truetype(str(fonts_dir / "NotoNaskhArabic-Regular.ttf"), 36)
+    photograph = photograph.resize((230, 230))
+    template.paste(photograph, (41, 240),
+                   mask=photograph.convert('RGBA').split()[-1])
+    for size, position, text in ((28, (430, 255), card.name_en),
+                                 (28, (402, 314), card.city_en),
+                                 (28, (608, 377), card.membership_type_en),
+                                 (32, (615, 435), card.issue_date),
+                                 (26, (472, 586), card.expire_date)):
+        english_font = ImageFont.truetype(str(fonts_dir / "FiraSans-Regular.ttf"), size)
+        draw.text(position, text, font=english_font, fill=(0, 0, 0))
+    draw.text((505, 518), card.card_number, font=arabic_font, fill=(255, 255, 255))
+
+    image_io: BytesIO = BytesIO()
+    template.convert('RGB').save(image_io, format="PNG")
+    with NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
+        temp_file.write(image_io.getvalue())
+    try:
+        surface = cairo.ImageSurface.create_from_png(temp_file.name)
+        context = cairo.Context(surface)
+        context.select_font_face("Noto Naskh Arabic")
+        context.set_font_size(36)
+        for text, right, top in ((card.name_ar, 950, 238),
+                                 (card.city_ar, 940, 338),
+                                 (card.membership_type_ar, 856, 409)):
+            reshaped: str = get_display(arabic_reshaper.reshape(text), base_dir='L')
+            context.move_to(right - draw.textlength(reshaped, arabic_font), top)
+            context.show_text(reshaped)
+        surface.write_to_png(temp_file.name)
+        surface.finish()
+        image = cv2.imread(temp_file.name)
+        return cv2.imencode(".jpg", image, (int(cv2.IMWRITE_JPEG_QUALITY), 85))[1].tobytes()
+    finally:
+        os.remove(temp_file.name)
+
+
+def _cachedRender(photograph, card) -> bytes:
+    from main.card_renderer import getCardRenderer
+    return getCardRenderer().render(photograph, card)
+
+
+IMPLEMENTATIONS: dict[str, Callable] = {
+    'before': _legacyRender,
+    'renderer': _cachedRender,
+}
+
+
+def _runCards(name: str, photograph_path: str | None, cards: int) -> tuple[float, float, int]:
+    """
+    Runs in a fresh worker, returns the seconds of the first card and per
+    card after it, and the peak memory of the worker in kilobytes.
+    """
+    import resource
+    import time
+
+    from PIL import Image as Img
+    from PIL import ImageDraw as ImgDraw
+
+    from main.card_renderer import MembershipCardData
+
+    if photograph_path:
+        photograph = Img.open(photograph_path).convert('RGBA')
+    else:
+        photograph = Img.new('RGBA', (400, 400), (0, 0, 0, 0))
+        ImgDraw.Draw(photograph).ellipse((0, 0, 400, 400), fill=(90, 120, 160, 255))
+    card: MembershipCardData = MembershipCardData(*SAMPLE_CARD)
+    implementation: Callable = IMPLEMENTATIONS[name]
+
+    start: float = time.perf_counter()
+    implementation(photograph, card)
+    first: float = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(cards):
+        implementation(photograph, card)
+    elapsed: float = time.perf_counter() - start
+    return (first, elapsed / cards,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class Command(BaseCommand):
+    help = "Compares the latency and peak memory of the membership card rendering."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--cards', type=int, default=50,
+                            help="Number of cards rendered after the first one.")
+        parser.add_argument('--photograph', type=Path,
+                            help="Photograph put on the cards, a drawn circle by default.")
+
+    def handle(self, *args, **options) -> None:
+        photograph: Path | None = options['photograph']
+        self.stdout.write(f"{'Implementation':<16}{'First card (ms)':>18}"
+                          + f"{'Per card (ms)':>16}{'Peak RSS (MB)':>16}")
+        for name in IMPLEMENTATIONS:
+            # Every implementation gets its own process, so the peak memory
+            # of one does not hide the other
+            with ProcessPoolExecutor(
+                    max_workers=1, initializer=initializeWorker,
+                    mp_context=multiprocessing.get_context('spawn')) as executor:
+                first, elapsed, max_rss = executor.submit(
+                    _runCards, name, str(photograph) if photograph else None,
+                    options['cards']).result()
+            self.stdout.write(f"{name:<16}{first * 1000:>18.1f}"
+                              + f"{elapsed * 1000:>16.1f}{max_rss / 1024:>16.1f}")
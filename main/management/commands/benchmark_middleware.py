@@ -0,0 +1,366 @@
+import contextlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from importlib import import_module
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+from threading import get_ident
+import time
+from typing import Any, Callable
+
+from django import get_version
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from company_user.models import CompanyUser, Role
+from main import constants
+from main.background import getAuditEntryWriter, getWorkQueue
+from main.blocklist import blockClient
+from main.geolocation import shutdownGeolocationService
+
+SCENARIOS: tuple[str, ...] = (
+    'anonymous_get', 'staff_get', 'member_post', 'blocked_ip', 'ip_flood')
+
+# The latency percentiles and the counts compared with a baseline
+COMPARED_METRICS: tuple[str, ...] = (
+    'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request',
+    'cache_calls_per_request')
+
+_CSRF_TOKEN: str = 'b' * 32
+
+
+class CacheCallCounter:
+    """
+    Counts the commands and the pipelines sent by a Redis client from the
+    current thread only, the background threads share the client.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.thread: int = get_ident()
+        self.count: int = 0
+
+    def __enter__(self) -> 'CacheCallCounter':
+        execute_command: Callable = self.connection.execute_command
+        pipeline: Callable = self.connection.pipeline
+
+        def countedExecuteCommand(*args, **kwargs) -> Any:
+            if get_ident() == self.thread:
+                self.count += 1
+            return execute_command(*args, **kwargs)
+
+        def countedPipeline(*args, **kwargs) -> Any:
+            # A pipeline is one round trip, sent when it is executed
+            if get_ident() == self.thread:
+                self.count += 1
+            return pipeline(*args, **kwargs)
+
+        self.connection.execute_command = countedExecuteCommand
+        self.connection.pipeline = countedPipeline
+        return self
+
+    def __exit__(self, *args) -> None:
+        del self.connection.execute_command
+        del self.connection.pipeline
+
+
+@dataclass
+class ScenarioResult:
+    latencies: list[float] = field(default_factory=list)
+    queries: int = 0
+    cache_calls: int = 0
+    statuses: dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        requests: int = len(self.latencies)
+        # The 99 cut points between the percentiles
+        percentiles: list[float] = statistics.quantiles(
+            self.latencies, n=100, method='inclusive')
+        return {
+            'requests': requests,
+            'p50_ms': round(percentiles[49] * 1000, 3),
+            'p95_ms': round(percentiles[94] * 1000, 3),
+            'p99_ms': round(percentiles[98] * 1000, 3),
+            'queries_per_request': round(self.queries / requests, 2),
+            'cache_calls_per_request': round(self.cache_calls / requests, 2),
+            'statuses': dict(sorted(self.statuses.items())),
+        }
+
+
+class Command(BaseCommand):
+    help = ("Sends synthetic requests through the whole middleware stack on a "
+            + "throwaway test database and reports the latency percentiles, "
+            + "the queries and the cache calls per request of every scenario.")
+    requires_system_checks = []
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--requests', type=int, default=300,
+                            help="Number of measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=20,
+                            help="Number of requests per scenario sent "
+                            + "before measuring.")
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help="Scenario to run, can be repeated, "
+                            + "all of them by default.")
+        parser.add_argument('--redis', action='store_true',
+                            help="Use the configured cache, e.g. a local Redis, "
+                            + "instead of an in-memory fakeredis server.")
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help="Write the results to a JSON file.")
+        parser.add_argument('--baseline', metavar='PATH',
+                            help="Compare the results with a JSON baseline "
+                            + "and fail on regressions.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed increase of every metric over the "
+                            + "baseline, 0.2 for 20%%.")
+
+    def handle(self, *args, **options) -> None:
+        if options['requests'] < 2:
+            raise CommandError("At least 2 requests are needed per scenario.")
+        baseline: dict[str, Any] | None = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        # The background work is left to its threads, as in production
+        overrides: dict[str, Any] = {'DEBUG': False,
+                                     'BACKGROUND_TASKS_INLINE': False}
+        if not options['redis']:
+            overrides['CACHES'] = self.getFakeRedisCaches()
+
+        # The visitors are located in a local file, never by the online API
+        geolocation_file = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', delete=False)
+        with geolocation_file:
+            geolocation_file.write('0.0.0.0,255.255.255.255,Benchmark\n')
+        overrides['IP_GEOLOCATION_DATABASE'] = geolocation_file.name
+        overrides['IP_GEOLOCATION_PROVIDER'] = None
+
+        test_settings: dict[str, Any] = connection.settings_dict['TEST']
+        old_test_name: str | None = test_settings['NAME']
+        database_file: str | None = None
+        if connection.vendor == 'sqlite':
+            # An in-memory database locks its tables against the background
+            # threads instead of letting them wait for each other
+            database_file = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+            test_settings['NAME'] = database_file
+
+        results: dict[str, dict[str, Any]] = {}
+        # The warnings of the blocked clients would flood the output
+        logging.disable(logging.WARNING)
+        setup_test_environment()
+        try:
+            with override_settings(**overrides), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                old_name: str = connection.settings_dict['NAME']
+                # The signals creating the default groups print them
+                connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    results = self.runScenarios(options)
+                finally:
+                    getAuditEntryWriter().shutdown()
+                    shutdownGeolocationService()
+                    getWorkQueue().shutdown()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+            test_settings['NAME'] = old_test_name
+            os.unlink(geolocation_file.name)
+            if database_file is not None:
+                os.rmdir(os.path.dirname(database_file))
+
+        self.writeTable(results)
+        report: dict[str, Any] = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': get_version(),
+            'cache': 'redis' if options['redis'] else 'fakeredis',
+            'requests': options['requests'],
+            'scenarios': results,
+        }
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Saved the baseline to {options['save_baseline']}.")
+        if baseline is not None:
+            self.compare(results, baseline, options['tolerance'])
+
+    def getFakeRedisCaches(self) -> dict[str, Any]:
+        try:
+            import fakeredis
+        except ImportError:
+            raise CommandError("The fakeredis package is needed, install it "
+                               + "or run with --redis against a local Redis.")
+
+        default: dict[str, Any] = dict(settings.CACHES['default'])
+        default['OPTIONS'] = {
+            **default.get('OPTIONS', {}),
+            'CONNECTION_POOL_KWARGS': {
+                'connection_class': fakeredis.FakeConnection,
+                'server': fakeredis.FakeServer(),
+            },
+        }
+        return {**settings.CACHES, 'default': default}
+
+    def runScenarios(self, options: dict[str, Any]) -> dict[str, dict[str, Any]]:
+        from django_redis import get_redis_connection
+
+        handler: WSGIHandler = WSGIHandler()
+        factory: RequestFactory = RequestFactory()
+        redis_connection = get_redis_connection('default')
+        requests: dict[str, Callable[[int], Any]] = self.getScenarios(factory)
+
+        results: dict[str, dict[str, Any]] = {}
+        for scenario in options['scenario'] or SCENARIOS:
+            make_request: Callable[[int], Any] = requests[scenario]
+            result: ScenarioResult = ScenarioResult()
+            for i in range(options['warmup'] + options['requests']):
+                environ: dict[str, Any] = make_request(i).environ
+                measured: bool = i >= options['warmup']
+                queries: list[str] = []
+
+                def countQuery(execute, sql, *args) -> Any:
+                    queries.append(sql)
+                    return execute(sql, *args)
+
+                with CacheCallCounter(redis_connection) as counter, \
+                        connection.execute_wrapper(countQuery):
+                    start: float = time.perf_counter()
+                    status: str = self.send(handler, environ)
+                    elapsed: float = time.perf_counter() - start
+
+                # The queries of the first measured request, to see the counts
+                if i == options['warmup'] and options['verbosity'] > 2:
+                    self.stdout.write(f"{scenario}: " + "\n  ".join(queries))
+                if measured:
+                    result.latencies.append(elapsed)
+                    result.queries += len(queries)
+                    result.cache_calls += counter.count
+                    result.statuses[status] = result.statuses.get(status, 0) + 1
+            results[scenario] = result.summary()
+        return results
+
+    def send(self, handler: WSGIHandler, environ: dict[str, Any]) -> str:
+        statuses: list[str] = []
+
+        def startResponse(status: str, headers: list, exc_info=None) -> None:
+            statuses.append(status.split(' ', 1)[0])
+
+        response = handler(environ, startResponse)
+        try:
+            for _ in response:
+                pass
+        finally:
+            # Sends the request finished signal
+            response.close()
+        return statuses[0]
+
+    def getScenarios(self, factory: RequestFactory) -> dict[str, Callable[[int], Any]]:
+        """
+        The request of every scenario by its number. Every scenario has its
+        own IPs and user agent, so the rate limits and the flood detection
+        of one do not block the clients of another.
+        """
+        index_path: str = reverse(constants.PAGES.INDEX_PAGE)
+        dashboard_path: str = reverse(constants.PAGES.STAFF_DASHBOARD)
+        member_form_path: str = reverse(constants.PAGES.MEMBER_FORM_PAGE)
+        staff_cookie: str = f'{settings.SESSION_COOKIE_NAME}={self.createStaffSession()}'
+
+        blocked_ip: str = '10.255.255.1'
+        blockClient(blocked_ip, 'benchmark', indefinitely=True)
+
+        def userAgent(scenario: str) -> str:
+            return f'Mozilla/5.0 (X11; Linux x86_64) Benchmark/{scenario}'
+
+        def distinctIp(first: int, i: int) -> str:
+            # A /24 network per request
+            return f'{first}.{i // 250 % 250}.{i % 250}.1'
+
+        return {
+            'anonymous_get': lambda i: factory.get(
+                index_path, REMOTE_ADDR=distinctIp(11, i),
+                HTTP_USER_AGENT=userAgent('anonymous_get')),
+            'staff_get': lambda i: factory.get(
+                dashboard_path, REMOTE_ADDR=distinctIp(12, i),
+                HTTP_USER_AGENT=userAgent('staff_get'),
+                HTTP_COOKIE=staff_cookie),
+            'member_post': lambda i: factory.post(
+                member_form_path, {'name_ar': 'benchmark'},
+                REMOTE_ADDR=distinctIp(13, i),
+                HTTP_USER_AGENT=userAgent('member_post'),
+                HTTP_COOKIE=f'{settings.CSRF_COOKIE_NAME}={_CSRF_TOKEN}',
+                HTTP_X_CSRFTOKEN=_CSRF_TOKEN),
+            'blocked_ip': lambda i: factory.get(
+                index_path, REMOTE_ADDR=blocked_ip,
+                HTTP_USER_AGENT=userAgent('blocked_ip')),
+            # Many IPs of the same /24 network, as a botnet would send them
+            'ip_flood': lambda i: factory.get(
+                index_path, REMOTE_ADDR=f'14.0.0.{i % 250 + 1}',
+                HTTP_USER_AGENT=userAgent('ip_flood')),
+        }
+
+    def createStaffSession(self) -> str:
+        user: User = User.objects.create_user(
+            username='benchmark', password='benchmark', is_staff=True,
+            last_login=timezone.now())
+        role: Role = Role.objects.create(name='benchmark',
+                                         description='benchmark')
+        role.groups.set(Group.objects.all())
+        CompanyUser.objects.create(user=user, role=role)
+
+        # A session logged in with the first backend, as the login would do
+        session: SessionBase = import_module(
+            settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def writeTable(self, results: dict[str, dict[str, Any]]) -> None:
+        self.stdout.write(f"{'Scenario':<16}{'p50 (ms)':>10}{'p95 (ms)':>10}"
+                          + f"{'p99 (ms)':>10}{'Queries/request':>18}"
+                          + f"{'Cache calls/request':>22}  Statuses")
+        for scenario, summary in results.items():
+            statuses: str = ', '.join(
+                f'{status}: {count}' for status, count in summary['statuses'].items())
+            self.stdout.write(
+                f"{scenario:<16}{summary['p50_ms']:>10.2f}"
+                + f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                + f"{summary['queries_per_request']:>18.2f}"
+                + f"{summary['cache_calls_per_request']:>22.2f}  {statuses}")
+
+    def compare(self, results: dict[str, dict[str, Any]],
+                baseline: dict[str, Any], tolerance: float) -> None:
+        regressions: list[str] = []
+        for scenario, summary in results.items():
+            base: dict[str, Any] | None = baseline['scenarios'].get(scenario)
+            if base is None:
+                continue
+            for metric in COMPARED_METRICS:
+                # The counts of a cheap scenario can grow from 0
+                allowed: float = base[metric] * (1 + tolerance) \
+                    if base[metric] else tolerance
+                if summary[metric] > allowed:
+                    regressions.append(f"{scenario} {metric}: {summary[metric]} "
+                                       + f"over the baseline {base[metric]}")
+        if regressions:
+            raise CommandError("Regressions over the baseline:\n"
+                               + '\n'.join(regressions))
+        self.stdout.write(f"No regression over the baseline, tolerance {tolerance:.0%}.")
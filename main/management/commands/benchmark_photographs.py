@@ -0,0 +1,111 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from pathlib import Path
+from typing import Callable
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from main.image_worker import initializeWorker
+
+PHOTOGRAPH_SUFFIXES: tuple[str, ...] = ('.jpg', '.jpeg', '.png')
+
+
+def _legacyResize(data: bytes) -> int:
+    """
+    The decoding, resizing and face detection of a photograph before the
+    draft mode, returns 1 when a single face is found, otherwise 0.
+    """
+    from io import BytesIO
+
+    import cv2
+    from numpy import array as numpyArray
+
+    from main.image_processing import ImageProcessor, getFaceCascade
+
+    image = ImageProcessor.checkPhotographSize(BytesIO(data))
+    width, height = image.size
+    ratio: float = 0
+    temp: int = width if width <= height else height
+    while temp > 40:
+        ratio += 0.1
+        temp -= 40
+    image = image.resize((int(width / ratio), int(height / ratio)))
+    gray = cv2.cvtColor(numpyArray(image), cv2.COLOR_BGR2GRAY)
+    return int(len(getFaceCascade().detectMultiScale(
+        gray, 1.1, minNeighbors=10, minSize=(30, 30),
+        flags=cv2.CASCADE_SCALE_IMAGE)) == 1)
+
+
+def _currentResize(data: bytes) -> int:
+    from main.image_processing import ImageProcessingError
+    from main.image_worker import validateAndResizePhotograph
+
+    try:
+        validateAndResizePhotograph(data)
+    except ImageProcessingError:
+        return 0
+    return 1
+
+
+IMPLEMENTATIONS: dict[str, Callable[[bytes], int]] = {
+    'before': _legacyResize,
+    'draft mode': _currentResize,
+}
+
+
+def _runCorpus(name: str, paths: list[str], rounds: int) -> tuple[float, int, int]:
+    """
+    Runs in a fresh worker, returns the seconds per photograph, the number
+    of the rejected ones and the peak memory of the worker in kilobytes.
+    """
+    import resource
+    import time
+
+    implementation: Callable[[bytes], int] = IMPLEMENTATIONS[name]
+    corpus: list[bytes] = [Path(path).read_bytes() for path in paths]
+    rejected: int = 0
+    start: float = time.perf_counter()
+    for _ in range(rounds):
+        for data in corpus:
+            try:
+                if not implementation(data):
+                    rejected += 1
+            except Exception:
+                rejected += 1
+    elapsed: float = time.perf_counter() - start
+    return (elapsed / (len(corpus) * rounds), rejected // rounds,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class Command(BaseCommand):
+    help = "Compares the time and peak memory of the photograph validation."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('corpus', type=Path,
+                            help="Directory of the photographs, e.g. phone photos.")
+        parser.add_argument('--rounds', type=int, default=3,
+                            help="Number of times every photograph is validated.")
+
+    def handle(self, *args, **options) -> None:
+        corpus: Path = options['corpus']
+        if not corpus.is_dir():
+            raise CommandError(f"{corpus} is not a directory.")
+        paths: list[str] = sorted(
+            str(path) for path in corpus.iterdir()
+            if path.suffix.lower() in PHOTOGRAPH_SUFFIXES)
+        if not paths:
+            raise CommandError(f"No photographs found in {corpus}.")
+
+        self.stdout.write(f"{len(paths)} photographs, {options['rounds']} rounds")
+        self.stdout.write(f"{'Implementation':<16}{'Time/image (ms)':>18}"
+                          + f"{'Rejected':>10}{'Peak RSS (MB)':>16}")
+        for name in IMPLEMENTATIONS:
+            # Every implementation gets its own process, so the peak memory
+            # of one does not hide the other
+            with ProcessPoolExecutor(
+                    max_workers=1, initializer=initializeWorker,
+                    mp_context=multiprocessing.get_context('spawn')) as executor:
+                elapsed, rejected, max_rss = executor.submit(
+                    _runCorpus, name, paths, options['rounds']).result()
+            self.stdout.write(f"{name:<16}{elapsed * 1000:>18.1f}"
+                              + f"{rejected:>10}{max_rss / 1024:>16.1f}")
@@ -0,0 +1,137 @@
+import time
+from typing import Any, Callable
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandParser
+
+from main import constants
+from main.rate_limiter import CacheRateLimiter, RedisRateLimiter, SlidingWindow
+
+
+class RoundTripCounter:
+    """
+    Counts the commands sent by a Redis client, a pipeline or a script call
+    counts as one round trip.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.count: int = 0
+
+    def __enter__(self) -> 'RoundTripCounter':
+        execute_command: Callable = self.connection.execute_command
+
+        def countedExecuteCommand(*args, **kwargs) -> Any:
+            self.count += 1
+            return execute_command(*args, **kwargs)
+
+        self.connection.execute_command = countedExecuteCommand
+        return self
+
+    def __exit__(self, *args) -> None:
+        del self.connection.execute_command
+
+
+def _legacyCounters(ip: str, is_posting: bool, page_name: str) -> None:
+    """
+    The cache calls the middleware made per request before the rate limiter.
+    """
+    ip_key = f'IP:{ip}'
+    if ip_key in cache:
+        try:
+            cache.incr(ip_key)
+        except ValueError:
+            pass
+    else:
+        cache.add(ip_key, 1)
+        cache.expire(ip_key, 1)
+
+    if not cache.has_key("VST:%s" % ip):
+        cache.set("VST:%s" % ip, None, constants.DEFAULT_CACHE_EXPIRE)
+
+    if is_posting:
+        if page_name == constants.PAGES.DONATION_PAGE:
+            key: str = 'BENCHMARK_DONATION:%s' % ip
+            if cache.has_key(key):
+                cache.incr(key)
+            else:
+                cache.add(key, 1)
+                cache.expire(key, constants.DEFAULT_CACHE_EXPIRE)
+        if page_name == constants.PAGES.MEMBER_FORM_PAGE:
+            cache.get("MEMBER_FORM:%s" % ip)
+        last_posts_count: int = cache.get("BENCHMARK_POST:%s" % ip) or 0
+        cache.set("BENCHMARK_POST:%s" % ip, last_posts_count + 1, 0.5)
+
+    if not cache.has_key("BLACKLISTED:%s" % ip):
+        cache.has_key("WHITELISTED:%s" % ip)
+    cache.get("FAIL_LOGIN:%s" % ip)
+
+
+def _limiterCounters(limiter: CacheRateLimiter | RedisRateLimiter, ip: str,
+                     is_posting: bool, page_name: str) -> None:
+    # Each limiter has its own keys, the windows are stored differently
+    prefix: str = "RATE:BENCHMARK_%s" % type(limiter).__name__.upper()
+    windows: list[SlidingWindow] = [
+        SlidingWindow("%s_IP:%s" % (prefix, ip), 1000, 51)]
+    lookups: list[str] = ["VST:%s" % ip, "BLACKLISTED:%s" % ip,
+                          "WHITELISTED:%s" % ip, "FAIL_LOGIN:%s" % ip]
+    if is_posting:
+        windows.append(SlidingWindow("%s_POST:%s" % (prefix, ip), 500, 6))
+        if page_name == constants.PAGES.DONATION_PAGE:
+            windows.append(SlidingWindow(
+                "%s_DONATION:%s" % (prefix, ip), 60_000, 6))
+        if page_name == constants.PAGES.MEMBER_FORM_PAGE:
+            lookups.append("MEMBER_FORM:%s" % ip)
+    limiter.evaluate(windows, lookups)
+
+
+class Command(BaseCommand):
+    help = "Compares the cache round trips and latency of the request rate limits."
+
+    SCENARIOS: tuple[tuple[str, bool, str], ...] = (
+        ('GET', False, constants.PAGES.INDEX_PAGE),
+        ('POST', True, constants.PAGES.LOGIN_PAGE),
+        ('POST donation', True, constants.PAGES.DONATION_PAGE),
+        ('POST member form', True, constants.PAGES.MEMBER_FORM_PAGE),
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--requests', type=int, default=1000,
+                            help="Number of simulated requests per scenario.")
+
+    def handle(self, *args, **options) -> None:
+        from django_redis import get_redis_connection
+
+        connection = get_redis_connection('default')
+        cache_limiter: CacheRateLimiter = CacheRateLimiter()
+        redis_limiter: RedisRateLimiter = RedisRateLimiter(connection)
+        implementations: dict[str, Callable[[str, bool, str], None]] = {
+            'before': _legacyCounters,
+            'cache limiter': lambda *args: _limiterCounters(
+                cache_limiter, *args),
+            'redis limiter': lambda *args: _limiterCounters(
+                redis_limiter, *args),
+        }
+        requests: int = options['requests']
+
+        self.stdout.write(f"{'Scenario':<20}{'Implementation':<16}"
+                          + f"{'Round trips/request':>22}{'Latency (us)':>16}")
+        for scenario, is_posting, page_name in self.SCENARIOS:
+            for name, implementation in implementations.items():
+                # Warm up, the first script call also loads the script
+                implementation('10.0.0.0', is_posting, page_name)
+
+                with RoundTripCounter(connection) as counter:
+                    start: float = time.perf_counter()
+                    for i in range(requests):
+                        ip: str = f'10.0.{i // 256 % 256}.{i % 256}'
+                        implementation(ip, is_posting, page_name)
+                    elapsed: float = time.perf_counter() - start
+
+                self.stdout.write(
+                    f"{scenario:<20}{name:<16}"
+                    + f"{counter.count / requests:>22.2f}"
+                    + f"{elapsed / requests * 1_000_000:>16.1f}")
+
+        cache.delete_pattern("*BENCHMARK*")
+        cache.delete_pattern("VST:10.0.*")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from main.audit import rebuildAuditRollups
+
+
+class Command(BaseCommand):
+    help = ("Recounts the daily audit rollups of the last days from the hot "
+            + "and the archived audit entries, e.g. after the first deploy.")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--days', type=int, default=365,
+                            help="Number of days to recount, today included.")
+
+    def handle(self, *args, **options) -> None:
+        today = timezone.now().date()
+        start = today - timezone.timedelta(days=options['days'] - 1)
+        count: int = rebuildAuditRollups(start, today)
+        self.stdout.write(f"Recounted {count} audit rollups from {start}.")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main.visitors import rebuildVisitors
+
+
+class Command(BaseCommand):
+    help = ("Fills the visitors table with the IPs of the audit entries and "
+            + "their first entry time, e.g. after the first deploy.")
+
+    def handle(self, *args, **options) -> None:
+        count: int = rebuildVisitors()
+        self.stdout.write(f"Added {count} visitors.")
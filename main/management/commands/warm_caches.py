@@ -0,0 +1,34 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from company_user.models import CompanyUser, Role
+from main import constants
+from parameter.service import preloadParameters
+
+
+class Command(BaseCommand):
+    help = ("Fills the cache after a deploy or a cache flush with the "
+            + "parameters, the role permissions and the company users.")
+
+    def handle(self, *args, **options) -> None:
+        params = preloadParameters()
+        self.stdout.write(f"Cached {len(params)} parameters.")
+
+        roles: dict[str, set[str]] = {
+            f'ROLE_{role.id}': Role.getGroupsPermissions(
+                group.name for group in role.groups.all())
+            for role in Role.objects.prefetch_related('groups')
+        }
+        if roles:
+            cache.set_many(roles, constants.DEFAULT_CACHE_EXPIRE)
+        self.stdout.write(f"Cached the permissions of {len(roles)} roles.")
+
+        # The same lifetime as `CompanyUser.getCompanyUserByUserObject`
+        company_users: dict[str, CompanyUser] = {
+            "COMPANY_USER:%d" % company_user.user.pk: company_user
+            for company_user in CompanyUser.objects.select_related(
+                'user', 'role').prefetch_related('role__groups')
+        }
+        if company_users:
+            cache.set_many(company_users, 300)
+        self.stdout.write(f"Cached {len(company_users)} company users.")
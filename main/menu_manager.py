@@ -1,11 +1,9 @@
-from dataclasses import dataclass
-from typing import Any, Set, Optional
+from dataclasses import dataclass, replace
+from typing import Collection, Optional
 
 from django.http import HttpRequest
 
 from main import constants
-from company_user.models import CompanyUser
-from member.models import Person
 
 
 @dataclass
@@ -16,35 +14,34 @@ class MenuItem:
     submenu: Optional[int | None] = None
     icon: Optional[str | None] = None
     arg: Optional[str | None] = None
+    # The item is active when the requested path contains it
+    active_path: Optional[str | None] = None
 
 
 def getUserMenus(request: HttpRequest) -> list[MenuItem]:
-    userMenu: list[MenuItem] = []
-
-    if not request.user.is_authenticated:
-        return userMenu
+    from .auth_context import AuthContext, getAuthContext
 
-    # Company User Menu
-    if request.user.is_staff:
-        company_user: CompanyUser | None = None
-        try:
-            company_user = CompanyUser.getCompanyUserByUserObject(
-                request.user)
-        except CompanyUser.DoesNotExist:
-            pass
+    auth_context: AuthContext | None = getAuthContext(request)
+    if auth_context is None:
+        return []
+    return [replace(menu_item, is_active=menu_item.active_path in request.path)
+            for menu_item in auth_context.menu]
 
-        if company_user:
-            groups: Set[str] = company_user.role.groups.all(
-            ).values_list('name', flat=True)
 
-        if request.user.is_superuser:
-            groups = constants.GROUPS
+def buildUserMenus(is_staff: bool, groups: Collection[str], has_membership: bool) -> list[MenuItem]:
+    """
+    Returns the menu items of a user, none of them active.
+    """
+    userMenu: list[MenuItem] = []
 
+    # Company User Menu
+    if is_staff:
         if constants.GROUPS.MEMBERS in groups:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.MEMBERS],
                 page=constants.PAGES.MEMBERS_PAGE,
-                is_active=True if "Members" in request.path else False,
+                is_active=False,
+                active_path="Members",
                 arg='list',
                 icon="svg/members.svg",
             )
@@ -54,7 +51,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.BROADCAST],
                 page=constants.PAGES.BROADCAST_PAGE,
-                is_active=True if "Broadcast" in request.path else False,
+                is_active=False,
+                active_path="Broadcast",
                 icon="svg/broadcast.svg",
             )
             userMenu.append(menu_item)
@@ -63,7 +61,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.MONITOR],
                 page=constants.PAGES.MONITOR_PAGE,
-                is_active=True if "Monitor" in request.path else False,
+                is_active=False,
+                active_path="Monitor",
                 icon="svg/monitor.svg",
             )
             userMenu.append(menu_item)
@@ -72,7 +71,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.COMPANY_USER],
                 page=constants.PAGES.COMPANY_USERS_PAGE,
-                is_active=True if "User-Management" in request.path else False,
+                is_active=False,
+                active_path="User-Management",
                 icon="svg/user_management.svg",
             )
             userMenu.append(menu_item)
@@ -83,7 +83,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.ACCOUNTING],
                 page=constants.PAGES.ACCOUNTING_PAGE,
-                is_active=True if "/Accounting/" in request.path else False,
+                is_active=False,
+                active_path="/Accounting/",
                 icon="svg/accounting.svg",
             )
             userMenu.append(menu_item)
@@ -93,7 +94,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
                 name="الحسابات البنكية",
                 page=constants.PAGES.ACCOUNT_LIST_PAGE,
                 submenu=constants.GROUPS.ACCOUNTING,
-                is_active=True if "/Accounts/" in request.path else False,
+                is_active=False,
+                active_path="/Accounts/",
                 icon="svg/bank.svg",
             )
             userMenu.append(menu_item)
@@ -102,7 +104,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
                 name="قائمة السندات",
                 page=constants.PAGES.BOND_LIST_PAGE,
                 submenu=constants.GROUPS.ACCOUNTING,
-                is_active=True if "/Bond/" in request.path else False,
+                is_active=False,
+                active_path="/Bond/",
                 icon="svg/bond.svg",
             )
             userMenu.append(menu_item)
@@ -112,7 +115,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
                 name=constants.GROUPS_AR[constants.GROUPS.PAYMENT],
                 page=constants.PAGES.MEMBERSHIP_PAYMENT_LIST_PAGE,
                 submenu=constants.GROUPS.ACCOUNTING,
-                is_active=True if "/Payment/" in request.path else False,
+                is_active=False,
+                active_path="/Payment/",
                 icon="svg/payment_history.svg",
             )
             userMenu.append(menu_item)
@@ -122,7 +126,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
                 name=constants.GROUPS_AR[constants.GROUPS.DONATION],
                 page=constants.PAGES.DONATION_LIST_PAGE,
                 submenu=constants.GROUPS.ACCOUNTING,
-                is_active=True if "/Donation-List/" in request.path else False,
+                is_active=False,
+                active_path="/Donation-List/",
                 icon="svg/donation.svg",
             )
             userMenu.append(menu_item)
@@ -131,7 +136,8 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.FORMS],
                 page=constants.PAGES.FORMS_LIST_PAGE,
-                is_active=True if "Forms" in request.path else False,
+                is_active=False,
+                active_path="Forms",
                 icon="svg/forms.svg",
             )
             userMenu.append(menu_item)
@@ -140,46 +146,48 @@ def getUserMenus(request: HttpRequest) -> list[MenuItem]:
             menu_item: MenuItem = MenuItem(
                 name=constants.GROUPS_AR[constants.GROUPS.PARAMETER],
                 page=constants.PAGES.SETTINGS_PAGE,
-                is_active=True if "Settings" in request.path else False,
+                is_active=False,
+                active_path="Settings",
                 icon="svg/settings.svg",
             )
             userMenu.append(menu_item)
 
     # Members Menus
-    elif not request.user.is_staff:
-        user_data: dict[str, Any] = Person.getUserData(request.user)
-        if user_data.get('has_membership'):
-
-            menu_item: MenuItem = MenuItem(
-                name="بطاقة العضوية",
-                page=constants.PAGES.MEMBERSHIP_CARD_PAGE,
-                is_active=True if "Membership-Card" in request.path else False,
-                icon="svg/membership_card.svg",
-            )
-            userMenu.append(menu_item)
-
-            menu_item: MenuItem = MenuItem(
-                name="دفع الإشتراك",
-                page=constants.PAGES.MEMBERSHIP_PAYMENT_PAGE,
-                is_active=True if "Membership-Payment" in request.path else False,
-                icon="svg/pay.svg",
-            )
-            userMenu.append(menu_item)
-
-            menu_item: MenuItem = MenuItem(
-                name="مدفوعات العضوية",
-                page=constants.PAGES.MEMBERSHIP_PAYMENT_HISTORY_PAGE,
-                is_active=True if "Payment-History" in request.path else False,
-                icon="svg/payment_history.svg",
-            )
-            userMenu.append(menu_item)
-
-            menu_item: MenuItem = MenuItem(
-                name="ادعمنا",
-                page=constants.PAGES.DONATION_PAGE,
-                is_active=True if "/Donation/" in request.path else False,
-                icon="svg/donation.svg",
-            )
-            userMenu.append(menu_item)
+    elif has_membership:
+        menu_item: MenuItem = MenuItem(
+            name="بطاقة العضوية",
+            page=constants.PAGES.MEMBERSHIP_CARD_PAGE,
+            is_active=False,
+            active_path="Membership-Card",
+            icon="svg/membership_card.svg",
+        )
+        userMenu.append(menu_item)
+
+        menu_item: MenuItem = MenuItem(
+            name="دفع الإشتراك",
+            page=constants.PAGES.MEMBERSHIP_PAYMENT_PAGE,
+            is_active=False,
+            active_path="Membership-Payment",
+            icon="svg/pay.svg",
+        )
+        userMenu.append(menu_item)
+
+        menu_item: MenuItem = MenuItem(
+            name="مدفوعات العضوية",
+            page=constants.PAGES.MEMBERSHIP_PAYMENT_HISTORY_PAGE,
+            is_active=False,
+            active_path="Payment-History",
+            icon="svg/payment_history.svg",
+        )
+        userMenu.append(menu_item)
+
+        menu_item: MenuItem = MenuItem(
+            name="ادعمنا",
+            page=constants.PAGES.DONATION_PAGE,
+            is_active=False,
+            active_path="/Donation/",
+            icon="svg/donation.svg",
+        )
+        userMenu.append(menu_item)
 
     return userMenu
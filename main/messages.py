@@ -14,6 +14,8 @@ INCORRECT_INFO: Final[Callable[[HttpRequest], None]] = lambda request: messages.
 MANY_FAILED_LOGIN_WARNING: Final[Callable[[HttpRequest], None]] = lambda request: messages.warning(
     request, "تنبيه: تم تكرار محاولات تسجيل الدخول الفاشلة بشكل متكرر. الرجاء التحقق من صحة المعلومات "
     + "وتجنب المحاولات غير المصرح بها. سيتم حظرك بعد 5 محاولات فاشلة. للمساعدة، يرجى التواصل مع الدعم الفني.")
+LOGIN_LOCKED: Final[Callable[[HttpRequest], None]] = lambda request: messages.error(
+    request, "تم إيقاف تسجيل الدخول مؤقتاً بسبب تكرار المحاولات الفاشلة. الرجاء المحاولة مرة أخرى لاحقاً")
 SOMETHING_WRONG: Final[Callable[[HttpRequest], None]] = lambda request: messages.warning(
     request, "عفوًا!! هناك خطأ ما...")
 TIME_OUT: Final[Callable[[HttpRequest], None]] = lambda request: messages.info(
@@ -111,6 +113,16 @@ INSUFFICIENT_BALANCE: Final[Callable[[HttpRequest, str], None]] = lambda request
 INVALID_DEFAULT_ACCOUNT: Final[Callable[[HttpRequest, str], None]] = lambda request, account_number: messages.error(
     request, f"الحساب الافتراضي رقم \"{account_number}\" غير صالح")
 
+# ==== Monitor App Messages ====
+BLOCK_LIST_IMPORTED: Final[Callable[[HttpRequest, int, int], None]] = lambda request, ips, networks: messages.success(
+    request, f"تم حظر {ips} عنوان آي بي و{networks} نطاق بنجاح")
+BLOCK_LIST_REMOVED: Final[Callable[[HttpRequest, int, int], None]] = lambda request, ips, networks: messages.success(
+    request, f"تم إلغاء حظر {ips} عنوان آي بي و{networks} نطاق بنجاح")
+PARQUET_UNAVAILABLE: Final[Callable[[HttpRequest], None]] = lambda request: messages.error(
+    request, "التصدير بصيغة Parquet غير متاح على هذا الخادم، يرجى اختيار CSV")
+INVALID_BLOCK_LIST_LINES: Final[Callable[[HttpRequest, list[str]], None]] = lambda request, lines: messages.warning(
+    request, "تم تجاهل الأسطر غير الصالحة التالية: " + "، ".join(lines[:20]))
+
 # ==== Forms App Messages ====
 INVALID_FORMS: Final[Callable[[HttpRequest], None]] = lambda request: messages.warning(
     request, "تنبه: توجد خصائص غير صالحة لبعض النماذج وتم استبعادها من هذه القائمة.",
@@ -1,9 +1,8 @@
 from datetime import timedelta
 import logging
 from logging import Logger
-import re
 import traceback
-from typing import Callable
+from typing import Any, Callable
 
 from django.conf import settings
 from django.contrib.auth import logout, SESSION_KEY
@@ -12,7 +11,6 @@ from django.core.exceptions import (DisallowedHost,
                                     TooManyFieldsSent,
                                     SuspiciousOperation)
 from django.core.cache import cache
-from django.db.models import F, Q
 from django.http import (HttpResponseBadRequest,
                          HttpResponsePermanentRedirect,
                          HttpResponseForbidden,
@@ -21,14 +19,23 @@ from django.http import (HttpResponseBadRequest,
                          Http404,
                          UnreadablePostError)
 from django.shortcuts import redirect, render
-from django.urls import reverse, resolve
 from django.utils import timezone
 
 from . import constants
 from . import messages as MSG
-from .models import AuditEntry, BlockedClient
+from .anomaly_detector import Anomaly, getAnomalyDetector
+from .background import getWorkQueue
+from .blocklist import blockClient, getBlocklist, unblockClient
+from .html_scanner import isThereHtml
+from .login_throttle import LOGIN_FAILURES_ATTRIBUTE, getFailuresKey
+from .models import AuditEntry
+from .rate_limiter import SlidingWindow, getRateLimiter
+from .route_policy import (RATE_LIMIT_DONATION, RATE_LIMIT_LOGIN,
+                           RATE_LIMIT_MEMBER_FORM, RoutePolicy,
+                           getRoutePolicy, getRoutePolicyIndex, isAdminPath)
 from parameter.service import getParameterValue
 from .utils import getClientIp, getUserAgent
+from .visitors import getVisitedKey, isNewVisitor, markVisited
 
 logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
 
@@ -41,14 +48,17 @@ class AllowedClientMiddleware(object):
         self.requester_ip: str = None
         self.requester_agent: str = None
         self.user: str = None
+        self.counters: dict[str, Any] = {}
+        getRoutePolicyIndex()
 
     def __call__(self, request: HttpRequest) -> HttpResponse | HttpResponsePermanentRedirect | HttpResponseForbidden:
         self.request = request
         self.requester_ip = getClientIp(request)
         self.requester_agent = getUserAgent(request)
         self.user = str(request.user)
+        self.counters = {}
         current_path: str = request.path
-        current_page_name: str = resolve(request.path_info).url_name
+        policy: RoutePolicy = getRoutePolicy(request)
 
         # Security check
         try:
@@ -65,54 +75,52 @@ class AllowedClientMiddleware(object):
             logger.warning("Get: " + request.GET)
             logger.warning("Post: " + request.POST)
             self.blockClient(indefinitely=True)
-            AuditEntry.create(ip=self.requester_ip,
-                              user_agent=self.requester_agent,
-                              action=constants.ACTION.ATTACK_ATTEMPT,
-                              username=self.user)
+            AuditEntry.createInBackground(ip=self.requester_ip,
+                                          user_agent=self.requester_agent,
+                                          action=constants.ACTION.ATTACK_ATTEMPT,
+                                          username=self.user)
             return redirect(constants.PAGES.LOGOUT)
         except SuspiciousOperation:
             logger.warning("The client is sending many files with request")
             logger.warning("Files: " + request.FILES)
             self.blockClient(indefinitely=True)
-            AuditEntry.create(ip=self.requester_ip,
-                              user_agent=self.requester_agent,
-                              action=constants.ACTION.ATTACK_ATTEMPT,
-                              username=self.user)
+            AuditEntry.createInBackground(ip=self.requester_ip,
+                                          user_agent=self.requester_agent,
+                                          action=constants.ACTION.ATTACK_ATTEMPT,
+                                          username=self.user)
             return redirect(constants.PAGES.LOGOUT)
 
-        ip_key = f'IP:{self.requester_ip}'
-        if ip_key in cache:
-            try:
-                request_count = cache.incr(ip_key)
-            except ValueError:
-                request_count = 1
-        else:
-            cache.add(ip_key, 1)
-            cache.expire(ip_key, 1)
-            request_count = 1
-        if request_count > getParameterValue(constants.PARAMETERS.REQUEST_MAX_LIMIT_PER_SECOND):
+        is_posting: bool = request.method == constants.POST_METHOD
+        self.counters = self.evaluateCounters(policy, is_posting)
+
+        if self.counters["RATE:IP:%s" % self.requester_ip] > getParameterValue(
+                constants.PARAMETERS.REQUEST_MAX_LIMIT_PER_SECOND):
+            self.blockClient()
+
+        anomaly: Anomaly | None = getAnomalyDetector().observe(
+            self.requester_ip, self.requester_agent)
+        if anomaly and not self.isBlockedClient():
+            logger.warning(
+                f"Request flood detected from IP: {self.requester_ip}, "
+                + f"{anomaly.count} requests of the {anomaly.dimension} "
+                + f"[{anomaly.key}] in {anomaly.resolution}s, "
+                + f"threshold {anomaly.threshold}")
             self.blockClient()
 
         # Is new visitor
         if self.isNewVisiter():
-            AuditEntry.create(ip=self.requester_ip,
-                              user_agent=self.requester_agent,
-                              action=constants.ACTION.FIRST_VISIT,
-                              username=self.user)
+            AuditEntry.createInBackground(ip=self.requester_ip,
+                                          user_agent=self.requester_agent,
+                                          action=constants.ACTION.FIRST_VISIT,
+                                          username=self.user)
 
         # If the requester posting
-        if request.method == constants.POST_METHOD:
+        if is_posting:
 
             # Donation Limit
-            if current_page_name == constants.PAGES.DONATION_PAGE:
-                DONATION_LIMIT_CACHE_KEY = 'DONATION:%s' % self.requester_ip
-                if cache.has_key(DONATION_LIMIT_CACHE_KEY):
-                    donation_count = cache.incr(DONATION_LIMIT_CACHE_KEY)
-                else:
-                    cache.add(DONATION_LIMIT_CACHE_KEY, 1)
-                    cache.expire(DONATION_LIMIT_CACHE_KEY,
-                                 constants.DEFAULT_CACHE_EXPIRE)
-                    donation_count = 1
+            if policy.rate_limit == RATE_LIMIT_DONATION:
+                donation_count: int = self.counters[
+                    "RATE:DONATION:%s" % self.requester_ip]
 
                 logger.info("DONATION COUNT: %s" % donation_count)
                 if donation_count > 5:
@@ -120,10 +128,9 @@ class AllowedClientMiddleware(object):
                     return redirect(constants.PAGES.DONATION_PAGE)
 
             # Member Form Limit
-            if current_page_name == constants.PAGES.MEMBER_FORM_PAGE:
-                MEMBER_POST_COUNT_CACHED_KEY: str = "MEMBER_FORM:%s" % self.requester_ip
-                membership_form_posts_count: int | None = cache.get(
-                    MEMBER_POST_COUNT_CACHED_KEY)
+            if policy.rate_limit == RATE_LIMIT_MEMBER_FORM:
+                membership_form_posts_count: int | None = self.counters.get(
+                    "MEMBER_FORM:%s" % self.requester_ip)
 
                 if not membership_form_posts_count:
                     membership_form_posts_count = 0
@@ -139,16 +146,8 @@ class AllowedClientMiddleware(object):
                 self.blockClient(indefinitely=True)
                 return redirect(constants.PAGES.LOGOUT)
 
-            POST_REQUEST_COUNT: str = "POST:%s" % self.requester_ip
-            last_posts_count: int = cache.get(POST_REQUEST_COUNT)
-
-            if last_posts_count:
-                last_posts_count += 1
-            else:
-                last_posts_count = 1
-
-            cache.set(POST_REQUEST_COUNT, last_posts_count, getParameterValue(
-                constants.PARAMETERS.BETWEEN_POST_REQUESTS_TIME) / 1000)
+            last_posts_count: int = self.counters[
+                "RATE:POST:%s" % self.requester_ip]
 
             # If the requester spams 2 posts
             if 1 < last_posts_count <= 3:
@@ -161,10 +160,10 @@ class AllowedClientMiddleware(object):
             # If the requester spams 3-5 posts
             elif 3 < last_posts_count <= 5:
                 self.blockClient()
-                AuditEntry.create(ip=self.requester_ip,
-                                  user_agent=self.requester_agent,
-                                  action=constants.ACTION.SUSPICIOUS_POST,
-                                  username=self.user)
+                AuditEntry.createInBackground(ip=self.requester_ip,
+                                              user_agent=self.requester_agent,
+                                              action=constants.ACTION.SUSPICIOUS_POST,
+                                              username=self.user)
                 logger.warning(
                     f"The system cut suspicious post requests from "
                     + f"username: {self.user}, IP: {self.requester_ip}")
@@ -173,10 +172,10 @@ class AllowedClientMiddleware(object):
             # If the requester spam more than 5 posts
             elif last_posts_count > 5:
                 self.blockClient(indefinitely=True)
-                AuditEntry.create(ip=self.requester_ip,
-                                  user_agent=self.requester_agent,
-                                  action=constants.ACTION.SUSPICIOUS_POST,
-                                  username=self.user)
+                AuditEntry.createInBackground(ip=self.requester_ip,
+                                              user_agent=self.requester_agent,
+                                              action=constants.ACTION.SUSPICIOUS_POST,
+                                              username=self.user)
                 logger.warning(
                     f"The system cut suspicious post requests from "
                     + f"username: {self.user}, IP: {self.requester_ip}")
@@ -195,9 +194,13 @@ class AllowedClientMiddleware(object):
             # Failed Login Limit
             available_attempts: int = getParameterValue(
                 constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS)
-            CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY: str = "FAIL_LOGIN:%s" % self.requester_ip
-            failed_login_attempts: int | None = cache.get(
+            CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY: str = getFailuresKey(self.requester_ip)
+            failed_login_attempts: int | None = self.counters.get(
                 CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY)
+            # The login view may just have counted a new failed attempt
+            if policy.rate_limit == RATE_LIMIT_LOGIN and is_posting:
+                failed_login_attempts = getattr(
+                    request, LOGIN_FAILURES_ATTRIBUTE, failed_login_attempts)
             if failed_login_attempts:
                 available_attempts -= failed_login_attempts
 
@@ -209,9 +212,8 @@ class AllowedClientMiddleware(object):
 
         # Check if the temporary block of the requester ended
         elif self.isAllowedToUnblocked():
-            blocked_client: BlockedClient = BlockedClient.get(
-                ip=self.requester_ip)
-            blocked_client.setBlockType(constants.BLOCK_TYPES.UNBLOCKED)
+            getBlocklist().markUnblocked(self.requester_ip)
+            getWorkQueue().submit(unblockClient, self.requester_ip)
             logger.warning(f"Client at IP address [{self.requester_ip}]"
                            + " was UNBLOCKED!!")
             return redirect(current_path)
@@ -224,100 +226,74 @@ class AllowedClientMiddleware(object):
         return response
 
     def blockClient(self, indefinitely: bool = False) -> None:
-        block_type: str = constants.BLOCK_TYPES.TEMPORARY
-        if BlockedClient.isExists(ip=self.requester_ip):
-            blocked_client: BlockedClient = BlockedClient.get(
-                ip=self.requester_ip)
-            blocked_times: int = blocked_client.blocked_times
-            conditions = (
-                indefinitely,
-                not (blocked_times < getParameterValue(
-                    constants.PARAMETERS.MAX_TEMPORARY_BLOCK) - 1)
-            )
-            if any(conditions):
-                block_type = constants.BLOCK_TYPES.INDEFINITELY
-            temp_val: int = 1 if blocked_client.block_type != getParameterValue(
-                constants.PARAMETERS.MAX_TEMPORARY_BLOCK) else 0
-            blocked_client.setBlockedTimes(blocked_times + temp_val)
-            blocked_client.setBlockType(block_type)
-        else:
-            if indefinitely:
-                block_type = constants.BLOCK_TYPES.INDEFINITELY
-            BlockedClient.create(ip=self.requester_ip,
-                                 user_agent=self.requester_agent,
-                                 block_type=block_type
-                                 )
-        BLACKLISTED_KEY: str = "BLACKLISTED:%s" % self.requester_ip
-        WHITELISTED_KEY: str = "WHITELISTED:%s" % self.requester_ip
-        cache.delete(WHITELISTED_KEY)
-        cache.set(BLACKLISTED_KEY, block_type, None)
-        logger.warning(f"Client at IP address [{self.requester_ip}] "
-                       + f"was {block_type} blocked")
+        getBlocklist().markBlocked(self.requester_ip)
+        getWorkQueue().submit(blockClient, self.requester_ip,
+                              self.requester_agent, indefinitely)
+
+    def evaluateCounters(self, policy: RoutePolicy, is_posting: bool) -> dict[str, Any]:
+        """
+        Counts the request in its rate limits windows and reads the cached
+        client flags, all in one round trip to the cache.
+        """
+        windows: list[SlidingWindow] = [
+            SlidingWindow(
+                key="RATE:IP:%s" % self.requester_ip,
+                window=1000,
+                cap=getParameterValue(
+                    constants.PARAMETERS.REQUEST_MAX_LIMIT_PER_SECOND) + 1
+            ),
+        ]
+        lookups: list[str] = [
+            getVisitedKey(self.requester_ip),
+            getFailuresKey(self.requester_ip),
+        ]
+
+        if is_posting:
+            windows.append(SlidingWindow(
+                key="RATE:POST:%s" % self.requester_ip,
+                window=getParameterValue(
+                    constants.PARAMETERS.BETWEEN_POST_REQUESTS_TIME),
+                cap=6
+            ))
+            if policy.rate_limit == RATE_LIMIT_DONATION:
+                windows.append(SlidingWindow(
+                    key="RATE:DONATION:%s" % self.requester_ip,
+                    window=constants.DEFAULT_CACHE_EXPIRE * 1000,
+                    cap=6
+                ))
+            if policy.rate_limit == RATE_LIMIT_MEMBER_FORM:
+                lookups.append("MEMBER_FORM:%s" % self.requester_ip)
+
+        return getRateLimiter().evaluate(windows, lookups)
 
     def isAllowedToUnblocked(self) -> bool:
-        if BlockedClient.objects.annotate(
-                time_to_unblocked=F('updated') + timedelta(
-                    days=getParameterValue(
-                        constants.PARAMETERS.TEMPORARY_BLOCK_PERIOD))
-            ).filter(
-                ip=self.requester_ip,
-                block_type=constants.BLOCK_TYPES.TEMPORARY,
-                time_to_unblocked__lte=timezone.now()
-        ).exists():
-            cache.delete("BLACKLISTED:%s" % self.requester_ip)
-            return True
-
-        return False
+        return getBlocklist().isTemporaryBlockEnded(self.requester_ip)
 
     def isBlockedClient(self) -> bool:
-        BLACKLISTED_KEY: str = "BLACKLISTED:%s" % self.requester_ip
-        WHITELISTED_KEY: str = "WHITELISTED:%s" % self.requester_ip
-
-        if not cache.has_key(BLACKLISTED_KEY) and cache.has_key(WHITELISTED_KEY):
-            return False
-
-        if BlockedClient.objects.filter(
-            ~Q(block_type=constants.BLOCK_TYPES.UNBLOCKED),
-            ip=self.requester_ip,
-        ).exists():
-            cache.set(BLACKLISTED_KEY, None, None)
-            return True
-
-        cache.set(WHITELISTED_KEY, None, constants.DEFAULT_CACHE_EXPIRE)
-        return False
+        return getBlocklist().isBlocked(self.requester_ip)
 
     def isNewVisiter(self) -> bool:
-        # Check first in the last audit entry, if not: check for all
-        VISITOR_KEY: str = "VST:%s" % self.requester_ip
-        if cache.has_key(VISITOR_KEY):
+        # Seen today
+        if getVisitedKey(self.requester_ip) in self.counters:
             return False
 
-        cache.set(VISITOR_KEY, None, constants.DEFAULT_CACHE_EXPIRE)
-        if any((
-            AuditEntry.filter(
-                id__gte=getParameterValue(
-                constants.PARAMETERS.MAGIC_NUMBER),
-                ip=self.requester_ip).exists(),
-            AuditEntry.isExists(ip=self.requester_ip)
-        )):
-            return False
-        else:
-            return True
+        markVisited(self.requester_ip)
+        return isNewVisitor(self.requester_ip)
 
     def isThereHtmlInPost(self) -> bool:
-        pattern: re.Pattern[str] = re.compile(constants.HTML_TAGS_PATTERN)
-        for values in self.request.POST.values():
-            if re.search(pattern, values):
-                AuditEntry.create(ip=self.requester_ip,
-                                  user_agent=self.requester_agent,
-                                  action=constants.ACTION.ATTACK_ATTEMPT,
-                                  username=self.user)
-                logger.warning(
-                    "Attacking attempt detected. Attacker information "
-                    + f"IP: {self.requester_ip} Username: {self.request.user} "
-                    + f"User Agent: {self.requester_agent}")
-                logger.warning("Post: " + self.request.POST)
-                return True
+        posted_values: list[str] = [value for _, values in self.request.POST.lists()
+                                    for value in values]
+        if isThereHtml(posted_values):
+            AuditEntry.createInBackground(ip=self.requester_ip,
+                                          user_agent=self.requester_agent,
+                                          action=constants.ACTION.ATTACK_ATTEMPT,
+                                          username=self.user)
+            logger.warning(
+                "Attacking attempt detected. Attacker information "
+                + f"IP: {self.requester_ip} Username: {self.request.user} "
+                + f"User Agent: {self.requester_agent}")
+            logger.warning("Post: " + str(self.request.POST))
+            return True
         return False
 
 
@@ -333,13 +309,12 @@ class LoginRequiredMiddleware:
     def process_view(self, request: HttpRequest, *args, **kwargs) -> HttpResponsePermanentRedirect | None:
         time_out: int = getParameterValue(constants.PARAMETERS.TIME_OUT_PERIOD)
         if not request.user.is_authenticated:
-            if request.path.startswith(reverse('admin:index')):
+            if isAdminPath(request):
                 logger.warning(f'Non-allowed user [{request.user}] attempted '
                                + f'to access admin site at "{request.get_full_path()}".'
                                + f' IP: {getClientIp(request)}')
                 raise Http404
-            path: str = resolve(request.path_info).url_name
-            if path in constants.RESTRICTED_PAGES:
+            if getRoutePolicy(request).restricted:
                 return redirect(constants.PAGES.UNAUTHORIZED_PAGE)
             else:
                 return None
@@ -1,8 +1,6 @@
 from __future__ import annotations
 from os import path
-from threading import Thread
 from uuid import uuid4
-import requests
 import logging
 from typing import Optional
 
@@ -12,7 +10,6 @@ from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.db.models.fields.files import ImageFieldFile
 from django.db.models.query import QuerySet
 from django.utils import timezone
-from django.core.cache import cache
 
 from . import constants
 
@@ -152,30 +149,25 @@ class Client(BaseModel):
         self.ip = ip
         self.save()
 
-    @classmethod
-    def _getAndUpdateIpLocation(cls, ip: str, audit_pk: int) -> None:
-        url = f"https://api.iplocation.net/?ip={ip}"
-        response = requests.get(url)
-        if response.status_code == requests.codes.ok:
-            country: str = response.json().get('country_name')
-            if country == '-':
-                country = 'unknown'
-            if country.startswith("United Kingdom"):
-                country = 'United Kingdom'
-            AuditEntry.objects.filter(pk=audit_pk).update(country=country)
-            logger.info("IP: [" + ip + "] | Country: " + country)
-        else:
-            logger.error("Response Code: [" + response.status_code
-                         + "] | Response: " + response.text)
-
     def save(self, *args, **kwargs) -> None:
-        if len(self.user_agent) > 256:
+        from .geolocation import getGeolocationService
+        if self.user_agent and len(self.user_agent) > 256:
             self.user_agent = self.user_agent[:256]
+        geolocation = getGeolocationService()
+        if self.country == '-':
+            self.country = geolocation.getCountry(str(self.ip)) or '-'
         super().save(*args, **kwargs)
 
-        thread: Thread = Thread(target=self._getAndUpdateIpLocation,
-                                args=(str(self.ip), self.pk))
-        thread.start()
+        if self.country == '-':
+            geolocation.locate(str(self.ip))
+
+
+class IpLocation(BaseModel):
+    ip: str = models.GenericIPAddressField(unique=True)
+    country: str = models.CharField(max_length=30)
+
+    def __str__(self) -> str:
+        return f"IP: {self.ip} - Country: {self.country}"
 
 
 class BlockedClient(Client):
@@ -204,14 +196,84 @@ class BlockedClient(Client):
         self.blocked_times = blocked_times
         self.save()
 
+    def save(self, *args, **kwargs) -> None:
+        super().save(*args, **kwargs)
+        from .blocklist import bumpBlocklistVersion
+        bumpBlocklistVersion()
+
+    def delete(self, *args, **kwargs) -> tuple[int, dict[str, int]]:
+        result: tuple[int, dict[str, int]] = super().delete(*args, **kwargs)
+        from .blocklist import bumpBlocklistVersion
+        bumpBlocklistVersion()
+        return result
+
+
+class BlockedNetwork(BaseModel):
+    """
+    An IP range blocked indefinitely, in CIDR notation.
+    """
+    network: str = models.CharField(max_length=49, unique=True)
+    note: str = models.CharField(max_length=100, null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Network: {self.network} - Note: {self.note}"
+
+    def save(self, *args, **kwargs) -> None:
+        super().save(*args, **kwargs)
+        from .blocklist import bumpBlocklistVersion
+        bumpBlocklistVersion()
+
+    def delete(self, *args, **kwargs) -> tuple[int, dict[str, int]]:
+        result: tuple[int, dict[str, int]] = super().delete(*args, **kwargs)
+        from .blocklist import bumpBlocklistVersion
+        bumpBlocklistVersion()
+        return result
+
 
-class AuditEntry(Client):
+class Visitor(BaseModel):
+    """
+    An IP which visited the site, created at its first visit, see
+    main.visitors.
+    """
+    ip: str = models.GenericIPAddressField(unique=True)
+    # Set from the first visit entry instead of the insert time
+    created: timezone.datetime = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"IP: {self.ip} - First Seen: {self.created}"
+
+
+class LoginLockout(BaseModel):
+    """
+    A lockout of an IP, or of a username when it is set, after repeated
+    failed logins. The lock itself is kept in the cache, see
+    main.login_throttle.
+    """
 
     class Meta:
         indexes = [
-            models.Index(fields=['ip']),
+            models.Index(fields=['ip', 'locked_until']),
+            models.Index(fields=['username', 'locked_until']),
         ]
 
+    ip: str = models.GenericIPAddressField()
+    username: str = models.CharField(max_length=150, null=True, blank=True)
+    failures: int = models.PositiveIntegerField()
+    locked_until: timezone.datetime = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"IP: {self.ip} - Username: {self.username} - Until: {self.locked_until}"
+
+    @property
+    def is_active(self) -> bool:
+        return self.locked_until > timezone.now()
+
+
+class BaseAuditEntry(Client):
+
+    class Meta:
+        abstract = True
+
     action: str = models.CharField(
         max_length=2, choices=constants.CHOICES.ACTION)
     username: str = models.CharField(max_length=100, null=True, blank=True)
@@ -239,21 +301,48 @@ class AuditEntry(Client):
         entry: list[str] = constants.ACTION[10:]
         return True if self.action in entry else False
 
+
+class AuditEntry(BaseAuditEntry):
+    """
+    The hot audit entries, the recent ones of every action. The older ones
+    are moved to `AuditEntryArchive` or deleted by the nightly
+    `main.cron.archiveAuditEntries`, see main.audit for the retention.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ip']),
+            models.Index(fields=['ip', 'action', 'created']),
+            models.Index(fields=['action', 'created']),
+        ]
+
     @classmethod
-    def getLastAuditEntry(self) -> QuerySet[AuditEntry]:
-        result: QuerySet[AuditEntry] | None = cache.get(
-            constants.CACHE.LAST_AUDIT_ENTRY_QUERYSET)
-        if not result:
-            from parameter.service import getParameterValue
-            logger.info("Fetching last audit entry queryset from database.")
-            start_chunk_object_id: int = getParameterValue(
-                constants.PARAMETERS.MAGIC_NUMBER)
-            result = AuditEntry.filter(
-                id__gte=start_chunk_object_id)
-            cache.set(constants.CACHE.LAST_AUDIT_ENTRY_QUERYSET, result,
-                      constants.DEFAULT_CACHE_EXPIRE)
+    def getRecent(cls, period: timezone.timedelta, *args, **kwargs) -> QuerySet[AuditEntry]:
+        """
+        Get the filtered entries created in the last period.
+        """
+        return cls.objects.filter(
+            *args, created__gte=timezone.now() - period, **kwargs)
 
-        return result
+    @classmethod
+    def countWithArchive(cls, *args, **kwargs) -> int:
+        """
+        Count the filtered entries of both the hot and the archive tables.
+        """
+        return (cls.objects.filter(*args, **kwargs).count()
+                + AuditEntryArchive.objects.filter(*args, **kwargs).count())
+
+    @classmethod
+    def createInBackground(cls, **kwargs) -> None:
+        """
+        Queues the entry to be inserted in a batch by the audit entry writer,
+        its `created` time is the time of the batch insert.
+        """
+        from .background import getAuditEntryWriter
+        entry: AuditEntry = cls(**kwargs)
+        if entry.user_agent and len(entry.user_agent) > 256:
+            entry.user_agent = entry.user_agent[:256]
+        getAuditEntryWriter().write(entry)
 
     def setAction(self, action: str) -> None:
         self.action = action
@@ -263,9 +352,45 @@ class AuditEntry(Client):
         self.username = username
         self.save()
 
-    def save(self, *args, **kwargs) -> None:
-        super().save(*args, **kwargs)
-        cache.delete(constants.CACHE.LAST_AUDIT_ENTRY_QUERYSET)
+
+class AuditEntryArchive(BaseAuditEntry):
+    """
+    The audit entries moved out of `AuditEntry`, keeping their times.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ip', 'action', 'created']),
+            models.Index(fields=['action', 'created']),
+        ]
+
+    created: timezone.datetime = models.DateTimeField()
+    updated: timezone.datetime = models.DateTimeField()
+
+
+class AuditRollup(BaseModel):
+    """
+    The count of the audit entries of a day by action and country, see
+    main.audit.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'action', 'country'],
+                                    name='unique_audit_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['action', 'day']),
+        ]
+
+    day: timezone.datetime = models.DateField()
+    action: str = models.CharField(
+        max_length=2, choices=constants.CHOICES.ACTION)
+    country: str = models.CharField(max_length=30, default='-')
+    count: int = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.day} - {constants.ACTION_STR[int(self.action)]} - {self.country}: {self.count}'
 
 
 class Donation(BaseModel):
@@ -277,3 +402,23 @@ class Donation(BaseModel):
 
     def __str__(self) -> str:
         return f"أسم المتبرع: {self.name} - المبلغ: {self.amount} - تاريخ التبرع: {self.created}"
+
+
+class BackgroundRemoval(BaseModel):
+    """
+    A photograph with its background removed, stored by the digest of the
+    photograph, see main.background_removal.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['digest', 'backend'],
+                                    name='unique_background_removal'),
+        ]
+
+    digest: str = models.CharField(max_length=64)
+    backend: str = models.CharField(max_length=30)
+    image: ImageFieldFile = models.ImageField(max_length=255)
+
+    def __str__(self) -> str:
+        return f"Digest: {self.digest} - Backend: {self.backend}"
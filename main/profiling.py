@@ -0,0 +1,319 @@
+"""
+Opt-in per request profiling, enabled with the `REQUEST_PROFILING`
+environment variable (see core.settings). A sampled request records its SQL
+queries, its Redis commands, the time spent in every middleware, in the
+view and in rendering its template. The records are added to hourly
+histograms per URL name in Redis, shown on the profiling page.
+"""
+from __future__ import annotations
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import logging
+from logging import Logger
+import random
+import time
+from typing import Any, Callable, Final
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from redis import Redis
+
+from . import constants
+from .background import getWorkQueue
+from parameter.service import getParameterValue
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+# Upper bounds (ms) of the request duration histogram buckets
+HISTOGRAM_BOUNDS: Final[tuple[float, ...]] = (
+    10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+# The histograms are kept per hour for a day
+_BUCKET_PERIOD: Final[int] = 3600
+_BUCKETS_KEPT: Final[int] = 24
+_KEY_PREFIX: Final[str] = 'PROFILE:'
+_VIEW_STAGE: Final[str] = 'View'
+
+_current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    'current_profile', default=None)
+
+
+@dataclass
+class RequestProfile:
+    url_name: str = '-'
+    total_time: float = 0
+    sql_count: int = 0
+    sql_time: float = 0
+    cache_count: int = 0
+    cache_time: float = 0
+    template_time: float = 0
+    # Time spent after each middleware handed the request on
+    downstream_times: dict[str, float] = field(default_factory=dict)
+
+    def recordQuery(self, execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+        start: float = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - start
+
+    def getStageTimes(self, stages: list[str]) -> dict[str, float]:
+        """
+        Returns the time spent in each middleware itself, and in the view
+        when the request reached it.
+        """
+        stage_times: dict[str, float] = {}
+        outer_time: float = self.total_time
+        for stage in stages:
+            if stage not in self.downstream_times:
+                # The middleware returned the response itself
+                stage_times[stage] = outer_time
+                return stage_times
+            stage_times[stage] = outer_time - self.downstream_times[stage]
+            outer_time = self.downstream_times[stage]
+        stage_times[_VIEW_STAGE] = outer_time - self.template_time
+        return stage_times
+
+
+def getCurrentProfile() -> RequestProfile | None:
+    return _current_profile.get()
+
+
+class ProfiledRedis(Redis):
+    """
+    A Redis client recording its commands in the profile of the current
+    request, set as the `REDIS_CLIENT_CLASS` of the cache. A pipeline is
+    not recorded.
+    """
+
+    def execute_command(self, *args, **options) -> Any:
+        profile: RequestProfile | None = _current_profile.get()
+        if profile is None:
+            return super().execute_command(*args, **options)
+
+        start: float = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            profile.cache_count += 1
+            profile.cache_time += time.perf_counter() - start
+
+
+class _ProfiledTemplate(Template):
+
+    def render(self, context=None, request=None) -> str:
+        profile: RequestProfile | None = _current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+
+        start: float = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """
+    The Django templates backend recording the rendering time of the
+    templates in the profile of the current request.
+    """
+
+    def from_string(self, template_code: str) -> Template:
+        return _ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name: str) -> Template:
+        template: Template = super().get_template(template_name)
+        return _ProfiledTemplate(template.template, self)
+
+
+class _TimedHandler:
+
+    def __init__(self, stage: str, handler: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.stage: str = stage
+        self.handler: Callable[[HttpRequest], HttpResponse] = handler
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        profile: RequestProfile | None = _current_profile.get()
+        if profile is None:
+            return self.handler(request)
+
+        start: float = time.perf_counter()
+        try:
+            return self.handler(request)
+        finally:
+            profile.downstream_times[self.stage] = time.perf_counter() - start
+
+
+def _instrumentStages(handler: Callable[[HttpRequest], HttpResponse]) -> list[str]:
+    """
+    Times the rest of the chain after each middleware below the profiling
+    middleware. Django wraps every middleware in a handler keeping it in
+    `__wrapped__`, the chain is walked down to the view handler.
+    """
+    stages: list[str] = []
+    while True:
+        middleware: Any = getattr(handler, '__wrapped__', None)
+        if middleware is None or not hasattr(middleware, 'get_response'):
+            return stages
+        stage: str = type(middleware).__name__
+        handler = middleware.get_response
+        middleware.get_response = _TimedHandler(stage, handler)
+        stages.append(stage)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of the requests, the fraction set by the
+    `PROFILING_SAMPLE_RATE` parameter. Must be the first middleware.
+    """
+
+    def __init__(self, get_response) -> None:
+        self.get_response: Callable[[HttpRequest], HttpResponse] = get_response
+        self.stages: list[str] = _instrumentStages(get_response)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= getParameterValue(
+                constants.PARAMETERS.PROFILING_SAMPLE_RATE):
+            return self.get_response(request)
+
+        profile: RequestProfile = RequestProfile()
+        token = _current_profile.set(profile)
+        start: float = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.recordQuery))
+                response: HttpResponse = self.get_response(request)
+        finally:
+            profile.total_time = time.perf_counter() - start
+            _current_profile.reset(token)
+
+        if request.resolver_match is not None:
+            profile.url_name = request.resolver_match.url_name or '-'
+        getWorkQueue().submit(recordProfile, profile, self.stages)
+        return response
+
+
+def _getBucketKey(bucket: int) -> str:
+    return f'{_KEY_PREFIX}{bucket}'
+
+
+def _getCurrentBucket() -> int:
+    return int(time.time()) // _BUCKET_PERIOD
+
+
+def recordProfile(profile: RequestProfile, stages: list[str]) -> None:
+    """
+    Adds the profile to the histograms of its URL name in the current hour.
+    """
+    prefix: str = profile.url_name + '|'
+    increments: dict[str, float] = {
+        prefix + 'requests': 1,
+        prefix + 'total_ms': profile.total_time * 1000,
+        prefix + 'sql_count': profile.sql_count,
+        prefix + 'sql_ms': profile.sql_time * 1000,
+        prefix + 'cache_count': profile.cache_count,
+        prefix + 'cache_ms': profile.cache_time * 1000,
+        prefix + 'template_ms': profile.template_time * 1000,
+    }
+    for stage, stage_time in profile.getStageTimes(stages).items():
+        increments[f'{prefix}stage:{stage}'] = stage_time * 1000
+    total_ms: float = profile.total_time * 1000
+    for bound in HISTOGRAM_BOUNDS:
+        if total_ms <= bound:
+            increments[f'{prefix}le:{bound}'] = 1
+            break
+
+    key: str = _getBucketKey(_getCurrentBucket())
+    timeout: int = _BUCKET_PERIOD * (_BUCKETS_KEPT + 1)
+    try:
+        from django_redis import get_redis_connection
+        connection = get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        bucket: dict[str, float] = cache.get(key) or {}
+        for name, value in increments.items():
+            bucket[name] = bucket.get(name, 0) + value
+        cache.set(key, bucket, timeout)
+        return
+
+    redis_key: str = cache.make_key(key)
+    pipeline = connection.pipeline(transaction=False)
+    for name, value in increments.items():
+        pipeline.hincrbyfloat(redis_key, name, value)
+    pipeline.expire(redis_key, timeout)
+    pipeline.execute()
+
+
+def _readBuckets(hours: int) -> list[dict[str, float]]:
+    current: int = _getCurrentBucket()
+    keys: list[str] = [_getBucketKey(current - i) for i in range(hours)]
+    try:
+        from django_redis import get_redis_connection
+        connection = get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return [bucket for bucket in cache.get_many(keys).values()]
+
+    pipeline = connection.pipeline(transaction=False)
+    for key in keys:
+        pipeline.hgetall(cache.make_key(key))
+    return [{name.decode(): float(value) for name, value in bucket.items()}
+            for bucket in pipeline.execute()]
+
+
+def _getPercentile(histogram: dict[float, float], requests: float, percentile: float) -> float:
+    """
+    Returns the upper bound of the bucket holding the percentile.
+    """
+    seen: float = 0
+    for bound in HISTOGRAM_BOUNDS:
+        seen += histogram.get(bound, 0)
+        if seen >= requests * percentile:
+            return bound
+    return HISTOGRAM_BOUNDS[-1]
+
+
+def getProfileSummary(hours: int = _BUCKETS_KEPT) -> list[dict[str, Any]]:
+    """
+    Returns the averages and the duration percentiles of every profiled
+    URL name over the last hours, the slowest first.
+    """
+    totals: dict[str, dict[str, float]] = {}
+    for bucket in _readBuckets(hours):
+        for name, value in bucket.items():
+            url_name, metric = name.split('|', 1)
+            url_totals: dict[str, float] = totals.setdefault(url_name, {})
+            url_totals[metric] = url_totals.get(metric, 0) + value
+
+    summary: list[dict[str, Any]] = []
+    for url_name, url_totals in totals.items():
+        requests: float = url_totals.get('requests', 0)
+        if not requests:
+            continue
+        histogram: dict[float, float] = {
+            float(metric[3:]): value for metric, value in url_totals.items()
+            if metric.startswith('le:')
+        }
+        stages: dict[str, float] = {
+            metric[6:]: value / requests for metric, value in url_totals.items()
+            if metric.startswith('stage:')
+        }
+        summary.append({
+            'url_name': url_name,
+            'requests': int(requests),
+            'total_ms': url_totals.get('total_ms', 0) / requests,
+            'p50_ms': _getPercentile(histogram, requests, 0.5),
+            'p95_ms': _getPercentile(histogram, requests, 0.95),
+            'sql_count': url_totals.get('sql_count', 0) / requests,
+            'sql_ms': url_totals.get('sql_ms', 0) / requests,
+            'cache_count': url_totals.get('cache_count', 0) / requests,
+            'cache_ms': url_totals.get('cache_ms', 0) / requests,
+            'template_ms': url_totals.get('template_ms', 0) / requests,
+            'stages': sorted(stages.items(), key=lambda stage: -stage[1]),
+        })
+    summary.sort(key=lambda row: -row['total_ms'])
+    return summary
@@ -0,0 +1,129 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import logging
+from logging import Logger
+import time
+from typing import Any, Final
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from . import constants
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
+
+# ------------------------------------------------------------------------- #
+# KEYS = [window keys..., lookup keys...]                                   #
+# ARGV = [now (ms), number of windows, request token,                       #
+#         window (ms), cap, window (ms), cap, ...]                          #
+# Every window is a sorted set of request tokens scored by their time, the  #
+# entries older than the window are dropped before the new one is counted.  #
+# The lookup keys are only read, a missing key is returned as nil.          #
+# ------------------------------------------------------------------------- #
+_SLIDING_WINDOWS_SCRIPT: Final[str] = """
+local now = tonumber(ARGV[1])
+local windows = tonumber(ARGV[2])
+local token = ARGV[3]
+local result = {}
+for i = 1, windows do
+    local key = KEYS[i]
+    local window = tonumber(ARGV[2 + i * 2])
+    local cap = tonumber(ARGV[3 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    redis.call('ZADD', key, now, token .. ':' .. i)
+    redis.call('ZREMRANGEBYRANK', key, 0, -(cap + 1))
+    redis.call('PEXPIRE', key, window)
+    result[i] = redis.call('ZCARD', key)
+end
+for i = windows + 1, #KEYS do
+    local value = redis.call('GET', KEYS[i])
+    if value then
+        result[i] = value
+    else
+        result[i] = false
+    end
+end
+return result
+"""
+
+
+@dataclass(frozen=True)
+class SlidingWindow:
+    """
+    A request counter over the last `window` milliseconds. The count
+    saturates at `cap`, so `cap` must be greater than the highest limit
+    compared against it.
+    """
+    key: str
+    window: int
+    cap: int
+
+
+class CacheRateLimiter:
+    """
+    Per key rate limiter working on any Django cache backend, it costs a
+    couple of cache calls per counter and the windows are fixed not sliding.
+    """
+
+    def evaluate(self, windows: list[SlidingWindow], lookups: list[str]) -> dict[str, Any]:
+        result: dict[str, Any] = {}
+        for window in windows:
+            timeout: float = max(window.window / 1000, 1)
+            cache.add(window.key, 0, timeout)
+            try:
+                result[window.key] = min(cache.incr(window.key), window.cap)
+            except ValueError:
+                cache.set(window.key, 1, timeout)
+                result[window.key] = 1
+
+        result.update(cache.get_many(lookups))
+        return result
+
+
+class RedisRateLimiter:
+    """
+    Evaluates all the request counters and lookups in a single Lua call,
+    the windows are sliding and updated atomically.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.script = connection.register_script(_SLIDING_WINDOWS_SCRIPT)
+
+    def evaluate(self, windows: list[SlidingWindow], lookups: list[str]) -> dict[str, Any]:
+        keys: list[str] = [cache.make_key(window.key) for window in windows]
+        keys += [cache.make_key(lookup) for lookup in lookups]
+        args: list[int | str] = [int(time.time() * 1000), len(windows),
+                                 uuid4().hex]
+        for window in windows:
+            args += [window.window, window.cap]
+
+        values: list[Any] = self.script(keys=keys, args=args)
+
+        result: dict[str, Any] = {}
+        for window, count in zip(windows, values):
+            result[window.key] = int(count)
+        for lookup, value in zip(lookups, values[len(windows):]):
+            if value is not None:
+                result[lookup] = cache.client.decode(value)
+        return result
+
+
+_rate_limiter: CacheRateLimiter | RedisRateLimiter | None = None
+
+
+def getRateLimiter() -> CacheRateLimiter | RedisRateLimiter:
+    """
+    Returns the Redis limiter when the default cache is a Redis cache,
+    otherwise falls back to the per key cache limiter.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        try:
+            from django_redis import get_redis_connection
+            _rate_limiter = RedisRateLimiter(get_redis_connection('default'))
+        except (ImportError, NotImplementedError):
+            logger.warning("The default cache is not Redis, "
+                           + "falling back to the per key rate limiter.")
+            _rate_limiter = CacheRateLimiter()
+    return _rate_limiter
@@ -0,0 +1,127 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from threading import Lock
+from typing import Final, Iterable
+
+from django.http import HttpRequest
+from django.urls import (get_resolver, resolve, reverse, Resolver404,
+                         ResolverMatch, URLPattern, URLResolver)
+
+from . import constants
+
+# Rate limit classes, the middleware counts the requests of a page in the
+# windows of its class
+RATE_LIMIT_DEFAULT: Final[str] = 'DEFAULT'
+RATE_LIMIT_LOGIN: Final[str] = 'LOGIN'
+RATE_LIMIT_DONATION: Final[str] = 'DONATION'
+RATE_LIMIT_MEMBER_FORM: Final[str] = 'MEMBER_FORM'
+
+_RATE_LIMIT_CLASSES: Final[dict[str, str]] = {
+    constants.PAGES.LOGIN_PAGE: RATE_LIMIT_LOGIN,
+    constants.PAGES.DONATION_PAGE: RATE_LIMIT_DONATION,
+    constants.PAGES.MEMBER_FORM_PAGE: RATE_LIMIT_MEMBER_FORM,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class RoutePolicy:
+    url_name: str | None
+    # Requires a logged in user, in `constants.RESTRICTED_PAGES`
+    restricted: bool = False
+    # Allowed to every staff user
+    staff_common: bool = False
+    # Allowed to every non staff user
+    non_staff_common: bool = False
+    # A non staff page which the superusers are redirected from
+    non_staff_only: bool = False
+    # Allowed to the non staff users who have a membership
+    membership_only: bool = False
+    rate_limit: str = RATE_LIMIT_DEFAULT
+
+
+class RoutePolicyIndex:
+    """
+    The policy of every named route, built once from the URLconf and the
+    permission constants so the middlewares authorize a request with one
+    dictionary lookup.
+    """
+
+    def __init__(self, url_names: Iterable[str]) -> None:
+        staff_pages: set[str] = set(constants.STAFF_RESTRICTED_PAGES)
+        non_staff_pages: set[str] = set(constants.NON_STAFF_RESTRICTED_PAGES)
+        restricted_pages: set[str] = set(constants.RESTRICTED_PAGES)
+        staff_common: set[str] = set(constants.STAFF_PERMISSIONS["COMMON"])
+        non_staff_common: set[str] = set(
+            constants.NON_STAFF_PERMISSIONS["COMMON"])
+        membership_only: set[str] = set(
+            constants.NON_STAFF_PERMISSIONS['WITH_MEMBERSHIP_ONLY'])
+
+        self.default: RoutePolicy = RoutePolicy(url_name=None)
+        self.admin_prefix: str = reverse('admin:index')
+        self.policies: dict[str, RoutePolicy] = {}
+        for url_name in {*url_names, *restricted_pages, *_RATE_LIMIT_CLASSES}:
+            self.policies[url_name] = RoutePolicy(
+                url_name=url_name,
+                restricted=url_name in restricted_pages,
+                staff_common=url_name in staff_common,
+                non_staff_common=url_name in non_staff_common,
+                non_staff_only=(url_name in non_staff_pages
+                                and url_name not in staff_pages),
+                membership_only=url_name in membership_only,
+                rate_limit=_RATE_LIMIT_CLASSES.get(url_name, RATE_LIMIT_DEFAULT),
+            )
+
+    def get(self, url_name: str | None) -> RoutePolicy:
+        if url_name is None:
+            return self.default
+        return self.policies.get(url_name, self.default)
+
+
+def _getUrlNames(patterns: list[URLPattern | URLResolver]) -> Iterable[str]:
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _getUrlNames(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+_route_policy_index: RoutePolicyIndex | None = None
+_route_policy_index_lock: Lock = Lock()
+
+
+def getRoutePolicyIndex() -> RoutePolicyIndex:
+    global _route_policy_index
+    if _route_policy_index is not None:
+        return _route_policy_index
+
+    with _route_policy_index_lock:
+        if _route_policy_index is None:
+            _route_policy_index = RoutePolicyIndex(
+                _getUrlNames(get_resolver().url_patterns))
+    return _route_policy_index
+
+
+def getResolverMatch(request: HttpRequest) -> ResolverMatch | None:
+    """
+    Resolves the path of the request once, the match is kept on the request
+    for the next middlewares.
+    """
+    if getattr(request, 'resolver_match', None) is None:
+        try:
+            request.resolver_match = resolve(request.path_info)
+        except Resolver404:
+            return None
+    return request.resolver_match
+
+
+def getRoutePolicy(request: HttpRequest) -> RoutePolicy:
+    policy: RoutePolicy | None = getattr(request, 'route_policy', None)
+    if policy is None:
+        match: ResolverMatch | None = getResolverMatch(request)
+        policy = getRoutePolicyIndex().get(match.url_name if match else None)
+        request.route_policy = policy
+    return policy
+
+
+def isAdminPath(request: HttpRequest) -> bool:
+    return request.path.startswith(getRoutePolicyIndex().admin_prefix)
@@ -0,0 +1,375 @@
+"""
+The real time stream of the security events: the blocks, the unblocks, the
+attack attempts, the suspicious posts and the failed logins.
+
+The events are added to a capped Redis stream. They are served to the
+allowed staff users as server sent events by `SecurityEventsApplication`,
+which core.asgi puts in front of Django so a connected client holds no
+thread. One thread per process reads the stream and fans the new events out
+to the connected clients, each with a bounded buffer. A client whose buffer
+overflows is disconnected, the browser reconnects with the id of the last
+event it got and the missed events are replayed from the stream.
+"""
+from __future__ import annotations
+import asyncio
+from collections import deque
+from importlib import import_module
+import json
+import logging
+from logging import Logger
+from threading import Lock, Thread
+import time
+from typing import Any, Awaitable, Callable, Final, Iterable
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.utils import timezone
+
+from . import constants
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MIDDLEWARE)
+
+SECURITY_EVENTS_PATH: Final[str] = '/Monitor/Security-Events/'
+# The stream keeps about this many of the last events
+STREAM_MAX_LENGTH: Final[int] = 1000
+# The most events replayed to a connecting client
+MAX_REPLAYED_EVENTS: Final[int] = 100
+# The new events buffered for a client before it is disconnected
+SUBSCRIBER_BUFFER: Final[int] = 100
+_KEEP_ALIVE_INTERVAL: Final[float] = 20
+_READ_BLOCK_MS: Final[int] = 5000
+_RECONNECT_DELAY_MS: Final[int] = 3000
+
+_AUDIT_ACTION_EVENTS: Final[dict[str, str]] = {
+    constants.ACTION.ATTACK_ATTEMPT: constants.SECURITY_EVENT.ATTACK_ATTEMPT,
+    constants.ACTION.SUSPICIOUS_POST: constants.SECURITY_EVENT.SUSPICIOUS_POST,
+    constants.ACTION.LOGGED_FAILED: constants.SECURITY_EVENT.LOGGED_FAILED,
+}
+
+
+def _getRedis() -> Any | None:
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def _getStreamKey() -> str:
+    return cache.make_key(constants.CACHE.SECURITY_EVENTS)
+
+
+def _parseId(event_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = event_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
+
+
+def _toEvent(event_id: bytes | str, fields: dict) -> dict[str, str]:
+    event: dict[str, str] = {
+        (name.decode() if isinstance(name, bytes) else name):
+        (value.decode() if isinstance(value, bytes) else value)
+        for name, value in fields.items()
+    }
+    event['id'] = event_id.decode() if isinstance(event_id, bytes) else event_id
+    return event
+
+
+class _LocalStream:
+    """
+    The stream of this process only, used when the cache is not Redis.
+    """
+
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.events: deque[dict[str, str]] = deque(maxlen=STREAM_MAX_LENGTH)
+        self.last_id: tuple[int, int] = (0, 0)
+
+    def add(self, fields: dict[str, str]) -> dict[str, str]:
+        with self.lock:
+            milliseconds: int = max(int(time.time() * 1000), self.last_id[0])
+            sequence: int = self.last_id[1] + 1 \
+                if milliseconds == self.last_id[0] else 0
+            self.last_id = (milliseconds, sequence)
+            event: dict[str, str] = _toEvent(
+                f'{milliseconds}-{sequence}', fields)
+            self.events.append(event)
+        return event
+
+    def read(self, after_id: str | None, count: int) -> list[dict[str, str]]:
+        with self.lock:
+            events: list[dict[str, str]] = list(self.events)
+        if after_id is None:
+            return events[-count:]
+        after: tuple[int, int] = _parseId(after_id)
+        return [event for event in events if _parseId(event['id']) > after][:count]
+
+
+_local_stream: _LocalStream = _LocalStream()
+
+
+def createSecurityEvent(event_type: str, ip: str, username: str | None = None,
+                        detail: str = '') -> dict[str, str]:
+    return {
+        'type': event_type,
+        'ip': str(ip),
+        'username': str(username or ''),
+        'detail': detail,
+        'time': timezone.now().isoformat(timespec='seconds'),
+    }
+
+
+def publishSecurityEvents(events: list[dict[str, str]]) -> None:
+    """
+    Adds the events to the stream. A failure is logged, never raised.
+    """
+    if not events:
+        return
+    try:
+        connection = _getRedis()
+        if connection is None:
+            getSecurityEventHub().broadcast(
+                [_local_stream.add(fields) for fields in events])
+            return
+
+        pipeline = connection.pipeline(transaction=False)
+        for fields in events:
+            pipeline.xadd(_getStreamKey(), fields, maxlen=STREAM_MAX_LENGTH,
+                          approximate=True)
+        pipeline.execute()
+    except Exception as e:
+        logger.exception(e)
+
+
+def publishSecurityEvent(event_type: str, ip: str, username: str | None = None,
+                         detail: str = '') -> None:
+    publishSecurityEvents(
+        [createSecurityEvent(event_type, ip, username, detail)])
+
+
+def publishAuditEntries(entries: Iterable) -> None:
+    """
+    Publishes the audit entries which are security events.
+    """
+    publishSecurityEvents([
+        createSecurityEvent(_AUDIT_ACTION_EVENTS[entry.action], entry.ip,
+                            entry.username)
+        for entry in entries if entry.action in _AUDIT_ACTION_EVENTS
+    ])
+
+
+def readSecurityEvents(after_id: str | None = None,
+                       count: int = MAX_REPLAYED_EVENTS) -> list[dict[str, str]]:
+    """
+    Returns the events after the given event id, or the last events if no
+    id is given, the oldest first.
+    """
+    connection = _getRedis()
+    if connection is None:
+        return _local_stream.read(after_id, count)
+
+    if after_id is None:
+        entries = reversed(connection.xrevrange(_getStreamKey(), count=count))
+    else:
+        # The range includes the given event
+        entries = [entry for entry in connection.xrange(
+            _getStreamKey(), min=after_id, count=count + 1)
+            if entry[0].decode() != after_id][:count]
+    return [_toEvent(event_id, fields) for event_id, fields in entries]
+
+
+class _Subscriber:
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop: asyncio.AbstractEventLoop = loop
+        self.queue: asyncio.Queue[dict[str, str]] = asyncio.Queue(
+            SUBSCRIBER_BUFFER)
+        self.overflowed: bool = False
+
+    def deliver(self, events: list[dict[str, str]]) -> None:
+        for event in events:
+            if self.queue.full():
+                self.overflowed = True
+                return
+            self.queue.put_nowait(event)
+
+
+class SecurityEventHub:
+    """
+    Reads the new events of the stream in one thread and hands them to the
+    connected clients of this process.
+    """
+
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.subscribers: set[_Subscriber] = set()
+        self.reader: Thread | None = None
+
+    def subscribe(self) -> _Subscriber:
+        subscriber: _Subscriber = _Subscriber(asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.reader is None and _getRedis() is not None:
+                self.reader = Thread(target=self._read, name='security-events',
+                                     daemon=True)
+                self.reader.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def broadcast(self, events: list[dict[str, str]]) -> None:
+        with self.lock:
+            subscribers: list[_Subscriber] = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, events)
+            except RuntimeError:
+                # The loop of a client being disconnected is closed
+                self.unsubscribe(subscriber)
+
+    def _read(self) -> None:
+        last_id: str = '$'
+        while True:
+            try:
+                result = _getRedis().xread({_getStreamKey(): last_id},
+                                           count=MAX_REPLAYED_EVENTS,
+                                           block=_READ_BLOCK_MS)
+                for _, entries in result or ():
+                    events: list[dict[str, str]] = [
+                        _toEvent(event_id, fields) for event_id, fields in entries]
+                    if events:
+                        last_id = events[-1]['id']
+                        self.broadcast(events)
+            except Exception as e:
+                logger.exception(e)
+                time.sleep(_READ_BLOCK_MS / 1000)
+
+
+_security_event_hub: SecurityEventHub = SecurityEventHub()
+
+
+def getSecurityEventHub() -> SecurityEventHub:
+    return _security_event_hub
+
+
+def _isAllowed(cookie_header: str) -> bool:
+    """
+    True if the session of the cookies is of a user allowed to watch the
+    security events.
+    """
+    from django.contrib.auth import get_user
+    from .auth_context import getAuthContext
+
+    close_old_connections()
+    try:
+        session_key: str | None = parse_cookie(cookie_header).get(
+            settings.SESSION_COOKIE_NAME)
+        if not session_key:
+            return False
+
+        request: HttpRequest = HttpRequest()
+        request.session = import_module(
+            settings.SESSION_ENGINE).SessionStore(session_key)
+        request.user = get_user(request)
+        if not request.user.is_authenticated or not request.user.is_staff:
+            return False
+        if request.user.is_superuser:
+            return True
+        return constants.PAGES.SECURITY_EVENTS_STREAM in \
+            getAuthContext(request).permissions
+    finally:
+        close_old_connections()
+
+
+def _formatEvent(event: dict[str, str]) -> bytes:
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+class SecurityEventsApplication:
+    """
+    Serves the security events stream at `SECURITY_EVENTS_PATH` and passes
+    every other request to the given ASGI application.
+    """
+
+    def __init__(self, application: Callable[..., Awaitable[None]]) -> None:
+        self.application: Callable[..., Awaitable[None]] = application
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http' or scope['path'] != SECURITY_EVENTS_PATH:
+            return await self.application(scope, receive, send)
+
+        headers: dict[str, str] = {
+            name.decode('latin1').lower(): value.decode('latin1')
+            for name, value in scope['headers']
+        }
+        if not await sync_to_async(_isAllowed)(headers.get('cookie', '')):
+            await send({'type': 'http.response.start', 'status': 403,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Access Denied'})
+            return
+
+        # EventSource sends the header when reconnecting
+        last_event_id: str | None = headers.get('last-event-id') or parse_qs(
+            scope['query_string'].decode()).get('last_event_id', [None])[0]
+        try:
+            _parseId(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+        await self.stream(receive, send, last_event_id)
+
+    async def stream(self, receive: Callable, send: Callable, last_event_id: str | None) -> None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        async def waitForDisconnect() -> None:
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        hub: SecurityEventHub = getSecurityEventHub()
+        subscriber: _Subscriber = hub.subscribe()
+        disconnected: asyncio.Task = asyncio.ensure_future(waitForDisconnect())
+        try:
+            body: bytes = f'retry: {_RECONNECT_DELAY_MS}\n\n'.encode()
+            # Subscribed first, so no event is missed between the replay and
+            # the new events
+            for event in await sync_to_async(readSecurityEvents, thread_sensitive=False)(
+                    last_event_id):
+                body += _formatEvent(event)
+                last_event_id = event['id']
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+
+            while not disconnected.done():
+                getting: asyncio.Task = asyncio.ensure_future(subscriber.queue.get())
+                done, _ = await asyncio.wait(
+                    {getting, disconnected}, timeout=_KEEP_ALIVE_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if getting not in done:
+                    getting.cancel()
+                    if not disconnected.done():
+                        await send({'type': 'http.response.body',
+                                    'body': b': keep-alive\n\n', 'more_body': True})
+                    continue
+                if subscriber.overflowed:
+                    # The client reconnects and the missed events are replayed
+                    break
+
+                event: dict[str, str] = getting.result()
+                if last_event_id is None or _parseId(event['id']) > _parseId(last_event_id):
+                    await send({'type': 'http.response.body',
+                                'body': _formatEvent(event), 'more_body': True})
+                    last_event_id = event['id']
+        finally:
+            hub.unsubscribe(subscriber)
+            disconnected.cancel()
+
+        await send({'type': 'http.response.body', 'body': b''})
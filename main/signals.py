@@ -1,16 +1,17 @@
 import logging
 from typing import Any
 
-from django.core.cache import cache
 from django.http import HttpRequest
 from django.contrib.auth.models import Group, User
 
 from . import constants
+from .auth_context import invalidateAuthContext
+from .background import getWorkQueue
+from .login_throttle import (LOGIN_FAILURES_ATTRIBUTE, LoginFailure,
+                             getLoginThrottle, recordLockouts)
 from .models import AuditEntry
 from .utils import getClientIp, getUserAgent
 
-from parameter.service import getParameterValue
-
 logger = logging.getLogger(constants.LOGGERS.MAIN)
 
 
@@ -31,43 +32,54 @@ def createGroups(**kwargs) -> None:
 
 def userLoggedIn(sender: User, request: HttpRequest, user: User, **kwargs):
     ip: str = getClientIp(request)
-    AuditEntry.create(action=constants.ACTION.LOGGED_IN,
-                      user_agent=getUserAgent(request),
-                      ip=ip,
-                      username=user.username)
+    AuditEntry.createInBackground(action=constants.ACTION.LOGGED_IN,
+                                  user_agent=getUserAgent(request),
+                                  ip=ip,
+                                  username=user.username)
+    getLoginThrottle().reset(user.username)
     logger.info(f'Login user: {user} via ip: {ip}')
 
 
 def userLoggedOut(sender: User, request: HttpRequest, user: User, **kwargs):
     ip: str = getClientIp(request)
-    AuditEntry.create(action=constants.ACTION.LOGGED_OUT,
-                      user_agent=getUserAgent(request),
-                      ip=ip,
-                      username=user.username)
+    AuditEntry.createInBackground(action=constants.ACTION.LOGGED_OUT,
+                                  user_agent=getUserAgent(request),
+                                  ip=ip,
+                                  username=user.username)
     logger.info(f'Logout user: {user} via ip: {ip}')
 
 
 def userLoggedFailed(sender, credentials: dict[str, Any], **kwargs):
     request: HttpRequest = kwargs.get('request')
     ip: str = getClientIp(request)
-
-    CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY: str = "FAIL_LOGIN:%s" % ip
-    current_client_failed_attempts: int | None = cache.get(
-        CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY)
-    if current_client_failed_attempts:
-        current_client_failed_attempts += 1
-    else:
-        current_client_failed_attempts = 1
-
-    cache.set(
-        CLIENT_FAILED_LOGIN_ATTEMPT_CACHE_KEY,
-        current_client_failed_attempts,
-        constants.DEFAULT_CACHE_EXPIRE * getParameterValue(
-            constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS_RESET)
-    )
-
-    AuditEntry.create(action=constants.ACTION.LOGGED_FAILED,
-                      user_agent=getUserAgent(request),
-                      ip=ip,
-                      username=credentials.get('username', None))
+    username: str | None = credentials.get('username', None)
+
+    failure: LoginFailure = getLoginThrottle().recordFailure(ip, username)
+    # Read by the login view and the middleware instead of the cache
+    setattr(request, LOGIN_FAILURES_ATTRIBUTE, failure.ip_failures)
+    if failure.ip_lock_seconds or failure.username_lock_seconds:
+        getWorkQueue().submit(recordLockouts, ip, username, failure)
+
+    AuditEntry.createInBackground(action=constants.ACTION.LOGGED_FAILED,
+                                  user_agent=getUserAgent(request),
+                                  ip=ip,
+                                  username=username)
     logger.warning(f'Failed accessed to login using: {credentials}')
+
+
+def onUserChanged(sender: User, instance: User, **kwargs) -> None:
+    invalidateAuthContext(instance.pk)
+
+
+def onRoleChanged(sender, **kwargs) -> None:
+    # Every user of the role is affected
+    invalidateAuthContext()
+
+
+def onCompanyUserChanged(sender, instance, **kwargs) -> None:
+    invalidateAuthContext(instance.user_id)
+
+
+def onPersonChanged(sender, instance, **kwargs) -> None:
+    if instance.account_id:
+        invalidateAuthContext(instance.account_id)
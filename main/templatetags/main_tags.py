@@ -1,3 +1,4 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import uuid
 
 from django import template
@@ -66,6 +67,21 @@ def setPage(path: str, page_number: int) -> str:
     return path
 
 
+@register.simple_tag
+def setCursor(path: str, cursor: str | None) -> str:
+    """
+    Sets the keyset pagination cursor of the path, the first page if None.
+    """
+    url = urlsplit(path)
+    query: list[tuple[str, str]] = [
+        (name, value) for name, value in parse_qsl(url.query, keep_blank_values=True)
+        if name != 'cursor'
+    ]
+    if cursor:
+        query.append(('cursor', cursor))
+    return urlunsplit(url._replace(query=urlencode(query)))
+
+
 @register.filter(name="requireTopNav")
 def requireTopNav(url) -> bool:
     if "/Form/" in url \
@@ -1,28 +1,73 @@
+import asyncio
+import csv
+import gzip
+import io
+from importlib import import_module
 import os
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from threading import Thread
+from unittest import skipUnless
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from PIL import Image as Img
 
 from django.conf import settings
 from django.contrib.admin import site
 from django.contrib.admin.sites import AdminSite
-from django.contrib.auth import get_user_model
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY,
+                                 get_user_model)
 from django.contrib.auth.models import Group, User, AnonymousUser
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
 from django.db.models.query import QuerySet
 from django.http import HttpResponseRedirect, HttpRequest, HttpResponse, Http404
-from django.test import RequestFactory, TestCase, Client, SimpleTestCase
+from django.test import (AsyncClient, RequestFactory, TestCase, Client, SimpleTestCase,
+                         override_settings)
 from django.urls import reverse, resolve
 from django.utils import timezone
 from django.utils.timezone import timedelta, datetime
 
+from company_user.middleware import AllowedUserMiddleware
+from company_user.models import CompanyUser, Role
 from member.models import Academic, Person
+from parameter.service import getParameterValue
 
 from . import constants, views
 from .admin import AuditEntryAdmin, BlockedClientAdmin
-from .cron import setMagicNumber
-from .middleware import AllowedClientMiddleware, AllowedUserMiddleware, LoginRequiredMiddleware
-from .models import AuditEntry, BlockedClient
-from parameter.service import getParameterValue
-from .utils import getClientIp, getUserGroupe, getUserAgent
+from .audit import countAuditEntries, getAuditSeries, rebuildAuditRollups
+from .auth_context import getAuthContext
+from .background import WorkQueue
+from .background_removal import KeepBackground, getBackgroundRemover, removeBackground
+from .audit_export import isParquetAvailable, iterAuditRows, streamCsv, streamParquet
+from .blocklist import (Blocklist, NetworkIndex, exportBlocklist, getBlocklist, importBlocklist,
+                        liftExpiredBlocks, removeFromBlocklist)
+from .card_renderer import getCardRenderer
+from .cron import archiveAuditEntries, rollupAuditEntries
+from .geolocation import GeolocationService, OfflineProvider
+from .html_scanner import RegexScanner, TagScanner, isThereHtml
+from .image_pool import getImagePool, shutdownImagePool, validatePhotograph
+from .image_processing import ImageProcessingError, ImageProcessor, getPhotographWorkingSize
+from .login_throttle import (LOCKOUT_BASE_SECONDS, LOCKOUT_MAX_SECONDS,
+                             USERNAME_LOCKOUT_MAX_SECONDS, CacheLoginThrottle, getLoginThrottle,
+                             getLockoutSeconds, recordLockouts)
+from .middleware import AllowedClientMiddleware, LoginRequiredMiddleware
+from .models import (AuditEntry, AuditEntryArchive, BackgroundRemoval, BlockedClient,
+                     BlockedNetwork, IpLocation, LoginLockout, Visitor)
+from .profiling import RequestProfile, getProfileSummary, recordProfile
+from .rate_limiter import CacheRateLimiter, SlidingWindow, getRateLimiter
+from .anomaly_detector import (DIMENSION_IP, DIMENSION_SUBNET, DIMENSION_USER_AGENT,
+                               SKETCH_DEPTH, SKETCH_WIDTH, AnomalyDetector,
+                               Anomaly, CountMinSketch,
+                               getSketchIndexes)
+from .security_events import (SECURITY_EVENTS_PATH, SecurityEventsApplication,
+                              getSecurityEventHub, publishSecurityEvent,
+                              readSecurityEvents)
+from .route_policy import RATE_LIMIT_DEFAULT, RATE_LIMIT_LOGIN, getRoutePolicy, getRoutePolicyIndex
+from .utils import Pagination, getClientIp, getUserGroupe, getUserAgent
+from .visitors import (countUniqueVisitors, isNewVisitor, markVisited,
+                       rebuildVisitors)
 
 
 class TestInitialization(TestCase):
@@ -32,10 +77,8 @@ class TestInitialization(TestCase):
             group_in_database: str = Group.objects.get(name=group).name
             self.assertEquals(group_in_database, group)
 
-    def test_is_superuser_ceo_created(self) -> None:
-        users: QuerySet[User] = User.objects.all()
-        self.assertEquals(users.count(), 1)
-        self.assertTrue(users.first().is_superuser)
+    def test_is_superuser_role_created(self) -> None:
+        self.assertTrue(Role.objects.filter(name='superuser').exists())
 
 
 class TestCron(TestCase):
@@ -44,38 +87,62 @@ class TestCron(TestCase):
         self.test_ip: str = "123.123.123.123"
         self.user_agent: str = "Python"
 
-    def test_magic_number_reset_login_failed_attempts(self):
-        for i in range(3):
-            audit_entry: AuditEntry = AuditEntry.objects.create(
-                ip=self.test_ip,
-                user_agent=self.user_agent,
-                action=constants.ACTION.LOGGED_FAILED
-            )
-            audit_entry.setCreated(timezone.now() - timedelta(days=10))
+    def createAuditEntry(self, action: str, days_ago: int) -> AuditEntry:
         audit_entry: AuditEntry = AuditEntry.objects.create(
             ip=self.test_ip,
             user_agent=self.user_agent,
-            action=constants.ACTION.NORMAL_POST
+            action=action
         )
-        setMagicNumber()
-        self.assertEquals(getParameterValue(constants.PARAMETERS.MAGIC_NUMBER),
-                          audit_entry.id)
+        audit_entry.setCreated(timezone.now() - timedelta(days=days_ago))
+        return audit_entry
+
+    def test_archive_old_audit_entries(self):
+        old_entry: AuditEntry = self.createAuditEntry(
+            constants.ACTION.LOGGED_FAILED, 100)
+        self.createAuditEntry(constants.ACTION.LOGGED_FAILED, 10)
+        archiveAuditEntries()
+        self.assertEquals(AuditEntry.objects.all().count(), 1)
+        archived: AuditEntryArchive = AuditEntryArchive.objects.get()
+        self.assertEquals(archived.created, old_entry.created)
+        self.assertEquals(archived.ip, self.test_ip)
+        self.assertEquals(AuditEntry.countWithArchive(
+            action=constants.ACTION.LOGGED_FAILED), 2)
 
-    def test_magic_number_cleanup_unsuspicious_posts(self):
+    def test_cleanup_unsuspicious_posts(self):
         for i in range(5):
-            audit_entry: AuditEntry = AuditEntry.objects.create(
-                ip=self.test_ip,
-                user_agent=self.user_agent,
-                action=constants.ACTION.NORMAL_POST
-            )
-            audit_entry.setCreated(timezone.now() - timedelta(days=10))
-        AuditEntry.objects.create(
-            ip=self.test_ip,
-            user_agent=self.user_agent,
-            action=constants.ACTION.NORMAL_POST
-        )
-        setMagicNumber()
+            self.createAuditEntry(constants.ACTION.NORMAL_POST, 10)
+        self.createAuditEntry(constants.ACTION.NORMAL_POST, 0)
+        archiveAuditEntries()
         self.assertEquals(AuditEntry.objects.all().count(), 1)
+        self.assertFalse(AuditEntryArchive.objects.exists())
+
+    def test_first_visits_stay_hot(self):
+        self.createAuditEntry(constants.ACTION.FIRST_VISIT, 1000)
+        archiveAuditEntries()
+        self.assertTrue(AuditEntry.isExists(ip=self.test_ip))
+
+    def test_prune_archived_audit_entries(self):
+        self.createAuditEntry(constants.ACTION.LOGGED_IN, 1000)
+        self.createAuditEntry(constants.ACTION.LOGGED_IN, 200)
+        archiveAuditEntries()
+        self.assertFalse(AuditEntry.objects.exists())
+        self.assertEquals(AuditEntryArchive.objects.all().count(), 1)
+
+    def test_staff_and_financial_actions_archived_forever(self):
+        for action in (constants.ACTION.DELETE_USER, constants.ACTION.UPDATE_ROLE,
+                       constants.ACTION.VALIDATE_DONATION,
+                       constants.ACTION.ADD_MEMBERSHIP_PAYMENT):
+            self.createAuditEntry(action, 5000)
+        archiveAuditEntries()
+        self.assertFalse(AuditEntry.objects.exists())
+        self.assertEquals(AuditEntryArchive.objects.count(), 4)
+
+    @override_settings(AUDIT_RETENTION={'LOGGED_IN': (1, 0)})
+    def test_overridden_retention(self):
+        self.createAuditEntry(constants.ACTION.LOGGED_IN, 2)
+        archiveAuditEntries()
+        self.assertFalse(AuditEntry.objects.exists())
+        self.assertFalse(AuditEntryArchive.objects.exists())
 
     def tearDown(self) -> None:
         for row in AuditEntry.objects.all():
@@ -86,6 +153,95 @@ class TestCron(TestCase):
         return super().tearDown()
 
 
+class TestAuditRollups(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.today = timezone.now().date()
+
+    def test_writer_increments_rollups(self) -> None:
+        for i in range(3):
+            AuditEntry.createInBackground(ip=self.test_ip, user_agent="Python",
+                                          action=constants.ACTION.FIRST_VISIT)
+        self.assertEquals(countAuditEntries(
+            [constants.ACTION.FIRST_VISIT], start=self.today), 3)
+        self.assertEquals(getAuditSeries(
+            constants.ACTION.FIRST_VISIT, self.today, self.today),
+            {self.today: 3})
+
+    def test_cron_recounts_rollups(self) -> None:
+        AuditEntry.objects.create(ip=self.test_ip, user_agent="Python",
+                                  action=constants.ACTION.ATTACK_ATTEMPT)
+        self.assertEquals(countAuditEntries(
+            [constants.ACTION.ATTACK_ATTEMPT]), 0)
+        rollupAuditEntries()
+        rollupAuditEntries()
+        self.assertEquals(countAuditEntries(
+            [constants.ACTION.ATTACK_ATTEMPT]), 1)
+
+    def test_monthly_series_includes_archive(self) -> None:
+        old_entry: AuditEntry = AuditEntry.objects.create(
+            ip=self.test_ip, user_agent="Python",
+            action=constants.ACTION.MEMBER_FORM_POST)
+        old_entry.setCreated(timezone.now() - timedelta(days=120))
+        archiveAuditEntries()
+        start = self.today - timedelta(days=200)
+        rebuildAuditRollups(start, self.today)
+        old_day = old_entry.created.date()
+        self.assertEquals(getAuditSeries(
+            constants.ACTION.MEMBER_FORM_POST, start, self.today, monthly=True),
+            {old_day.replace(day=1): 1})
+
+
+class TestAuditExport(TestCase):
+
+    def setUp(self) -> None:
+        for i in range(7):
+            AuditEntry.objects.create(ip=f"1.1.1.{i}", country="ID",
+                                      action=constants.ACTION.LOGGED_IN,
+                                      username=f"user{i}")
+        AuditEntry.objects.create(ip="2.2.2.2", country="ID",
+                                  action=constants.ACTION.ATTACK_ATTEMPT)
+        AuditEntryArchive.objects.create(
+            ip="3.3.3.3", country="ID", action=constants.ACTION.LOGGED_IN,
+            created=timezone.now() - timedelta(days=200),
+            updated=timezone.now() - timedelta(days=200))
+        self.today = timezone.now().date()
+
+    def test_rows_in_chunks(self) -> None:
+        chunks = list(iterAuditRows(chunk_size=3))
+        self.assertEquals([len(chunk) for chunk in chunks], [3, 3, 2])
+        self.assertEquals(chunks[0][0][1:4], ("LOGGED_IN", "1.1.1.0", "ID"))
+
+    def test_rows_filters(self) -> None:
+        rows = [row for chunk in iterAuditRows(
+            actions=[constants.ACTION.ATTACK_ATTEMPT]) for row in chunk]
+        self.assertEquals([row[2] for row in rows], ["2.2.2.2"])
+
+        rows = [row for chunk in iterAuditRows(
+            start=self.today - timedelta(days=365),
+            end=self.today - timedelta(days=1), archived=True) for row in chunk]
+        self.assertEquals([row[2] for row in rows], ["3.3.3.3"])
+        self.assertEquals(list(iterAuditRows(end=self.today - timedelta(days=1))), [])
+
+    def test_csv(self) -> None:
+        data: bytes = b''.join(streamCsv(iterAuditRows(chunk_size=3)))
+        rows = list(csv.reader(io.StringIO(gzip.decompress(data).decode())))
+        self.assertEquals(rows[0][:3], ["created", "action", "ip"])
+        self.assertEquals(len(rows), 9)
+        self.assertEquals(rows[1][4], "user0")
+
+    @skipUnless(isParquetAvailable(), "pyarrow is not installed")
+    def test_parquet(self) -> None:
+        import pyarrow.parquet
+        data: bytes = b''.join(streamParquet(iterAuditRows(chunk_size=3)))
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+        self.assertEquals(parquet_file.metadata.num_row_groups, 3)
+        table = parquet_file.read(use_threads=False)
+        self.assertEquals(table.num_rows, 8)
+        self.assertEquals(table.column('ip').to_pylist()[-1], "2.2.2.2")
+
+
 class TestAllowedClientMiddleware(TestCase):
 
     def setUp(self) -> None:
@@ -96,8 +252,11 @@ class TestAllowedClientMiddleware(TestCase):
         self.client.defaults['REMOTE_ADDR'] = self.test_ip
         self.client.defaults['HTTP_USER_AGENT'] = self.user_agent
         self.anonymous_user = AnonymousUser()
-        self.logged_superuser_admin: User = User.objects.first()
+        self.logged_superuser_admin: User = User.objects.create_superuser(
+            username="admin", password="TestPass")
         self.logged_superuser_admin.last_login = datetime.now()
+        # The counters of the client are kept in the cache between the tests
+        cache.delete_pattern("*%s*" % self.test_ip)
 
     def test_first_visit_recorded(self) -> None:
         request: HttpRequest = self.client.get(reverse("admin:index"))
@@ -164,12 +323,8 @@ class TestAllowedClientMiddleware(TestCase):
         self.assertRedirects(response, reverse(constants.PAGES.ABOUT_PAGE))
 
     def test_block_client_who_filed_to_login_many_times(self) -> None:
-        for i in range(5):
-            AuditEntry.objects.create(
-                ip=self.test_ip,
-                user_agent=self.user_agent,
-                action=constants.ACTION.LOGGED_FAILED
-            )
+        for i in range(getParameterValue(constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS)):
+            getLoginThrottle().recordFailure(self.test_ip, None)
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.INDEX_PAGE))
         request.user = self.anonymous_user
@@ -203,7 +358,8 @@ class TestLoginRequiredMiddleware(TestCase):
         self.client.defaults['REMOTE_ADDR'] = self.test_ip
         self.client.defaults['HTTP_USER_AGENT'] = self.user_agent
         self.anonymous_user = AnonymousUser()
-        self.logged_superuser_admin: User = User.objects.first()
+        self.logged_superuser_admin: User = User.objects.create_superuser(
+            username="admin", password="TestPass")
         self.logged_superuser_admin.last_login = datetime.now()
 
     def test_anonymous_user_trying_to_access_admin_site(self) -> None:
@@ -221,7 +377,7 @@ class TestLoginRequiredMiddleware(TestCase):
             username='TestMemberUSer',
             password='TestPass'
         )
-        group = Group.objects.get(name=constants.GROUPS.MEMBER)
+        group = Group.objects.get(name=constants.GROUPS.MEMBERS)
         user.groups.add(group)
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.MEMBER_DASHBOARD))
@@ -287,6 +443,7 @@ class TestLoginRequiredMiddleware(TestCase):
         setattr(request, '_messages', FallbackStorage(request))
         session_middleware = SessionMiddleware(lambda request: None)
         session_middleware.process_request(request)
+        request.session[SESSION_KEY] = str(request.user.pk)
         request.session.save()
         response: HttpResponse = self.middleware.process_view(request)
         response.client = Client()
@@ -304,14 +461,15 @@ class TestAllowedUserMiddleware(TestCase):
         self.client.defaults['REMOTE_ADDR'] = self.test_ip
         self.client.defaults['HTTP_USER_AGENT'] = self.user_agent
         self.anonymous_user = AnonymousUser()
-        self.logged_superuser_admin: User = User.objects.first()
+        self.logged_superuser_admin: User = User.objects.create_superuser(
+            username="admin", password="TestPass")
         self.logged_non_superuser: User = User.objects.create_user(
             username="TestUser",
             password="TestPass"
         )
         self.logged_non_superuser.username = "NonSuperuser"
         self.logged_non_superuser.save()
-        group = Group.objects.get(name=constants.GROUPS.MEMBER)
+        group = Group.objects.get(name=constants.GROUPS.MEMBERS)
         self.logged_non_superuser.groups.add(group)
         self.logged_superuser_admin.last_login = datetime.now()
         self.logged_non_superuser.last_login = datetime.now()
@@ -337,12 +495,12 @@ class TestAllowedUserMiddleware(TestCase):
         request.user = self.anonymous_user
         self.assertFalse(self.middleware.isAllowedToAccessAdmin(request))
         request: HttpRequest = self.client.get(reverse("admin:index"))
-        group = Group.objects.get(name=constants.GROUPS.MEMBER)
+        group = Group.objects.get(name=constants.GROUPS.MEMBERS)
         user = User.objects.create(username='testuser')
         user.groups.add(group)
         request.user = user
         self.assertEquals(request.user.groups.first().name,
-                          constants.GROUPS.MEMBER)
+                          constants.GROUPS.MEMBERS)
         self.assertFalse(self.middleware.isAllowedToAccessAdmin(request))
 
     def test_doing_nothing_if_user_is_not_authenticated(self) -> None:
@@ -350,7 +508,7 @@ class TestAllowedUserMiddleware(TestCase):
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.ABOUT_PAGE))
         request.user = self.anonymous_user
-        self.assertIsNone(self.middleware.process_view(request))
+        self.assertIsNone(self.middleware.process_request(request))
 
     def test_allowed_user_to_access_page(self) -> None:
         self.logged_superuser_admin.username = "allowed-user"
@@ -368,21 +526,21 @@ class TestAllowedUserMiddleware(TestCase):
             reverse(constants.PAGES.MEMBERS_PAGE, args=['list']))
         request = process_session(request)
         request.user = self.logged_superuser_admin
-        self.assertIsNone(self.middleware.process_view(request))
+        self.assertIsNone(self.middleware.process_request(request))
 
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.DETAIL_MEMBER_PAGE, args=[self.person.pk]))
         request = process_session(request)
         request.user = self.logged_superuser_admin
-        self.assertIsNone(self.middleware.process_view(request))
+        self.assertIsNone(self.middleware.process_request(request))
 
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.MEMBER_DASHBOARD))
         request = process_session(request)
         request.user = self.logged_non_superuser
         self.assertEquals(request.user.groups.first().name,
-                          constants.GROUPS.MEMBER)
-        self.assertIsNone(self.middleware.process_view(request))
+                          constants.GROUPS.MEMBERS)
+        self.assertIsNone(self.middleware.process_request(request))
 
     def test_not_allowed_user_to_access_page(self) -> None:
         self.logged_superuser_admin.username = "allowed-user"
@@ -395,7 +553,7 @@ class TestAllowedUserMiddleware(TestCase):
             session_middleware.process_request(request)
             request.session.save()
             request.user = user
-            response: HttpResponse = self.middleware.process_view(request)
+            response: HttpResponse = self.middleware.process_request(request)
             response.client = Client()
             return request, response
 
@@ -404,15 +562,14 @@ class TestAllowedUserMiddleware(TestCase):
         request, response = process_session_request_and_response(
             request, self.logged_superuser_admin)
         self.assertEquals(response.status_code, 302)
-        self.assertRedirects(response, reverse(
-            constants.PAGES.UNAUTHORIZED_PAGE))
+        self.assertRedirects(response, reverse(constants.PAGES.INDEX_PAGE))
 
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.DETAIL_MEMBER_PAGE, args=[self.person.pk]))
         request, response = process_session_request_and_response(
             request, self.logged_non_superuser)
         self.assertEquals(request.user.groups.first().name,
-                          constants.GROUPS.MEMBER)
+                          constants.GROUPS.MEMBERS)
         self.assertEquals(response.status_code, 302)
         self.assertRedirects(response, reverse(
             constants.PAGES.UNAUTHORIZED_PAGE))
@@ -436,7 +593,7 @@ class TestAllowedUserMiddleware(TestCase):
     def test_non_superuser_trying_to_access_admin(self) -> None:
         request: HttpRequest = self.client.get(reverse("admin:index"))
         request.user = self.logged_non_superuser
-        self.assertRaises(Http404, self.middleware.process_view, request)
+        self.assertRaises(Http404, self.middleware.process_request, request)
 
     def test_user_is_in_unauthenticated_page_error(self) -> None:
         """
@@ -446,19 +603,21 @@ class TestAllowedUserMiddleware(TestCase):
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.UNAUTHORIZED_PAGE))
         request.user = self.logged_non_superuser
-        self.assertIsNone(self.middleware.process_view(request))
+        self.assertIsNone(self.middleware.process_request(request))
 
     def test_user_has_no_groups(self) -> None:
         request: HttpRequest = self.client.get(
             reverse(constants.PAGES.INDEX_PAGE))
         request.user = self.logged_non_superuser
         request.user.groups.clear()
+        # A staff user without a company user
+        request.user.is_staff = True
         setattr(request, 'session', 'session')
         setattr(request, '_messages', FallbackStorage(request))
         session_middleware = SessionMiddleware(lambda request: None)
         session_middleware.process_request(request)
         request.session.save()
-        response: HttpResponse = self.middleware.process_view(request)
+        response: HttpResponse = self.middleware.process_request(request)
         response.client = Client()
         self.assertEquals(response.status_code, 302)
         self.assertRedirects(response, reverse(constants.PAGES.LOGOUT),
@@ -606,7 +765,10 @@ class TestUtils(TestCase):
     def setUp(self) -> None:
         self.test_engine_name: str = "Test Engine"
         self.request = HttpRequest()
-        self.request.user: User = User.objects.first()
+        self.request.user: User = User.objects.create_superuser(
+            username="admin", password="TestPass")
+        self.request.user.groups.add(
+            Group.objects.get(name=constants.GROUPS.MEMBERS))
         self.test_ip: str = "123.123.123.123"
         self.user_agent: str = "Python"
         self.request.META["REMOTE_ADDR"] = self.test_ip
@@ -624,6 +786,849 @@ class TestUtils(TestCase):
         self.assertEquals(getUserAgent(self.request), self.user_agent)
 
 
+class TestKeysetPagination(TestCase):
+
+    def setUp(self) -> None:
+        created = timezone.now()
+        for i in range(7):
+            # Same created times to page through the ties by id
+            AuditEntry.objects.create(ip="123.123.123.123", user_agent="Python",
+                                      action=constants.ACTION.LOGGED_IN,
+                                      username=str(i))
+        AuditEntry.objects.update(created=created)
+        self.ids: list[int] = list(AuditEntry.objects.order_by(
+            '-created', '-id').values_list('id', flat=True))
+
+    def getPage(self, cursor: str | None = None):
+        return Pagination(AuditEntry.objects.all(), paginate_by=3, keyset=True,
+                          cursor=cursor, approximate_count=True).getPageObject()
+
+    def test_pages_forward_and_backward(self) -> None:
+        first = self.getPage()
+        self.assertEquals([e.id for e in first], self.ids[:3])
+        self.assertFalse(first.has_previous())
+        self.assertEquals(first.count, 7)
+
+        second = self.getPage(first.next_cursor)
+        self.assertEquals([e.id for e in second], self.ids[3:6])
+        self.assertEquals(second.start_index(), 4)
+
+        last = self.getPage(second.next_cursor)
+        self.assertEquals([e.id for e in last], self.ids[6:])
+        self.assertFalse(last.has_next())
+
+        back = self.getPage(last.previous_cursor)
+        self.assertEquals([e.id for e in back], self.ids[3:6])
+        self.assertEquals(back.start_index(), 4)
+        self.assertTrue(back.has_next())
+
+    def test_tampered_cursor_returns_first_page(self) -> None:
+        first = self.getPage()
+        page = self.getPage(first.next_cursor[:-2] + 'xx')
+        self.assertEquals([e.id for e in page], self.ids[:3])
+
+
+class TrafficReplay:
+    """
+    Replays synthetic traffic, (second, IP, user agent) requests in time
+    order, against a detector with a fake clock.
+    """
+
+    def __init__(self, **thresholds) -> None:
+        self.now: float = 1000.0
+        self.detector = AnomalyDetector(thresholds, clock=lambda: self.now)
+
+    def replay(self, traffic: list[tuple[float, str, str]]) -> list[Anomaly]:
+        anomalies: list[Anomaly] = []
+        for second, ip, user_agent in sorted(traffic):
+            self.now = 1000.0 + second
+            anomaly: Anomaly | None = self.detector.observe(ip, user_agent)
+            if anomaly:
+                anomalies.append(anomaly)
+        return anomalies
+
+    @staticmethod
+    def spread(ips: list[str], user_agent: str, rate: float,
+               seconds: float, start: float = 0) -> list[tuple[float, str, str]]:
+        """
+        Every IP sending `rate` requests per second for `seconds`.
+        """
+        count: int = int(rate * seconds)
+        return [(start + i / rate + j / (rate * len(ips)), ip, user_agent)
+                for j, ip in enumerate(ips) for i in range(count)]
+
+
+class TestAnomalyDetector(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.browser: str = "Mozilla/5.0 Firefox/110.0"
+        # Normal visitors, 2 requests per 10 seconds for 5 minutes
+        self.visitors: list[str] = [f"10.{i // 250}.{i % 250}.1"
+                                    for i in range(100)]
+        self.normal_traffic = TrafficReplay.spread(
+            self.visitors, self.browser, 0.2, 300)
+
+    def test_count_min_sketch_never_under_counts(self) -> None:
+        sketch = CountMinSketch(width=64, depth=4)
+        counts: dict[str, int] = {f"key{i}": i % 7 + 1 for i in range(500)}
+        for key, count in counts.items():
+            sketch.add(getSketchIndexes(key, 64, 4), count)
+        for key, count in counts.items():
+            self.assertGreaterEqual(
+                sketch.estimate(getSketchIndexes(key, 64, 4)), count)
+
+    def test_normal_traffic(self) -> None:
+        self.assertEquals(TrafficReplay().replay(self.normal_traffic), [])
+
+    def test_single_ip_flood(self) -> None:
+        flood = TrafficReplay.spread(["200.1.1.7"], "python-requests/2.28",
+                                     40, 10, start=60)
+        anomalies: list[Anomaly] = TrafficReplay().replay(
+            self.normal_traffic + flood)
+        self.assertTrue(anomalies)
+        self.assertTrue(all(anomaly.key == "200.1.1.7" for anomaly in anomalies))
+        self.assertEquals(anomalies[0].dimension, DIMENSION_IP)
+        self.assertEquals(anomalies[0].resolution, 10)
+
+    def test_subnet_flood(self) -> None:
+        # 100 IPs of one subnet, each under the IP thresholds
+        ips: list[str] = [f"200.1.2.{i}" for i in range(100)]
+        anomalies: list[Anomaly] = TrafficReplay().replay(
+            self.normal_traffic + TrafficReplay.spread(ips, self.browser, 3, 20))
+        self.assertTrue(anomalies)
+        self.assertTrue(all(anomaly.dimension == DIMENSION_SUBNET
+                            and anomaly.key == "200.1.2.0/24"
+                            for anomaly in anomalies))
+
+    def test_quiet_ip_of_flooded_subnet_not_blocked(self) -> None:
+        # Another client behind the same NAT as the flood
+        replay = TrafficReplay()
+        replay.replay(TrafficReplay.spread(
+            [f"200.1.2.{i}" for i in range(100)], self.browser, 3, 20))
+        self.assertIsNone(replay.detector.observe("200.1.2.250", self.browser))
+        self.assertIsNotNone(replay.detector.observe("200.1.2.1", self.browser))
+
+    def test_user_agent_flood(self) -> None:
+        # Scattered IPs with one agent, only the heavy senders are blocked
+        heavy: list[str] = [f"{100 + i}.9.9.9" for i in range(20)]
+        light: list[str] = [f"{150 + i}.8.8.8" for i in range(50)]
+        agent: str = "flood-bot/1.0"
+        flood = TrafficReplay.spread(heavy, agent, 8, 30) \
+            + TrafficReplay.spread(light, agent, 0.5, 30)
+        anomalies: list[Anomaly] = TrafficReplay().replay(
+            self.normal_traffic + flood)
+        self.assertTrue(anomalies)
+        self.assertTrue(all(anomaly.dimension == DIMENSION_USER_AGENT
+                            and anomaly.key == agent for anomaly in anomalies))
+
+        replay = TrafficReplay()
+        replay.replay(flood)
+        self.assertIsNone(replay.detector.observe(light[0], agent))
+        self.assertIsNotNone(replay.detector.observe(heavy[0], agent))
+
+    def test_slow_flood_and_window_expiry(self) -> None:
+        replay = TrafficReplay(ip=(None, None, None, 500))
+        slow = TrafficReplay.spread(["200.1.1.9"], self.browser, 0.2, 3000)
+        anomalies: list[Anomaly] = replay.replay(slow)
+        self.assertTrue(anomalies)
+        self.assertEquals(anomalies[0].resolution, 3600)
+
+        # An hour later the counts are gone
+        replay.now += 3600
+        self.assertIsNone(replay.detector.observe("200.1.1.9", self.browser))
+
+    def test_memory_bounded(self) -> None:
+        replay = TrafficReplay()
+        replay.replay([(i / 1000, f"{i % 200}.{i // 200 % 250}.{i % 7}.1",
+                        f"agent-{i}") for i in range(20000)])
+        for windows in replay.detector.sketches.values():
+            for window in windows:
+                self.assertEquals(len(window.totals.counters),
+                                  SKETCH_WIDTH * SKETCH_DEPTH)
+                for bucket in window.buckets:
+                    self.assertLessEqual(len(bucket), SKETCH_WIDTH * SKETCH_DEPTH)
+
+
+class TestSecurityEvents(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.application = SecurityEventsApplication(None)
+
+    def getSessionCookie(self, user: User) -> str:
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def stream(self, cookie: str, last_event_id: str | None, events: list) -> list[dict]:
+        """
+        Streams until the start of the response, broadcasts the events and
+        disconnects once they are sent.
+        """
+        messages: list[dict] = []
+
+        async def run() -> None:
+            disconnected = asyncio.Event()
+
+            async def receive() -> dict:
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message: dict) -> None:
+                messages.append(message)
+                if message.get('more_body') and len(messages) == 2:
+                    getSecurityEventHub().broadcast(events)
+                elif len(messages) == 2 + len(events) or (
+                        message['type'] == 'http.response.body' and not message.get('more_body')):
+                    disconnected.set()
+
+            scope: dict = {
+                'type': 'http', 'path': SECURITY_EVENTS_PATH, 'query_string': b'',
+                'headers': [(b'cookie', cookie.encode()),
+                            (b'last-event-id', (last_event_id or '').encode())],
+            }
+            await self.application(scope, receive, send)
+
+        async_to_sync(run)()
+        return messages
+
+    def test_audit_entries_published(self) -> None:
+        AuditEntry.createInBackground(ip=self.test_ip, user_agent="Python",
+                                      action=constants.ACTION.ATTACK_ATTEMPT)
+        AuditEntry.createInBackground(ip=self.test_ip, user_agent="Python",
+                                      action=constants.ACTION.LOGGED_IN)
+        event: dict[str, str] = readSecurityEvents()[-1]
+        self.assertEquals(event['type'], constants.SECURITY_EVENT.ATTACK_ATTEMPT)
+        self.assertEquals(event['ip'], self.test_ip)
+
+    def test_replay_after_event_id(self) -> None:
+        for i in range(3):
+            publishSecurityEvent(constants.SECURITY_EVENT.UNBLOCK, self.test_ip,
+                                 detail=str(i))
+        events: list[dict[str, str]] = readSecurityEvents()[-3:]
+        replayed = readSecurityEvents(events[0]['id'])
+        self.assertEquals([event['detail'] for event in replayed], ['1', '2'])
+
+    def test_stream_url_rendered_under_asgi_only(self) -> None:
+        user: User = User.objects.create_superuser('watcher', 'w@test.com', 'pw',
+                                                   last_login=timezone.now())
+        url: str = reverse(constants.PAGES.MONITOR_PAGE)
+        name, session_key = self.getSessionCookie(user).split('=')
+        client: Client = Client(REMOTE_ADDR=self.test_ip)
+        client.cookies[name] = session_key
+        self.assertNotContains(client.get(url), SECURITY_EVENTS_PATH)
+        async_client: AsyncClient = AsyncClient()
+        async_client.cookies[name] = session_key
+
+        async def get() -> HttpResponse:
+            return await async_client.get(url)
+
+        self.assertContains(async_to_sync(get)(), SECURITY_EVENTS_PATH)
+
+    def test_stream_denied_without_session(self) -> None:
+        messages: list[dict] = self.stream('', None, [])
+        self.assertEquals(messages[0]['status'], 403)
+
+    def test_stream_replays_then_sends_new_events(self) -> None:
+        user: User = User.objects.create_superuser('watcher', 'w@test.com', 'pw')
+        publishSecurityEvent(constants.SECURITY_EVENT.BLOCK, self.test_ip)
+        publishSecurityEvent(constants.SECURITY_EVENT.UNBLOCK, self.test_ip)
+        first, last = readSecurityEvents()[-2:]
+        new_event: dict[str, str] = dict(last, id='9999999999999-0')
+
+        messages: list[dict] = self.stream(
+            self.getSessionCookie(user), first['id'], [new_event])
+        self.assertEquals(messages[0]['status'], 200)
+        self.assertIn(f"id: {last['id']}".encode(), messages[1]['body'])
+        self.assertNotIn(f"id: {first['id']}".encode(), messages[1]['body'])
+        self.assertIn(b'id: 9999999999999-0', messages[2]['body'])
+
+
+class TestRateLimiter(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.window_key: str = "RATE:TEST:%s" % self.test_ip
+        self.lookup_key: str = "FAIL_LOGIN:%s" % self.test_ip
+
+    def test_window_counts_requests(self) -> None:
+        for limiter in (getRateLimiter(), CacheRateLimiter()):
+            cache.delete(self.window_key)
+            window = SlidingWindow(self.window_key, 1000, 10)
+            for i in range(1, 4):
+                counters: dict = limiter.evaluate([window], [])
+                self.assertEquals(counters[self.window_key], i)
+
+    def test_window_count_saturates_at_cap(self) -> None:
+        window = SlidingWindow(self.window_key, 1000, 3)
+        for i in range(5):
+            counters: dict = getRateLimiter().evaluate([window], [])
+        self.assertEquals(counters[self.window_key], 3)
+
+    def test_lookups(self) -> None:
+        cache.set(self.lookup_key, 2)
+        cache.set("BLACKLISTED:%s" % self.test_ip, None, None)
+        counters: dict = getRateLimiter().evaluate(
+            [], [self.lookup_key, "BLACKLISTED:%s" % self.test_ip,
+                 "WHITELISTED:%s" % self.test_ip])
+        self.assertEquals(counters[self.lookup_key], 2)
+        self.assertIn("BLACKLISTED:%s" % self.test_ip, counters)
+        self.assertNotIn("WHITELISTED:%s" % self.test_ip, counters)
+
+    def tearDown(self) -> None:
+        cache.delete_many([self.window_key, self.lookup_key,
+                           "BLACKLISTED:%s" % self.test_ip])
+        return super().tearDown()
+
+
+class TestLoginThrottle(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.username: str = "throttled"
+        self.allowed_attempts: int = getParameterValue(
+            constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS)
+
+    def test_failures_counted_by_ip_and_username(self) -> None:
+        for throttle in (getLoginThrottle(), CacheLoginThrottle()):
+            self.clearKeys()
+            throttle.recordFailure(self.test_ip, self.username)
+            throttle.recordFailure("10.0.0.1", self.username)
+            failure = throttle.recordFailure(self.test_ip, None)
+            self.assertEquals(failure.ip_failures, 2)
+            self.assertIsNone(failure.username_failures)
+            failure = throttle.recordFailure("10.0.0.2", self.username.upper())
+            self.assertEquals(failure.ip_failures, 1)
+            self.assertEquals(failure.username_failures, 3)
+            self.assertEquals(cache.get("FAIL_LOGIN:%s" % self.test_ip), 2)
+
+    def test_concurrent_failures_are_not_lost(self) -> None:
+        throttle = getLoginThrottle()
+
+        def fail() -> None:
+            for _ in range(10):
+                throttle.recordFailure(self.test_ip, self.username)
+
+        threads: list[Thread] = [Thread(target=fail) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failure = throttle.recordFailure(self.test_ip, self.username)
+        self.assertEquals(failure.ip_failures, 41)
+        self.assertEquals(failure.username_failures, 41)
+
+    def test_lockout_backoff(self) -> None:
+        self.assertEquals(getLockoutSeconds(self.allowed_attempts - 1,
+                                            self.allowed_attempts), 0)
+        self.assertEquals(getLockoutSeconds(self.allowed_attempts,
+                                            self.allowed_attempts),
+                          LOCKOUT_BASE_SECONDS)
+        self.assertEquals(getLockoutSeconds(self.allowed_attempts + 2,
+                                            self.allowed_attempts),
+                          LOCKOUT_BASE_SECONDS * 4)
+        self.assertEquals(getLockoutSeconds(1000, self.allowed_attempts),
+                          LOCKOUT_MAX_SECONDS)
+
+    def test_username_locked_from_any_ip(self) -> None:
+        for throttle in (getLoginThrottle(), CacheLoginThrottle()):
+            self.clearKeys()
+            for i in range(self.allowed_attempts - 1):
+                failure = throttle.recordFailure(f"10.0.0.{i}", self.username)
+                self.assertFalse(failure.username_lock_seconds)
+            self.assertFalse(throttle.isLocked("10.0.1.1", self.username))
+
+            failure = throttle.recordFailure("10.0.0.99", self.username)
+            self.assertEquals(failure.username_lock_seconds,
+                              LOCKOUT_BASE_SECONDS)
+            self.assertEquals(throttle.recordFailure(
+                "10.0.0.98", self.username).username_lock_seconds,
+                LOCKOUT_BASE_SECONDS * 2)
+            self.assertTrue(throttle.isLocked("10.0.1.1", self.username))
+            self.assertFalse(throttle.isLocked("10.0.1.1", "other"))
+
+            throttle.reset(self.username)
+            self.assertFalse(throttle.isLocked("10.0.1.1", self.username))
+
+    def test_username_lock_capped_lower_than_ip_lock(self) -> None:
+        for throttle in (getLoginThrottle(), CacheLoginThrottle()):
+            self.clearKeys()
+            for _ in range(self.allowed_attempts + 20):
+                failure = throttle.recordFailure(self.test_ip, self.username)
+            self.assertEquals(failure.ip_lock_seconds, LOCKOUT_MAX_SECONDS)
+            self.assertEquals(failure.username_lock_seconds,
+                              USERNAME_LOCKOUT_MAX_SECONDS)
+
+    def test_lockouts_recorded(self) -> None:
+        for _ in range(self.allowed_attempts):
+            failure = getLoginThrottle().recordFailure(self.test_ip,
+                                                       self.username)
+        recordLockouts(self.test_ip, self.username, failure)
+        lockouts: QuerySet[LoginLockout] = LoginLockout.objects.filter(
+            ip=self.test_ip)
+        self.assertEquals(lockouts.count(), 2)
+        self.assertTrue(all(lockout.is_active for lockout in lockouts))
+        self.assertEquals(lockouts.get(username=self.username).failures,
+                          self.allowed_attempts)
+
+    def clearKeys(self) -> None:
+        cache.delete_pattern("*FAIL_LOGIN*")
+        cache.delete_pattern("*LOGIN_LOCK*")
+
+    def tearDown(self) -> None:
+        self.clearKeys()
+        return super().tearDown()
+
+class TestBlocklist(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.blocklist = getBlocklist()
+
+    def test_block_changes_invalidate_snapshot(self) -> None:
+        self.assertFalse(self.blocklist.isBlocked(self.test_ip))
+        blocked_client: BlockedClient = BlockedClient.objects.create(
+            ip=self.test_ip,
+            user_agent="Python",
+            block_type=constants.BLOCK_TYPES.TEMPORARY
+        )
+        self.assertTrue(self.blocklist.isBlocked(self.test_ip))
+        blocked_client.setBlockType(constants.BLOCK_TYPES.UNBLOCKED)
+        self.assertFalse(self.blocklist.isBlocked(self.test_ip))
+
+    def test_marked_block_kept_until_its_row_is_read(self) -> None:
+        blocklist: Blocklist = Blocklist()
+        blocklist.markBlocked(self.test_ip)
+        # Another process changed the blocklist before the row was written
+        blocklist.invalidate()
+        self.assertTrue(blocklist.isBlocked(self.test_ip))
+
+        BlockedClient.objects.create(ip=self.test_ip, user_agent="Python",
+                                     block_type=constants.BLOCK_TYPES.TEMPORARY)
+        blocklist.invalidate()
+        self.assertTrue(blocklist.isBlocked(self.test_ip))
+        self.assertEquals(blocklist.marked, {})
+
+        blocklist.markUnblocked(self.test_ip)
+        BlockedClient.objects.filter(ip=self.test_ip).update(
+            block_type=constants.BLOCK_TYPES.UNBLOCKED)
+        blocklist.invalidate()
+        self.assertFalse(blocklist.isBlocked(self.test_ip))
+
+    def test_temporary_block_ended(self) -> None:
+        BlockedClient.objects.create(
+            ip=self.test_ip,
+            user_agent="Python",
+            block_type=constants.BLOCK_TYPES.TEMPORARY
+        )
+        self.assertFalse(self.blocklist.isTemporaryBlockEnded(self.test_ip))
+        BlockedClient.objects.filter(ip=self.test_ip).update(
+            updated=timezone.now() - timedelta(days=100))
+        self.blocklist.invalidate()
+        self.assertTrue(self.blocklist.isTemporaryBlockEnded(self.test_ip))
+
+    def test_network_index(self) -> None:
+        networks = NetworkIndex(["10.0.0.0/24", "10.0.1.0/24", "10.0.0.128/25",
+                                 "2001:db8::/32", "invalid"])
+        # The adjacent and the nested ranges are merged
+        self.assertEquals(len(networks), 2)
+        self.assertIn("10.0.0.0", networks)
+        self.assertIn("10.0.1.255", networks)
+        self.assertIn("2001:db8::1", networks)
+        self.assertNotIn("10.0.2.0", networks)
+        self.assertNotIn("9.255.255.255", networks)
+        self.assertNotIn("2001:db9::1", networks)
+        self.assertNotIn("unknown", networks)
+
+    def test_import_export_and_remove(self) -> None:
+        BlockedClient.objects.create(ip=self.test_ip, user_agent="Python",
+                                     block_type=constants.BLOCK_TYPES.TEMPORARY)
+        change = importBlocklist(
+            f"{self.test_ip}\n198.51.100.0/24  # botnet\n203.0.113.7/32\nfoo\n",
+            note="imported")
+        self.assertEquals((change.ips, change.networks, change.invalid),
+                          (2, 1, ["foo"]))
+        self.assertTrue(self.blocklist.isBlocked("198.51.100.42"))
+        self.assertTrue(self.blocklist.isBlocked("203.0.113.7"))
+        self.assertEquals(BlockedClient.get(ip=self.test_ip).block_type,
+                          constants.BLOCK_TYPES.INDEFINITELY)
+
+        exported: str = exportBlocklist()
+        self.assertIn("198.51.100.0/24  # imported", exported)
+        self.assertIn(self.test_ip, exported)
+
+        change = removeFromBlocklist(exported)
+        self.assertEquals((change.ips, change.networks), (2, 1))
+        self.assertFalse(self.blocklist.isBlocked("198.51.100.42"))
+        self.assertFalse(self.blocklist.isBlocked(self.test_ip))
+        self.assertEquals(exportBlocklist(), "")
+
+    def test_lift_expired_blocks(self) -> None:
+        for ip in ("1.1.1.1", "2.2.2.2"):
+            BlockedClient.objects.create(ip=ip, user_agent="Python",
+                                         block_type=constants.BLOCK_TYPES.TEMPORARY)
+        BlockedClient.objects.create(ip="3.3.3.3", user_agent="Python",
+                                     block_type=constants.BLOCK_TYPES.INDEFINITELY)
+        BlockedClient.objects.filter(ip__in=["1.1.1.1", "3.3.3.3"]).update(
+            updated=timezone.now() - timedelta(days=100))
+        self.blocklist.invalidate()
+
+        self.assertEquals(liftExpiredBlocks(), 1)
+        self.assertFalse(self.blocklist.isBlocked("1.1.1.1"))
+        self.assertTrue(self.blocklist.isBlocked("2.2.2.2"))
+        self.assertTrue(self.blocklist.isBlocked("3.3.3.3"))
+        self.assertEquals(liftExpiredBlocks(), 0)
+
+    def tearDown(self) -> None:
+        for row in BlockedClient.objects.all():
+            row.delete()
+        for row in BlockedNetwork.objects.all():
+            row.delete()
+        return super().tearDown()
+
+
+class TestBackgroundTasks(TestCase):
+
+    def test_audit_entry_created_in_background(self) -> None:
+        AuditEntry.createInBackground(ip="123.123.123.123",
+                                      user_agent="Python" * 100,
+                                      action=constants.ACTION.LOGGED_IN,
+                                      username="test")
+        audit_entry: AuditEntry = AuditEntry.objects.get(username="test")
+        self.assertEquals(len(audit_entry.user_agent), 256)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=False)
+    def test_full_work_queue_runs_task_in_caller_thread(self) -> None:
+        work_queue = WorkQueue('test', workers=0, max_size=1)
+        done: list[str] = []
+        work_queue.submit(done.append, 'queued')
+        work_queue.submit(done.append, 'caller')
+        self.assertEquals(done, ['caller'])
+        self.assertEquals(work_queue.tasks.qsize(), 1)
+
+
+class TestVisitors(TestCase):
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+
+    def test_first_visit_recorded_as_visitor(self) -> None:
+        self.assertTrue(isNewVisitor(self.test_ip))
+        for _ in range(2):
+            AuditEntry.createInBackground(ip=self.test_ip, user_agent="Python",
+                                          action=constants.ACTION.FIRST_VISIT)
+        AuditEntry.createInBackground(ip="10.0.0.1", user_agent="Python",
+                                      action=constants.ACTION.LOGGED_IN)
+        self.assertFalse(isNewVisitor(self.test_ip))
+        self.assertTrue(isNewVisitor("10.0.0.1"))
+        self.assertEquals(Visitor.objects.count(), 1)
+
+    def test_rebuild_visitors_keeps_first_entry_time(self) -> None:
+        first: timezone.datetime = timezone.now() - timedelta(days=3)
+        for days in (3, 1):
+            entry: AuditEntry = AuditEntry.objects.create(
+                ip=self.test_ip, user_agent="Python",
+                action=constants.ACTION.FIRST_VISIT)
+            AuditEntry.objects.filter(id=entry.id).update(
+                created=timezone.now() - timedelta(days=days))
+        Visitor.objects.create(ip="10.0.0.1")
+
+        self.assertEquals(rebuildVisitors(chunk_size=1), 1)
+        visitor: Visitor = Visitor.objects.get(ip=self.test_ip)
+        self.assertAlmostEqual(visitor.created, first,
+                               delta=timedelta(seconds=5))
+        self.assertEquals(rebuildVisitors(), 0)
+
+    def test_unique_visitors_counted_once_a_day(self) -> None:
+        today = timezone.now().date()
+        for ip in (self.test_ip, self.test_ip, "10.0.0.1"):
+            markVisited(ip)
+        self.assertTrue(cache.has_key("VST:%s" % self.test_ip))
+        self.assertEquals(countUniqueVisitors(today, today), 2)
+        self.assertEquals(countUniqueVisitors(
+            today - timedelta(days=29), today), 2)
+        self.assertEquals(countUniqueVisitors(
+            today - timedelta(days=2), today - timedelta(days=1)), 0)
+
+    def tearDown(self) -> None:
+        cache.delete_pattern("*UNIQUE_VISITORS:*")
+        cache.delete_many(["VST:%s" % self.test_ip, "VST:10.0.0.1"])
+        return super().tearDown()
+
+class TestImagePool(SimpleTestCase):
+
+    def getImage(self, width: int, height: int) -> io.BytesIO:
+        image_io: io.BytesIO = io.BytesIO()
+        Img.new('RGB', (width, height), (200, 200, 200)).save(
+            image_io, format="JPEG")
+        image_io.seek(0)
+        return image_io
+
+    def test_size_checked_from_headers_only(self) -> None:
+        # The pixels are cut off, only the headers are left
+        truncated: io.BytesIO = io.BytesIO(
+            self.getImage(2000, 1000).getvalue()[:1000])
+        self.assertEquals(
+            ImageProcessor.checkPhotographSize(truncated).size, (2000, 1000))
+
+    def test_undersized_photograph_rejected_before_the_pool(self) -> None:
+        with override_settings(BACKGROUND_TASKS_INLINE=False, IMAGE_WORKERS=0):
+            self.assertIsNone(getImagePool())
+            with self.assertRaises(ImageProcessingError):
+                validatePhotograph(self.getImage(300, 500))
+
+    @override_settings(BACKGROUND_TASKS_INLINE=False, IMAGE_WORKERS=1)
+    def test_photograph_validated_in_worker(self) -> None:
+        self.addCleanup(shutdownImagePool)
+        self.assertIsNotNone(getImagePool())
+        # The error raised in the worker reaches the request
+        with self.assertRaisesMessage(ImageProcessingError, "صورة غير صالحة"):
+            validatePhotograph(self.getImage(600, 600), timeout=60)
+
+    def test_working_size_keeps_the_expected_size(self) -> None:
+        self.assertEquals(getPhotographWorkingSize(4000, 3000), (540, 405))
+        self.assertEquals(getPhotographWorkingSize(3024, 4032), (403, 537))
+        for width, height in ((400, 400), (401, 2000), (4321, 987)):
+            self.assertGreaterEqual(min(getPhotographWorkingSize(width, height)), 400)
+
+class TestCardRenderer(SimpleTestCase):
+
+    def test_renderer_loaded_once_per_thread(self) -> None:
+        renderer = getCardRenderer()
+        self.assertIs(getCardRenderer(), renderer)
+        self.assertEquals(renderer.template.mode, 'RGB')
+
+        renderers: list = []
+        thread: Thread = Thread(target=lambda: renderers.append(getCardRenderer()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(renderers[0], renderer)
+        self.assertEquals(renderers[0].template.size, renderer.template.size)
+
+
+class TestBackgroundRemoval(TestCase):
+
+    def setUp(self) -> None:
+        media_root: TemporaryDirectory = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            BACKGROUND_REMOVAL_BACKEND='main.background_removal.StubBackend')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.backend = getBackgroundRemover()
+        self.calls: int = self.backend.calls
+
+    def test_background_removed_once_per_photograph(self) -> None:
+        photograph = Img.new('RGBA', (50, 50), (10, 20, 30, 255))
+        self.assertEquals(removeBackground(photograph).tobytes(), photograph.tobytes())
+        self.assertEquals(removeBackground(photograph.copy()).tobytes(),
+                          photograph.tobytes())
+        self.assertEquals(self.backend.calls - self.calls, 1)
+        self.assertEquals(BackgroundRemoval.objects.count(), 1)
+
+        removeBackground(Img.new('RGBA', (50, 50), (30, 20, 10, 255)))
+        self.assertEquals(self.backend.calls - self.calls, 2)
+
+    def test_missing_file_removed_again(self) -> None:
+        photograph = Img.new('RGBA', (50, 50), (10, 20, 30, 255))
+        removeBackground(photograph)
+        removal: BackgroundRemoval = BackgroundRemoval.objects.get()
+        os.remove(removal.image.path)
+        removeBackground(photograph)
+        self.assertEquals(self.backend.calls - self.calls, 2)
+        self.assertEquals(BackgroundRemoval.objects.count(), 1)
+
+    @override_settings(BACKGROUND_REMOVAL_BACKEND='main.background_removal.RemoveBgBackend')
+    def test_remove_bg_without_api_key_not_used(self) -> None:
+        self.assertIsInstance(getBackgroundRemover(), KeepBackground)
+
+
+class TestGeolocation(TestCase):
+
+    class CountingProvider:
+        def __init__(self) -> None:
+            self.calls: int = 0
+            self.failed_calls: int = 0
+
+        def lookup(self, ip: str) -> str:
+            self.calls += 1
+            return 'Indonesia'
+
+    def setUp(self) -> None:
+        self.test_ip: str = "123.123.123.123"
+        self.provider = self.CountingProvider()
+        self.service = GeolocationService(self.provider)
+
+    def test_rows_updated_with_one_outbound_call(self) -> None:
+        for i in range(3):
+            AuditEntry.objects.create(ip=self.test_ip, user_agent="Python",
+                                      action=constants.ACTION.NORMAL_POST)
+        self.service.process([self.test_ip, self.test_ip])
+        self.service.process([self.test_ip])
+        self.assertEquals(self.provider.calls, 1)
+        self.assertEquals(AuditEntry.countFiltered(country='Indonesia'), 3)
+        self.assertTrue(IpLocation.isExists(ip=self.test_ip))
+        self.assertEquals(self.service.getCountry(self.test_ip), 'Indonesia')
+        self.assertEquals(self.service.getMetrics()['cache_hit_rate'], 1)
+
+    def test_offline_provider(self) -> None:
+        with NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write("ip_start,ip_end,country\n"
+                       + "123.123.0.0,123.123.255.255,Indonesia\n")
+        provider = OfflineProvider(file.name)
+        os.remove(file.name)
+        self.assertEquals(provider.lookup(self.test_ip), 'Indonesia')
+        self.assertEquals(provider.lookup("8.8.8.8"), 'unknown')
+
+
+class TestHtmlScanner(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.scanner = TagScanner()
+
+    def test_html_detected(self) -> None:
+        self.assertTrue(self.scanner.containsHtml("<b>bold</b>"))
+        self.assertTrue(self.scanner.containsHtml("text <a href='#'>\nlink</a>"))
+
+    def test_no_false_positive(self) -> None:
+        self.assertFalse(self.scanner.containsHtml("1 < 2 and 3 > 2"))
+        self.assertFalse(self.scanner.containsHtml("<b>not closed"))
+        self.assertFalse(self.scanner.containsHtml("<\nb>text</b>"))
+        self.assertFalse(self.scanner.containsHtml("<" * 100_000))
+
+    def test_same_result_as_regex(self) -> None:
+        regex_scanner = RegexScanner()
+        values: list[str] = ["<a>\n</a>", "</a><a>", "<a\n></a>", "<a></\na>",
+                             "<<a>></>", "<>\n</>", "a</a>"]
+        for value in values:
+            self.assertEquals(self.scanner.containsHtml(value),
+                              regex_scanner.containsHtml(value), value)
+
+    def test_long_values_scanned_whole(self) -> None:
+        value: str = "x" * 1_000_000 + "<b>bold</b>"
+        self.assertTrue(isThereHtml(["text", value]))
+        self.assertFalse(isThereHtml(["text", value[:-4]]))
+
+    def test_values_over_max_length_rejected(self) -> None:
+        value: str = "x" * 101
+        self.assertFalse(isThereHtml(["text", value]))
+        self.assertTrue(isThereHtml(["text", value], max_field_length=100))
+        self.assertFalse(isThereHtml(["text", value[:100]], max_field_length=100))
+
+
+class TestRoutePolicy(SimpleTestCase):
+
+    def test_policies_built_from_permissions(self) -> None:
+        index = getRoutePolicyIndex()
+        members_page = index.get(constants.PAGES.MEMBERS_PAGE)
+        self.assertTrue(members_page.restricted)
+        self.assertFalse(members_page.non_staff_only)
+        membership_card_page = index.get(constants.PAGES.MEMBERSHIP_CARD_PAGE)
+        self.assertTrue(membership_card_page.non_staff_only)
+        self.assertTrue(membership_card_page.membership_only)
+        self.assertTrue(index.get(constants.PAGES.STAFF_DASHBOARD).staff_common)
+        self.assertEquals(index.get(constants.PAGES.LOGIN_PAGE).rate_limit,
+                          RATE_LIMIT_LOGIN)
+        self.assertFalse(index.get(constants.PAGES.INDEX_PAGE).restricted)
+        self.assertEquals(index.get('not-a-page').rate_limit,
+                          RATE_LIMIT_DEFAULT)
+
+    def test_request_resolved_once(self) -> None:
+        request: HttpRequest = RequestFactory().get(
+            reverse(constants.PAGES.MEMBERS_PAGE, args=["List"]))
+        policy = getRoutePolicy(request)
+        self.assertEquals(policy.url_name, constants.PAGES.MEMBERS_PAGE)
+        self.assertEquals(request.resolver_match.url_name,
+                          constants.PAGES.MEMBERS_PAGE)
+        self.assertIs(getRoutePolicy(request), policy)
+
+    def test_unknown_path_has_default_policy(self) -> None:
+        request: HttpRequest = RequestFactory().get('/not-a-page/')
+        self.assertIsNone(getRoutePolicy(request).url_name)
+
+
+class TestProfiling(TestCase):
+
+    def setUp(self) -> None:
+        # The hourly buckets outlive the test, a page of its own per run
+        self.url_name: str = f'TestProfilingPage-{uuid4().hex}'
+        self.profile = RequestProfile(url_name=self.url_name,
+                                      total_time=0.010, sql_count=2,
+                                      template_time=0.002)
+        self.profile.downstream_times = {'FirstMiddleware': 0.008,
+                                         'SecondMiddleware': 0.005}
+
+    def test_stage_times(self) -> None:
+        stage_times = self.profile.getStageTimes(
+            ['FirstMiddleware', 'SecondMiddleware'])
+        self.assertAlmostEqual(stage_times['FirstMiddleware'], 0.002)
+        self.assertAlmostEqual(stage_times['SecondMiddleware'], 0.003)
+        self.assertAlmostEqual(stage_times['View'], 0.003)
+
+    def test_stage_times_of_middleware_response(self) -> None:
+        self.profile.downstream_times = {'FirstMiddleware': 0.008}
+        stage_times = self.profile.getStageTimes(
+            ['FirstMiddleware', 'SecondMiddleware'])
+        self.assertAlmostEqual(stage_times['SecondMiddleware'], 0.008)
+        self.assertNotIn('View', stage_times)
+
+    def test_profiles_summarized(self) -> None:
+        stages: list[str] = ['FirstMiddleware', 'SecondMiddleware']
+        recordProfile(self.profile, stages)
+        recordProfile(self.profile, stages)
+        summary = [row for row in getProfileSummary(hours=1)
+                   if row['url_name'] == self.url_name][0]
+        self.assertEquals(summary['requests'], 2)
+        self.assertAlmostEqual(summary['total_ms'], 10)
+        self.assertEquals(summary['sql_count'], 2)
+        self.assertEquals(summary['p95_ms'], 10)
+
+
+class TestAuthContext(TestCase):
+
+    def setUp(self) -> None:
+        self.user: User = User.objects.create_user(
+            username='auth_context', password='test', is_staff=True)
+        self.role: Role = Role.objects.create(name='auth_context',
+                                              description='test')
+        self.role.groups.add(Group.objects.get(name=constants.GROUPS.MONITOR))
+        CompanyUser.objects.create(user=self.user, role=self.role)
+
+    def getRequest(self) -> HttpRequest:
+        request: HttpRequest = RequestFactory().get('/Monitor/')
+        request.user = self.user
+        return request
+
+    def test_anonymous_has_no_auth_context(self) -> None:
+        request: HttpRequest = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertIsNone(getAuthContext(request))
+
+    def test_auth_context_built_once(self) -> None:
+        auth_context = getAuthContext(self.getRequest())
+        self.assertTrue(auth_context.has_company_user)
+        self.assertIn(constants.PAGES.MONITOR_PAGE, auth_context.permissions)
+        self.assertEquals([item.page for item in auth_context.menu],
+                          [constants.PAGES.MONITOR_PAGE])
+        with self.assertNumQueries(0):
+            self.assertEquals(getAuthContext(self.getRequest()), auth_context)
+
+    def test_role_change_invalidates_auth_context(self) -> None:
+        getAuthContext(self.getRequest())
+        self.role.groups.add(Group.objects.get(name=constants.GROUPS.MEMBERS))
+        auth_context = getAuthContext(self.getRequest())
+        self.assertIn(constants.PAGES.MEMBERS_PAGE, auth_context.permissions)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_role_change_invalidates_auth_context_on_any_cache(self) -> None:
+        self.test_role_change_invalidates_auth_context()
+
+
 class TestViews(TestCase):
 
     def setUp(self):
@@ -633,7 +1638,7 @@ class TestViews(TestCase):
             username='testuser',
             password='testpassword'
         )
-        group = Group.objects.get(name=constants.GROUPS.MANAGER)
+        group = Group.objects.get(name=constants.GROUPS.MEMBERS)
         self.user.groups.add(group)
 
     def test_login_success(self):
@@ -646,7 +1651,7 @@ class TestViews(TestCase):
         response.client = Client()
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, reverse(
-            constants.PAGES.STAFF_DASHBOARD), target_status_code=302)
+            constants.PAGES.MEMBER_DASHBOARD), target_status_code=302)
 
     def test_login_failure(self):
         request = self.factory.post(reverse(constants.PAGES.LOGIN_PAGE), {
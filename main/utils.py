@@ -1,8 +1,14 @@
+from collections.abc import Sequence
 import csv
+from datetime import date
+from decimal import Decimal
 import logging
+import os
+from pathlib import Path
 import six
+from tempfile import NamedTemporaryFile
 from threading import Thread
-from typing import Any, Callable, Iterable, Optional, Protocol, Union
+from typing import Any, Callable, Final, Iterable, Optional, Protocol, Union
 from uuid import uuid4
 
 from openpyxl import Workbook
@@ -11,9 +17,12 @@ from openpyxl.worksheet.worksheet import Worksheet
 
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import signing
 from django.core.exceptions import EmptyResultSet
+from django.core.files.storage import Storage
 from django.core.mail import EmailMessage
 from django.core.paginator import Paginator
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.http import HttpRequest, HttpResponse
 from django.utils.timezone import datetime
@@ -25,19 +34,152 @@ logger = logging.getLogger(constants.LOGGERS.MAIN)
 logger_models = logging.getLogger(constants.LOGGERS.MODELS)
 
 
+# The most rows counted by the approximate count of a keyset pagination
+APPROXIMATE_COUNT_LIMIT: Final[int] = 1000
+_CURSOR_SALT: Final[str] = 'main.utils.Pagination'
+
+
+class KeysetPage(Sequence):
+    """
+    A page of a keyset pagination, usable by the templates like a page of
+    the Django paginator.
+    """
+    is_keyset: bool = True
+
+    def __init__(self, object_list: list, start_index: int,
+                 next_cursor: str | None, previous_cursor: str | None,
+                 count: int | None = None, is_count_exact: bool = True) -> None:
+        self.object_list: list = object_list
+        self._start_index: int = start_index
+        self.next_cursor: str | None = next_cursor
+        self.previous_cursor: str | None = previous_cursor
+        self.count: int | None = count
+        self.is_count_exact: bool = is_count_exact
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index: int) -> Any:
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+    def start_index(self) -> int:
+        return self._start_index
+
+
 class Pagination:
+    """
+    Paginates by page number with the Django paginator, or by keyset if
+    `keyset` is set. A keyset page is found from the opaque cursor of the
+    edge row of its neighbour page instead of an offset, so a deep page is
+    as fast as the first one and nothing is counted unless an approximate
+    count is asked for. The keyset ordering must end with a unique field.
+    """
 
-    def __init__(self, queryset: QuerySet, page_num: int, paginate_by: int = constants.ROWS_PER_PAGE):
+    def __init__(self, queryset: QuerySet, page_num: int = 1,
+                 paginate_by: int = constants.ROWS_PER_PAGE, *,
+                 keyset: bool = False, cursor: str | None = None,
+                 ordering: tuple[str, ...] = ('-created', '-id'),
+                 approximate_count: bool = False):
         self.page_num: int = page_num
-        self.paginator: Paginator = Paginator(queryset, paginate_by)
+        self.keyset: bool = keyset
+        if keyset:
+            self.queryset: QuerySet = queryset
+            self.paginate_by: int = paginate_by
+            self.cursor: str | None = cursor
+            self.ordering: tuple[str, ...] = ordering
+            self.approximate_count: bool = approximate_count
+            self._page: KeysetPage | None = None
+        else:
+            self.paginator: Paginator = Paginator(queryset, paginate_by)
 
-    def getPageObject(self) -> QuerySet:
+    def getPageObject(self) -> QuerySet | KeysetPage:
+        if self.keyset:
+            if self._page is None:
+                self._page = self._getKeysetPage()
+            return self._page
         return self.paginator.get_page(self.page_num)
 
     @property
     def isPaginated(self) -> bool:
+        if self.keyset:
+            return self.getPageObject().has_other_pages()
         return True if self.paginator.num_pages > 1 else False
 
+    def _encodeCursor(self, row: BaseModel, backwards: bool, start_index: int) -> str:
+        key: list[Any] = []
+        for field in self.ordering:
+            value: Any = getattr(row, field.lstrip('-'))
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            key.append(value)
+        return signing.dumps({'k': key, 'b': backwards, 'i': start_index},
+                             salt=_CURSOR_SALT)
+
+    def _decodeCursor(self) -> tuple[list[Any] | None, bool, int]:
+        if not self.cursor:
+            return None, False, 1
+        try:
+            data: dict[str, Any] = signing.loads(self.cursor, salt=_CURSOR_SALT)
+            return data['k'], data['b'], data['i']
+        except (signing.BadSignature, KeyError, TypeError):
+            return None, False, 1
+
+    def _getKeysetFilter(self, key: list[Any], backwards: bool) -> Q:
+        # (a, b) after (x, y) is a after x, or a equals x and b after y
+        condition: Q = Q()
+        equal: Q = Q()
+        for field, value in zip(self.ordering, key):
+            name: str = field.lstrip('-')
+            lookup: str = 'lt' if field.startswith('-') != backwards else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _getKeysetPage(self) -> KeysetPage:
+        key, backwards, start_index = self._decodeCursor()
+        ordering: list[str] = list(self.ordering)
+        if backwards:
+            ordering = [field[1:] if field.startswith('-') else '-' + field
+                        for field in ordering]
+        queryset: QuerySet = self.queryset.order_by(*ordering)
+        if key is not None:
+            queryset = queryset.filter(self._getKeysetFilter(key, backwards))
+
+        rows: list = list(queryset[:self.paginate_by + 1])
+        has_more: bool = len(rows) > self.paginate_by
+        rows = rows[:self.paginate_by]
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = key is not None, has_more
+
+        count: int | None = None
+        if self.approximate_count:
+            count = self.queryset.order_by()[:APPROXIMATE_COUNT_LIMIT + 1].count()
+        return KeysetPage(
+            rows, start_index,
+            next_cursor=self._encodeCursor(
+                rows[-1], False, start_index + len(rows))
+            if rows and has_next else None,
+            previous_cursor=self._encodeCursor(
+                rows[0], True, max(start_index - self.paginate_by, 1))
+            if rows and has_previous else None,
+            count=min(count, APPROXIMATE_COUNT_LIMIT) if count is not None else None,
+            is_count_exact=count is None or count <= APPROXIMATE_COUNT_LIMIT,
+        )
+
 
 def getUserGroupe(requester: Union[HttpRequest, User]) -> str:
     user: User = None
@@ -166,6 +308,22 @@ def exportAsCsvExcel(
     return response
 
 
+def writeFileAtomically(storage: Storage, name: str, data: bytes) -> None:
+    """
+    Writes the file of a file system storage to a temporary file renamed to
+    its name once complete, so the file is never seen half written.
+    """
+    file_path: Path = Path(storage.path(name))
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(dir=file_path.parent, suffix='.tmp', delete=False) as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    if storage.file_permissions_mode is not None:
+        os.chmod(temp_file.name, storage.file_permissions_mode)
+    os.replace(temp_file.name, file_path)
+
+
 def generateRandomString() -> str:
     return str(uuid4()).rsplit('-', maxsplit=1).pop().upper()
 
@@ -183,14 +341,14 @@ account_activation_token = AccountActivationTokenGenerator()
 
 def logUserActivity(request: HttpRequest | None, activity_type: str, details: Optional[str] = None) -> None:
     if request is None:
-        AuditEntry.create(
+        AuditEntry.createInBackground(
             ip='0.0.0.0',
             user_agent='-',
             action=activity_type,
             username=details[:100]
         )
     else:
-        AuditEntry.create(
+        AuditEntry.createInBackground(
             ip=getClientIp(request),
             user_agent=getUserAgent(request),
             action=activity_type,
@@ -14,8 +14,9 @@ from django.shortcuts import render, redirect
 from . import constants
 from . import messages as MSG
 from .decorators import isAuthenticatedUser
+from .login_throttle import LOGIN_FAILURES_ATTRIBUTE, getLoginThrottle
 from .models import Donation
-from .utils import Pagination, getClientIp, logUserActivity
+from .utils import KeysetPage, Pagination, getClientIp, logUserActivity
 
 from parameter.service import getParameterValue
 from accounting.models import Account, Bond
@@ -33,6 +34,11 @@ def loginPage(request: HttpRequest) -> HttpResponse:
     if request.method == constants.POST_METHOD:
         UserName: str = request.POST.get('user_name')
         Password: str = request.POST.get('password')
+        # Before checking the password, a locked out attempt is not counted
+        if getLoginThrottle().isLocked(getClientIp(request), UserName):
+            MSG.LOGIN_LOCKED(request)
+            return render(request, constants.TEMPLATES.LOGIN_TEMPLATE)
+
         user: User = auth.authenticate(
             request, username=UserName, password=Password)
 
@@ -46,10 +52,9 @@ def loginPage(request: HttpRequest) -> HttpResponse:
             MSG.INCORRECT_INFO(request)
             max_allowed_attempts: int = getParameterValue(
                 constants.PARAMETERS.ALLOWED_LOGGED_IN_ATTEMPTS)
-            failed_login_attempts: int | None = cache.get(
-                "FAIL_LOGIN:%s" % getClientIp(request))
-            if not failed_login_attempts:
-                failed_login_attempts = 0
+            # Counted by the failed login signal
+            failed_login_attempts: int = getattr(
+                request, LOGIN_FAILURES_ATTRIBUTE, 0)
 
             if failed_login_attempts > abs(max_allowed_attempts / 2):
                 MSG.MANY_FAILED_LOGIN_WARNING(request)
@@ -149,9 +154,9 @@ def donationListPage(request: HttpRequest) -> HttpResponse:
                         MSG.ERROR_MESSAGE(request, str(error))
                         MSG.SCREENSHOT(request)
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1)
-    page_obj: QuerySet[Donation] = pagination.getPageObject()
+    pagination = Pagination(queryset, keyset=True,
+                            cursor=request.GET.get('cursor'))
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
     context: dict[str, Any] = {'is_paginated': is_paginated,
                                'page_obj': page_obj}
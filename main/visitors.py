@@ -0,0 +1,116 @@
+"""
+The first visit of every IP and the daily unique visitors.
+
+A visitor is new while its IP is not in the `Visitor` table, a lookup on its
+unique index. The audit entry writer inserts the IPs of the first visit
+entries it writes, and `rebuildVisitors` fills the table from the entries
+written before it existed.
+
+The first request of an IP in a day adds it to the HyperLogLog of the day,
+counting the unique visitors in a few kilobytes whatever their number, with
+an error below 1%. The counts need Redis, they are None on another cache.
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+import logging
+from logging import Logger
+from typing import Final, Iterable
+
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from . import constants
+from .models import AuditEntry, Visitor
+
+logger: Logger = logging.getLogger(constants.LOGGERS.MAIN)
+
+# The days kept of the daily unique visitors
+UNIQUE_VISITORS_DAYS: Final[int] = 31
+VISITORS_CHUNK_SIZE: Final[int] = 1000
+
+
+def getVisitedKey(ip: str) -> str:
+    # Read by the middleware with the rate limits
+    return "VST:%s" % ip
+
+
+def _getUniqueVisitorsKey(day: date) -> str:
+    return cache.make_key("UNIQUE_VISITORS:%s" % day.isoformat())
+
+
+def _getRedisConnection():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def isNewVisitor(ip: str) -> bool:
+    return not Visitor.isExists(ip=ip)
+
+
+def markVisited(ip: str) -> None:
+    """
+    Marks the IP as seen today and counts it in the unique visitors of the
+    day. The mark expires at midnight, so the next day counts it again.
+    """
+    now: datetime = timezone.now()
+    tomorrow: datetime = datetime.combine(now.date() + timedelta(days=1),
+                                          datetime.min.time(), now.tzinfo)
+    cache.set(getVisitedKey(ip), None,
+              max(int((tomorrow - now).total_seconds()), 1))
+
+    connection = _getRedisConnection()
+    if connection is None:
+        return
+    key: str = _getUniqueVisitorsKey(now.date())
+    with connection.pipeline(transaction=False) as pipeline:
+        pipeline.pfadd(key, ip)
+        pipeline.expire(key, UNIQUE_VISITORS_DAYS * constants.DEFAULT_CACHE_EXPIRE)
+        pipeline.execute()
+
+
+def countUniqueVisitors(start: date, end: date) -> int | None:
+    """
+    The estimated count of the distinct visitors from start to end, both
+    included, None when it is not counted.
+    """
+    connection = _getRedisConnection()
+    if connection is None or start > end:
+        return None
+    days: int = min((end - start).days + 1, UNIQUE_VISITORS_DAYS)
+    return connection.pfcount(*[_getUniqueVisitorsKey(end - timedelta(days=i))
+                                for i in range(days)])
+
+
+def recordVisitors(entries: Iterable[AuditEntry]) -> None:
+    """
+    Inserts the IPs of the first visit entries, the known ones are ignored.
+    """
+    visitors: dict[str, Visitor] = {}
+    for entry in entries:
+        if entry.action == constants.ACTION.FIRST_VISIT:
+            visitors.setdefault(str(entry.ip), Visitor(
+                ip=str(entry.ip), created=entry.created))
+    if visitors:
+        Visitor.objects.bulk_create(visitors.values(), ignore_conflicts=True)
+
+
+def rebuildVisitors(chunk_size: int = VISITORS_CHUNK_SIZE) -> int:
+    """
+    Inserts the IPs of the hot audit entries missing from the visitors with
+    their first entry time. Returns the number of the inserted visitors.
+    """
+    count: int = Visitor.objects.count()
+    rows = AuditEntry.objects.values('ip').annotate(
+        first_seen=Min('created')).order_by()
+    chunk: list[Visitor] = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(Visitor(ip=row['ip'], created=row['first_seen']))
+        if len(chunk) == chunk_size:
+            Visitor.objects.bulk_create(chunk, ignore_conflicts=True)
+            chunk = []
+    Visitor.objects.bulk_create(chunk, ignore_conflicts=True)
+    return Visitor.objects.count() - count
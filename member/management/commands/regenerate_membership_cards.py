@@ -0,0 +1,171 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+import json
+from multiprocessing import get_context
+import os
+from pathlib import Path
+from tempfile import gettempdir
+import time
+from typing import Iterator
+
+from django.core.files.storage import Storage
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import QuerySet
+
+from main import constants
+from main.card_renderer import MembershipCardData
+from main.image_worker import generateMembershipCard, initializeWorker
+from main.utils import writeFileAtomically
+from member.models import Membership, Person, membershipImagesDir
+from parameter.service import getParameterValue
+
+DEFAULT_CHECKPOINT: Path = Path(gettempdir()) / 'regenerate_membership_cards.json'
+
+
+def getExpireDate(issue_date: date, years: int) -> date:
+    try:
+        return issue_date.replace(year=issue_date.year + years)
+    except ValueError:
+        # Issued on the 29th of February
+        return issue_date.replace(year=issue_date.year + years, day=28)
+
+
+def getCardData(person: Person, membership: Membership) -> MembershipCardData:
+    return MembershipCardData(
+        person.name_ar,
+        person.name_en,
+        person.address.getCityAr if person.address else '',
+        person.address.city if person.address else '',
+        membership.getMembershipType,
+        membership.getMembershipTypeEnglish,
+        str(membership.issue_date),
+        str(membership.expire_date),
+        membership.card_number,
+    )
+
+
+def writeCardFile(storage: Storage, data: bytes) -> str:
+    """
+    Writes the card under a new name, returns the stored name.
+    """
+    name: str = storage.get_available_name(membershipImagesDir(None, 'membership.jpg'))
+    writeFileAtomically(storage, name, data)
+    return name
+
+
+def batched(persons: Iterator[Person], size: int) -> Iterator[list[Person]]:
+    while batch := list(islice(persons, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ("Regenerates the membership cards, e.g. after the card template, "
+            + "the fonts or the membership expire period changed.")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Number of rendering processes, 0 to render in this one.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Number of cards written and saved together.")
+        parser.add_argument('--update-expire-date', action='store_true',
+                            help="Recomputes the expire dates from the issue dates "
+                            + "and the MEMBERSHIP_EXPIRE_PERIOD parameter.")
+        parser.add_argument('--resume', action='store_true',
+                            help="Continues after the last member of an interrupted run.")
+        parser.add_argument('--checkpoint', type=Path, default=DEFAULT_CHECKPOINT,
+                            help="File keeping the last regenerated member.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Counts the cards to regenerate without rendering them.")
+
+    def handle(self, *args, **options) -> None:
+        checkpoint: Path = options['checkpoint']
+        last_person_id: int = 0
+        if options['resume'] and checkpoint.is_file():
+            last_person_id = json.loads(checkpoint.read_text())['last_person_id']
+            self.stdout.write(f"Resuming after the member {last_person_id}.")
+
+        persons: QuerySet[Person] = Person.objects.filter(
+            membership__isnull=False, id__gt=last_person_id).exclude(
+            photograph__isnull=True).exclude(photograph='').select_related(
+            'membership', 'address').order_by('id')
+        total: int = persons.count()
+        if options['dry_run']:
+            self.stdout.write(f"{total} membership cards would be regenerated.")
+            return
+
+        expire_period: int | None = None
+        fields: list[str] = ['membership_card']
+        if options['update_expire_date']:
+            expire_period = getParameterValue(
+                constants.PARAMETERS.MEMBERSHIP_EXPIRE_PERIOD)
+            fields.append('expire_date')
+
+        executor: ProcessPoolExecutor | None = None
+        if options['workers'] > 0:
+            # Spawned, as the image pool of the web workers
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=get_context('spawn'),
+                initializer=initializeWorker)
+
+        storage: Storage = Membership._meta.get_field('membership_card').storage
+        done: int = 0
+        failed: list[int] = []
+        start: float = time.perf_counter()
+        try:
+            for batch in batched(persons.iterator(chunk_size=options['batch_size']),
+                                 options['batch_size']):
+                jobs: list[tuple[Person, bytes, MembershipCardData]] = []
+                for person in batch:
+                    membership: Membership = person.membership
+                    if expire_period is not None:
+                        membership.expire_date = getExpireDate(
+                            membership.issue_date, expire_period)
+                    try:
+                        with person.photograph.open('rb') as photograph:
+                            jobs.append((person, photograph.read(),
+                                         getCardData(person, membership)))
+                    except OSError as error:
+                        failed.append(person.id)
+                        self.stderr.write(f"The photograph of the member {person.id} "
+                                          + f"was not read: {error}")
+                futures: list[Future] = [
+                    executor.submit(generateMembershipCard, data, card)
+                    for _, data, card in jobs] if executor else []
+
+                memberships: list[Membership] = []
+                replaced: list[str] = []
+                for i, (person, data, card) in enumerate(jobs):
+                    try:
+                        image: bytes = futures[i].result() if executor \
+                            else generateMembershipCard(data, card)
+                    except Exception as error:
+                        failed.append(person.id)
+                        self.stderr.write(f"The card of the member {person.id} "
+                                          + f"was not generated: {error}")
+                        continue
+                    membership = person.membership
+                    if membership.membership_card:
+                        replaced.append(membership.membership_card.name)
+                    membership.membership_card.name = writeCardFile(storage, image)
+                    memberships.append(membership)
+
+                Membership.objects.bulk_update(memberships, fields)
+                # The previous cards are deleted only once nothing uses them
+                for name in replaced:
+                    storage.delete(name)
+
+                done += len(batch)
+                checkpoint.write_text(json.dumps({'last_person_id': batch[-1].id}))
+                elapsed: float = time.perf_counter() - start
+                self.stdout.write(f"{done}/{total} cards, {len(failed)} failed, "
+                                  + f"{done / elapsed:.1f} cards/s")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        checkpoint.unlink(missing_ok=True)
+        if failed:
+            self.stdout.write("Failed members: " + ", ".join(map(str, failed)))
+        self.stdout.write(self.style.SUCCESS(
+            f"Regenerated {done - len(failed)} membership cards."))
@@ -19,7 +19,8 @@ from PIL import Image as Img
 from PIL.Image import Image
 
 from main import constants
-from main.image_processing import ImageProcessingError, ImageProcessor
+from main.image_pool import validatePhotograph
+from main.image_processing import ImageProcessingError
 from main.models import BaseModel
 from parameter.service import getParameterValue
 
@@ -259,8 +260,7 @@ class Person(BaseModel):
                     image_io.getvalue(), "no_image.jpg")
         else:
             try:
-                image_io: bytes = ImageProcessor.validateAndResizePhotograph(
-                    self.photograph)
+                image_io: bytes = validatePhotograph(self.photograph)
                 self.photograph = ContentFile(image_io, self.photograph.name)
             except ImageProcessingError as error:
                 raise ValidationError(str(error))
@@ -1,20 +1,26 @@
 from django.core.files.base import ContentFile
-from io import BytesIO
+from io import BytesIO, StringIO
 import os
 from PIL import Image
+from tempfile import TemporaryDirectory
+from typing import Any
 
 from django.conf import settings
 from django.contrib.admin.sites import AdminSite
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, User
 from django.contrib.messages.storage.fallback import FallbackStorage
-from django.test import TestCase, Client, RequestFactory
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (TestCase, TransactionTestCase, Client, RequestFactory,
+                         override_settings)
 from django.http import HttpResponse, HttpRequest, Http404
 from django.urls import reverse, resolve
 from django.utils import timezone
 from django.utils.timezone import datetime, timedelta
 
 from main import constants
+from main.background import getAuditEntryWriter
 from main.models import AuditEntry
 from main.utils import getClientIp
 
@@ -28,6 +34,7 @@ from .models import (Academic, Address, Membership,
                      FamilyMembers, FamilyMembersWife,
                      FamilyMembersChild, Person)
 from . import views
+from .management.commands.regenerate_membership_cards import getExpireDate, writeCardFile
 
 
 class AcademicAdminTest(TestCase):
@@ -999,7 +1006,7 @@ class TestViews(TestCase):
             username='testuser',
             password='testpassword'
         )
-        group = Group.objects.get(name=constants.GROUPS.MANAGER)
+        group = Group.objects.get(name=constants.GROUPS.MEMBERS)
         self.user.groups.add(group)
 
     def test_dashboard_list_view(self):
@@ -1150,18 +1157,14 @@ class TestViews(TestCase):
             response, constants.TEMPLATES.MEMBER_FORM_TEMPLATE)
 
     def test_thank_you_view_success(self):
-        AuditEntry.objects.create(
-            ip=self.test_ip,
-            user_agent=self.user_agent,
-            action=constants.ACTION.MEMBER_FORM_POST,
-            username=self.user,
-            created=timezone.now()
-        )
+        cache.set(views.MEMBER_FORM_POSTED_KEY % self.test_ip, True)
+        self.addCleanup(cache.delete, views.MEMBER_FORM_POSTED_KEY % self.test_ip)
         request: HttpRequest = self.factory.get('/')
         response: HttpResponse = views.thankYou(request)
         self.assertEqual(response.status_code, 200)
 
     def test_thank_you_view_failed(self):
+        cache.delete(views.MEMBER_FORM_POSTED_KEY % self.test_ip)
         request: HttpRequest = self.factory.get('/')
         response: HttpResponse = views.thankYou(request)
         response.client = self.client
@@ -1176,3 +1179,106 @@ class TestViews(TestCase):
         except AttributeError:
             pass
         return super().tearDown()
+
+
+class MemberFormPostTest(TransactionTestCase):
+
+    def setUp(self):
+        self.test_ip: str = "123.123.123.124"
+        image_io: BytesIO = BytesIO()
+        Image.new('RGB', (600, 400), 'white').save(image_io, format="JPEG")
+        self.image: bytes = image_io.getvalue()
+        self.data: dict[str, Any] = {
+            'name_ar': 'ساره عبدالله',
+            'name_en': 'Sarah Abdullah',
+            'gender': constants.GENDER.FEMALE,
+            'place_of_birth': 'اليمن',
+            'date_of_birth': '1970-01-01',
+            'country_code1': '62',
+            'call_number': '08123456789',
+            'country_code2': '62',
+            'whatsapp_number': '08123456789',
+            'email': 'sarah@example.com',
+            'job_title': constants.JOB_TITLE.STUDENT,
+            'period_of_residence': constants.PERIOD_OF_RESIDENCE.TWO_YEARS_TO_THREE_YEARS,
+            'academic_qualification': '1',
+            'school': 'Yemeni University',
+            'major': 'IT',
+            'semester': 4,
+            'street_address': '123 Main St.',
+            'district': 'Downtown',
+            'city': 'Surabaya',
+            'province': 'Province1',
+            'postal_code': '12345',
+            'family_name': 'آل ..',
+            'member_count': 3,
+        }
+        cache.delete_pattern("*%s*" % self.test_ip)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=False)
+    def test_thank_you_shown_before_audit_entry_inserted(self):
+        # The queued entries are inserted before the test database is gone
+        self.addCleanup(getAuditEntryWriter().shutdown)
+        data: dict[str, Any] = dict(
+            self.data,
+            passport_photo=ContentFile(self.image, "passport.jpg"),
+            residency_photo=ContentFile(self.image, "residency.jpg"))
+        response: HttpResponse = Client(REMOTE_ADDR=self.test_ip).post(
+            reverse(constants.PAGES.MEMBER_FORM_PAGE), data, follow=True)
+        self.assertTemplateUsed(response, constants.TEMPLATES.THANK_YOU_TEMPLATE)
+
+    def tearDown(self) -> None:
+        for person in Person.objects.all():
+            person.delete()
+        cache.delete_pattern("*%s*" % self.test_ip)
+        return super().tearDown()
+
+
+class RegenerateMembershipCardsTest(TestCase):
+    def setUp(self):
+        for i, photograph in enumerate(('photographs/1.jpg', '')):
+            Person.objects.create(
+                name_ar='أحمد',
+                name_en='Ahmed',
+                gender=constants.GENDER.MALE,
+                job_title='1',
+                period_of_residence='1',
+                date_of_birth='1970-01-01',
+                photograph=photograph,
+                membership=Membership.objects.create(
+                    membership_type='1',
+                    card_number=f'1357{i}',
+                    expire_date='2024-02-29'),
+            )
+
+    def test_dry_run_counts_members_with_photograph(self):
+        output = StringIO()
+        call_command('regenerate_membership_cards', '--dry-run',
+                     '--checkpoint', os.devnull, stdout=output)
+        self.assertIn("1 membership cards would be regenerated.",
+                      output.getvalue())
+
+    def test_missing_photograph_does_not_stop_the_run(self):
+        person: Person = Person.objects.exclude(photograph='').get()
+        output = StringIO()
+        with TemporaryDirectory() as directory:
+            call_command('regenerate_membership_cards', '--workers', '0',
+                         '--checkpoint', os.path.join(directory, 'checkpoint.json'),
+                         stdout=output, stderr=StringIO())
+        self.assertIn(f"Failed members: {person.id}", output.getvalue())
+        self.assertIn("Regenerated 0 membership cards.", output.getvalue())
+
+    def test_expire_date_of_leap_day(self):
+        self.assertEqual(getExpireDate(datetime(2024, 2, 29).date(), 1),
+                         datetime(2025, 2, 28).date())
+        self.assertEqual(getExpireDate(datetime(2024, 2, 29).date(), 4),
+                         datetime(2028, 2, 29).date())
+
+    def test_card_file_written_whole(self):
+        storage = Membership._meta.get_field('membership_card').storage
+        name: str = writeCardFile(storage, b'card')
+        self.addCleanup(storage.delete, name)
+        with storage.open(name) as card:
+            self.assertEqual(card.read(), b'card')
+        self.assertEqual([file for file in os.listdir(os.path.dirname(
+            storage.path(name))) if file.endswith('.tmp')], [])
@@ -23,7 +23,7 @@ from main import messages as MSG
 from main.image_processing import ImageProcessor, ImageProcessingError
 from main.models import AuditEntry
 from parameter.service import getParameterValue
-from main.utils import (Pagination, getClientIp, getUserAgent,
+from main.utils import (KeysetPage, Pagination, getClientIp, getUserAgent,
                         exportAsCsvExcel, logUserActivity, sendEmail)
 
 from .models import (Academic, Address, Membership,
@@ -33,6 +33,10 @@ from .forms import (AddPersonForm, AcademicForm,
                     AddressForm, FamilyMembersForm)
 from .filters import PersonFilter
 
+# Set by a posted member form, the thank you page is shown for 5 minutes
+MEMBER_FORM_POSTED_KEY: str = "MEMBER_FORM_POSTED:%s"
+MEMBER_FORM_THANK_YOU_SECONDS: int = 5 * 60
+
 
 def staffDashboard(request: HttpRequest) -> HttpResponse:
     if request.user.is_superuser:
@@ -61,9 +65,9 @@ def membersPage(request: HttpRequest, currentPage: str) -> HttpResponse:
     personFilter: PersonFilter = PersonFilter(request.GET, queryset=queryset)
     queryset = personFilter.qs
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1)
-    page_obj: QuerySet[Person] = pagination.getPageObject()
+    pagination = Pagination(queryset, keyset=True,
+                            cursor=request.GET.get('cursor'), ordering=('id',))
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
 
     if request.method == constants.POST_METHOD:
@@ -283,10 +287,14 @@ def memberFormPage(request: HttpRequest) -> HttpResponse:
                     age=age
                 )
 
-            AuditEntry.create(ip=getClientIp(request),
-                              user_agent=getUserAgent(request),
-                              action=constants.ACTION.MEMBER_FORM_POST,
-                              username=request.user)
+            AuditEntry.createInBackground(ip=getClientIp(request),
+                                          user_agent=getUserAgent(request),
+                                          action=constants.ACTION.MEMBER_FORM_POST,
+                                          username=request.user)
+
+            # The audit entry is inserted later, the thank you page reads this
+            cache.set(MEMBER_FORM_POSTED_KEY % getClientIp(request), True,
+                      MEMBER_FORM_THANK_YOU_SECONDS)
 
             MEMBER_POST_COUNT_CACHED_KEY: str = "MEMBER_FORM:%s" % getClientIp(
                 request)
@@ -488,14 +496,7 @@ def detailMember(request: HttpRequest, pk: str) -> HttpResponse:
 
 
 def thankYou(request: HttpRequest) -> HttpResponse:
-    try:
-        AuditEntry.get(
-            ip=getClientIp(request),
-            action=constants.ACTION.MEMBER_FORM_POST,
-            created__range=(timezone.now() - timezone.timedelta(minutes=5),
-                            timezone.now())
-        )
-    except AuditEntry.DoesNotExist:
+    if not cache.get(MEMBER_FORM_POSTED_KEY % getClientIp(request)):
         return redirect(constants.PAGES.INDEX_PAGE)
     return render(request, constants.TEMPLATES.THANK_YOU_TEMPLATE,)
 
@@ -13,9 +13,29 @@ urlpatterns = [
         views.activityLogPage,
         name=PAGES.ACTIVITY_LOG_PAGE
     ),
+    path(
+        'Monitor/Activity-Log/Export/',
+        views.exportActivityLogPage,
+        name=PAGES.EXPORT_ACTIVITY_LOG_PAGE
+    ),
     path(
         'Monitor/Block-List/',
         views.blockListPage,
         name=PAGES.BLOCK_LIST_PAGE
     ),
+    path(
+        'Monitor/Block-List/Import/',
+        views.importBlockListPage,
+        name=PAGES.IMPORT_BLOCK_LIST_PAGE
+    ),
+    path(
+        'Monitor/Block-List/Export/',
+        views.exportBlockListPage,
+        name=PAGES.EXPORT_BLOCK_LIST_PAGE
+    ),
+    path(
+        'Monitor/Profiling/',
+        views.profilingPage,
+        name=PAGES.PROFILING_PAGE
+    ),
 ]
@@ -1,87 +1,127 @@
+from datetime import date
 from typing import Any
 
-from django.core.cache import cache
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models.query import QuerySet, Q
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import render
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
 from django.utils import timezone
 
 from main import constants
-from main.models import AuditEntry, BlockedClient
-from main.utils import Pagination
+from main import messages as MSG
+from main.audit import countAuditEntries, getAuditSeries
+from main.audit_export import (PARQUET_FORMAT, isParquetAvailable, iterAuditRows,
+                               streamCsv, streamParquet)
+from main.blocklist import (BlocklistChange, exportBlocklist, importBlocklist,
+                            removeFromBlocklist)
+from main.models import AuditEntry, BlockedClient, BlockedNetwork
+from main.profiling import getProfileSummary
+from main.security_events import SECURITY_EVENTS_PATH
+from main.utils import KeysetPage, Pagination
+from main.visitors import countUniqueVisitors
+
+# The longest chart range shown by day
+MAX_DAILY_CHART_DAYS: int = 62
 
 
 def monitorPage(request: HttpRequest) -> HttpResponse:
-    context: dict[str, Any] | None = cache.get("CACHED_PAGE_CONTEXT:MONITOR")
-    if context:
-        return render(request, constants.TEMPLATES.MONITOR_PAGE_TEMPLATE, context)
-
-    months_filter: list[str] = []
-    months_labels: list[str] = []
-
-    submit_form_data: list[str] = []
-    first_visits_data: list[str] = []
-
-    year: int = timezone.datetime.now().year
-    temp: timezone.datetime = None
-    for i in range(6):
-        temp = timezone.datetime.now() - timezone.timedelta(days=30 * i)
-        months_filter.append(
-            (str(year) + '-' + str(temp.month).rjust(2, '0') + '-'))
-        months_labels.append(constants.MONTHS_AR[temp.month - 1])
-
-        if temp.month == 1:
-            year -= 1
-
-    months_filter.reverse()
-    months_labels.reverse()
-
-    for month_filter in months_filter:
-        submit_form_data.append(AuditEntry.countFiltered(
-            created__contains=month_filter,
-            action=constants.ACTION.MEMBER_FORM_POST))
-        first_visits_data.append(AuditEntry.countFiltered(
-            created__contains=month_filter,
-            action=constants.ACTION.FIRST_VISIT))
-
-    sus_count: int = AuditEntry.countFiltered(
-        action__in=[
-            constants.ACTION.SUSPICIOUS_POST,
-            constants.ACTION.ATTACK_ATTEMPT
-        ]
-    )
+    start: date | None = _parseDate(request.GET.get('from'))
+    end: date | None = _parseDate(request.GET.get('to'))
+    if start and end and start > end:
+        start, end = end, start
+    context: dict[str, Any] = getMonitorContext(start, end)
+    # The stream is served by the ASGI application only
+    if isinstance(request, ASGIRequest):
+        context['security_events_url'] = SECURITY_EVENTS_PATH
+    return render(request, constants.TEMPLATES.MONITOR_PAGE_TEMPLATE, context)
+
 
-    failed_login_attempt_count: int = AuditEntry.countFiltered(
-        action=constants.ACTION.LOGGED_FAILED,
-        created__gt=timezone.datetime.now() - timezone.timedelta(days=30)
+def _parseDate(value: str | None) -> date | None:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _getChartPeriods(start: date, end: date, monthly: bool) -> list[date]:
+    if not monthly:
+        return [start + timezone.timedelta(days=i)
+                for i in range((end - start).days + 1)]
+
+    periods: list[date] = []
+    period: date = start.replace(day=1)
+    while period <= end:
+        periods.append(period)
+        period = (period + timezone.timedelta(days=32)).replace(day=1)
+    return periods
+
+
+def getMonitorContext(start: date | None = None, end: date | None = None) -> dict[str, Any]:
+    """
+    Computes the context of the monitor page from the daily audit rollups.
+    The charts cover the last six months by default, by day if the range is
+    two months or less and by month otherwise.
+    """
+    today: date = timezone.now().date()
+    end = end or today
+    if start is None:
+        month: int = end.year * 12 + end.month - 1 - 5
+        start = date(month // 12, month % 12 + 1, 1)
+
+    monthly: bool = (end - start).days > MAX_DAILY_CHART_DAYS
+    periods: list[date] = _getChartPeriods(start, end, monthly)
+    if not monthly:
+        chart_labels: list[str] = [period.isoformat() for period in periods]
+    elif start.year == end.year:
+        chart_labels = [constants.MONTHS_AR[period.month - 1]
+                        for period in periods]
+    else:
+        chart_labels = [f'{constants.MONTHS_AR[period.month - 1]} {period.year}'
+                        for period in periods]
+
+    submit_forms: dict[date, int] = getAuditSeries(
+        constants.ACTION.MEMBER_FORM_POST, start, end, monthly)
+    first_visits: dict[date, int] = getAuditSeries(
+        constants.ACTION.FIRST_VISIT, start, end, monthly)
+
+    sus_count: int = countAuditEntries([
+        constants.ACTION.SUSPICIOUS_POST,
+        constants.ACTION.ATTACK_ATTEMPT
+    ])
+
+    failed_login_attempt_count: int = countAuditEntries(
+        [constants.ACTION.LOGGED_FAILED],
+        start=today - timezone.timedelta(days=29)
     )
 
     blocked_devices_count: int = BlockedClient.countFiltered(
         ~Q(block_type=constants.BLOCK_TYPES.UNBLOCKED)
     )
 
-    context = {
+    return {
+        'unique_visitors_today': countUniqueVisitors(today, today),
+        'unique_visitors_month': countUniqueVisitors(
+            today - timezone.timedelta(days=29), today),
         'sus_count': sus_count,
-        'months_labels': months_labels,
-        'submit_form_data': submit_form_data,
-        'first_visits_data': first_visits_data,
+        'chart_start': start,
+        'chart_end': end,
+        'months_labels': chart_labels,
+        'submit_form_data': [submit_forms.get(period, 0) for period in periods],
+        'first_visits_data': [first_visits.get(period, 0) for period in periods],
         'failed_login_attempt_count': failed_login_attempt_count,
         'blocked_devices_count': blocked_devices_count,
     }
 
-    cache.set("CACHED_PAGE_CONTEXT:MONITOR", context,
-              constants.DEFAULT_CACHE_EXPIRE)
-    return render(request, constants.TEMPLATES.MONITOR_PAGE_TEMPLATE, context)
-
 
 def activityLogPage(request: HttpRequest) -> HttpResponse:
-    queryset: QuerySet[AuditEntry] = AuditEntry.filter(
+    queryset: QuerySet[AuditEntry] = AuditEntry.getRecent(
+        timezone.timedelta(days=30),
         ~Q(action__in=[
             constants.ACTION.NORMAL_POST,
             constants.ACTION.ATTACK_ATTEMPT,
             constants.ACTION.SUSPICIOUS_POST
-        ]),
-        created__gt=timezone.datetime.now() - timezone.timedelta(days=30)
+        ])
     ) | AuditEntry.filter(
         action__in=[
             constants.ACTION.ATTACK_ATTEMPT,
@@ -96,10 +136,10 @@ def activityLogPage(request: HttpRequest) -> HttpResponse:
         else:
             queryset = queryset.filter(action=activity_filter)
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1,
-                            paginate_by=15)
-    page_obj: QuerySet[AuditEntry] = pagination.getPageObject()
+    pagination = Pagination(queryset, paginate_by=15, keyset=True,
+                            cursor=request.GET.get('cursor'),
+                            approximate_count=True)
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
 
     activities: dict[str, str] = {
@@ -111,19 +151,84 @@ def activityLogPage(request: HttpRequest) -> HttpResponse:
     del activities['9']
 
     context: dict[str, Any] = {'activities': activities, 'page_obj': page_obj,
-                               'is_paginated': is_paginated}
+                               'is_paginated': is_paginated,
+                               'all_activities': {
+                                   k: constants.ACTION_STR_AR[int(k)]
+                                   for k in constants.ACTION},
+                               'is_parquet_available': isParquetAvailable()}
     return render(request, constants.TEMPLATES.ACTIVITY_LOG_PAGE_TEMPLATE, context)
 
 
+def exportActivityLogPage(request: HttpRequest) -> HttpResponse:
+    export_format: str = request.GET.get('format')
+    if export_format == PARQUET_FORMAT and not isParquetAvailable():
+        MSG.PARQUET_UNAVAILABLE(request)
+        return redirect(constants.PAGES.ACTIVITY_LOG_PAGE)
+
+    start: date | None = _parseDate(request.GET.get('from'))
+    end: date | None = _parseDate(request.GET.get('to'))
+    actions: list[str] = [action for action in request.GET.getlist('action')
+                          if action in constants.ACTION]
+    chunks = iterAuditRows(start, end, actions,
+                           archived=request.GET.get('archived') == '1')
+
+    file_name: str = f"audit-log-{start or 'all'}-{end or timezone.now().date()}"
+    if export_format == PARQUET_FORMAT:
+        response = StreamingHttpResponse(
+            streamParquet(chunks), content_type='application/vnd.apache.parquet')
+        file_name += '.parquet'
+    else:
+        response = StreamingHttpResponse(
+            streamCsv(chunks), content_type='application/gzip')
+        file_name += '.csv.gz'
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
+
+
 def blockListPage(request: HttpRequest) -> HttpResponse:
     queryset: QuerySet[AuditEntry] = BlockedClient.getAllOrdered(
         'created', reverse=True)
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1,
-                            paginate_by=15)
-    page_obj: QuerySet[AuditEntry] = pagination.getPageObject()
+    pagination = Pagination(queryset, paginate_by=15, keyset=True,
+                            cursor=request.GET.get('cursor'),
+                            approximate_count=True)
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
 
     context: dict[str, Any] = {
-        'page_obj': page_obj, 'is_paginated': is_paginated}
+        'page_obj': page_obj, 'is_paginated': is_paginated,
+        'networks': BlockedNetwork.getAllOrdered('network')}
     return render(request, constants.TEMPLATES.BLOCK_LIST_PAGE_TEMPLATE, context)
+
+
+def importBlockListPage(request: HttpRequest) -> HttpResponse:
+    if request.method == constants.POST_METHOD:
+        text: str = request.POST.get('blocklist', '')
+        if 'blocklist_file' in request.FILES:
+            text += '\n' + request.FILES['blocklist_file'].read().decode(
+                'utf-8', errors='replace')
+
+        if request.POST.get('action') == 'unblock':
+            change: BlocklistChange = removeFromBlocklist(text)
+            MSG.BLOCK_LIST_REMOVED(request, change.ips, change.networks)
+        else:
+            change = importBlocklist(text, request.POST.get('note') or None)
+            MSG.BLOCK_LIST_IMPORTED(request, change.ips, change.networks)
+        if change.invalid:
+            MSG.INVALID_BLOCK_LIST_LINES(request, change.invalid)
+    return redirect(constants.PAGES.BLOCK_LIST_PAGE)
+
+
+def exportBlockListPage(request: HttpRequest) -> HttpResponse:
+    response: HttpResponse = HttpResponse(
+        exportBlocklist(), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = \
+        f'attachment; filename="blocklist-{timezone.now().date()}.txt"'
+    return response
+
+
+def profilingPage(request: HttpRequest) -> HttpResponse:
+    context: dict[str, Any] = {
+        'profiles': getProfileSummary(),
+        'is_profiling_enabled': settings.REQUEST_PROFILING,
+    }
+    return render(request, constants.TEMPLATES.PROFILING_PAGE_TEMPLATE, context)
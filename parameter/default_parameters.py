@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import cache
 import logging as logging
 
 from main.constants import ACCESS_TYPE, DATA_TYPE
@@ -69,15 +70,6 @@ def _getDefaultParam() -> list[_DefaultParameter]:
             parameter_type=DATA_TYPE.INTEGER
         )
     )
-    default_parameters.append(
-        _DefaultParameter(
-            name="MAGIC_NUMBER",
-            value="1",
-            description="DO NOT CHANGE THIS. THIS CONTROLLED BY THE SYSTEM ONLY.",
-            access_type=ACCESS_TYPE.No_ACCESS,
-            parameter_type=DATA_TYPE.INTEGER
-        )
-    )
     default_parameters.append(
         _DefaultParameter(
             name="MEMBERSHIP_EXPIRE_PERIOD",
@@ -169,6 +161,15 @@ def _getDefaultParam() -> list[_DefaultParameter]:
             parameter_type=DATA_TYPE.STRING
         )
     )
+    default_parameters.append(
+        _DefaultParameter(
+            name="PROFILING_SAMPLE_RATE",
+            value="0.1",
+            description="The fraction of the requests profiled when the request profiling is enabled, from 0 to 1.",
+            access_type=ACCESS_TYPE.ADMIN_ACCESS,
+            parameter_type=DATA_TYPE.FLOAT
+        )
+    )
     default_parameters.append(
         _DefaultParameter(
             name="TEST",
@@ -180,3 +181,8 @@ def _getDefaultParam() -> list[_DefaultParameter]:
     )
 
     return default_parameters
+
+
+@cache
+def _getDefaultParamIndex() -> dict[str, _DefaultParameter]:
+    return {pram.name: pram for pram in _getDefaultParam()}
@@ -22,6 +22,8 @@ class ImageParameter(BaseModel):
             '.' + self.content.name.split('.')[-1]
         super().save(*args, **kwargs)
         cache.set(f"IMAGE_PARAMETER:{self.pk}", self, None)
+        from .service import bumpParametersVersion
+        bumpParametersVersion()
 
 
 class Parameter(BaseModel):
@@ -147,3 +149,5 @@ class Parameter(BaseModel):
         super().save(*args, **kwargs)
         logger.info(f"Saving parameter '{self.name}' in cache")
         cache.set(self.name, self, None)
+        from .service import bumpParametersVersion
+        bumpParametersVersion()
@@ -1,18 +1,25 @@
 from dataclasses import asdict
 import logging as logging
 from logging import Logger
-from typing import Union
+from threading import Lock
+import time
+from typing import Final, Union
 
 from django.core.cache import cache
 
-from main.constants import DATA_TYPE, LOGGERS, DEFAULT_CACHE_EXPIRE
+from main.constants import CACHE, DATA_TYPE, LOGGERS, DEFAULT_CACHE_EXPIRE
 
 from .models import Parameter as _parameter
 from .models import ImageParameter as _ImageParameter
-from .default_parameters import _getDefaultParam
+from .default_parameters import _DefaultParameter, _getDefaultParam, _getDefaultParamIndex
 
 logger: Logger = logging.getLogger(LOGGERS.PARAMETER)
 
+ParameterValue = Union[str, int, float, bool]
+
+# How often a process compares its parameters with the shared version
+_VERSION_CHECK_INTERVAL: Final[float] = 1
+
 
 def _saveDefaultParametersToDataBase() -> None:
     # This executed when a parameter added after migrate
@@ -26,91 +33,137 @@ def _saveDefaultParametersToDataBase() -> None:
             _parameter.create(**asdict(pram))
 
 
-def getParameterValue(key: str) -> Union[str, int, float, bool]:
-    if not isinstance(key, str):
-        raise ValueError("The key must be a string.")
-    try:
-        param: _parameter | None = cache.get(key)
-        if not param:
-            logger.info(
-                f"Parameter '{key}' is not cached, trying to retrieve it form database")
-            param = _parameter.get(name=key)
-            cache.set(key, param, DEFAULT_CACHE_EXPIRE)
-        match param.getParameterType:
-            case DATA_TYPE.INTEGER:
-                value: int = int(param.getValue)
-                return value
-            case DATA_TYPE.FLOAT:
-                value: float = float(param.getValue)
-                return value
-            case DATA_TYPE.BOOLEAN:
-                val: str = param.getValue
-                true_con: tuple[bool, ...] = (
-                    val.lower() == 'yes',
-                    val.lower() == 'true',
-                    val == '1',
-                )
-                false_con: tuple[bool, ...] = (
-                    val.lower() == 'no',
-                    val.lower() == 'false',
-                    val == '0',
-                )
-                if any(true_con):
-                    return True
-                elif any(false_con):
-                    return False
-                else:
-                    raise ValueError("Non boolean value")
-            case DATA_TYPE.IMAGE_FILE:
-                val: str = param.getValue
-                if val == "None":
-                    return ""
-                img_url: _ImageParameter | None = cache.get(
-                    f'IMAGE_PARAMETER:{val}')
-                if not img_url:
-                    img_url = _ImageParameter.get(pk=int(val))
-                    cache.set(f'IMAGE_PARAMETER:{val}', img_url, None)
-                return img_url.content.url
-            case _:
-                return param.getValue
-    except _parameter.DoesNotExist:
-        if key != "TEST":
-            logger.warning(f"The parameter [{key}] "
-                           + "dose not exist in database!")
-        for pram in _getDefaultParam():
-            if key == pram.name:
-                match pram.parameter_type:
-                    case DATA_TYPE.INTEGER:
-                        value: int = int(pram.value)
-                        return value
-                    case DATA_TYPE.FLOAT:
-                        value: float = float(pram.value)
-                        return value
-                    case DATA_TYPE.BOOLEAN:
-                        val: str = pram.value
-                        true_con: tuple[bool, ...] = (
-                            val.lower() == 'yes',
-                            val.lower() == 'true',
-                            val == '1',
-                        )
-                        false_con: tuple[bool, ...] = (
-                            val.lower() == 'no',
-                            val.lower() == 'false',
-                            val == '0'
-                        )
-                        if any(true_con):
-                            return True
-                        elif any(false_con):
-                            return False
-                        else:
-                            raise ValueError
-                    case DATA_TYPE.IMAGE_FILE:
-                        if pram.value == "None":
-                            return ""
-                        img_url: _ImageParameter = _ImageParameter.get(
-                            pk=int(pram.value))
-                        return img_url.content.url
-                    case _:
-                        return pram.value
+def _getImageUrl(image_id: str) -> str:
+    img_url: _ImageParameter | None = cache.get(f'IMAGE_PARAMETER:{image_id}')
+    if not img_url:
+        img_url = _ImageParameter.get(pk=int(image_id))
+        cache.set(f'IMAGE_PARAMETER:{image_id}', img_url, None)
+    return img_url.content.url
+
+
+def _coerceValue(value: str, parameter_type: str) -> ParameterValue:
+    match parameter_type:
+        case DATA_TYPE.INTEGER:
+            return int(value)
+        case DATA_TYPE.FLOAT:
+            return float(value)
+        case DATA_TYPE.BOOLEAN:
+            if value.lower() in ('yes', 'true') or value == '1':
+                return True
+            elif value.lower() in ('no', 'false') or value == '0':
+                return False
+            else:
+                raise ValueError("Non boolean value")
+        case DATA_TYPE.IMAGE_FILE:
+            if value == "None":
+                return ""
+            return _getImageUrl(value)
+        case _:
+            return value
+
+
+def preloadParameters() -> dict[str, _parameter]:
+    """
+    Loads all the parameters and the image parameters from the database
+    and caches them with one `set_many` each.
+    """
+    images: dict[str, _ImageParameter] = {
+        f'IMAGE_PARAMETER:{image.pk}': image
+        for image in _ImageParameter.objects.all()
+    }
+    if images:
+        cache.set_many(images, None)
+
+    params: dict[str, _parameter] = {
+        param.name: param for param in _parameter.objects.all()
+    }
+    if params:
+        cache.set_many(params, DEFAULT_CACHE_EXPIRE)
+    logger.info(f"Preloaded {len(params)} parameters and "
+                + f"{len(images)} image parameters.")
+    return params
+
+
+def _loadParameterValue(key: str) -> ParameterValue:
+    param: _parameter | None = cache.get(key)
+    if not param:
+        logger.info(
+            f"Parameter '{key}' is not cached, retrieving all the parameters form database")
+        param = preloadParameters().get(key)
+    if param:
+        return _coerceValue(param.getValue, param.getParameterType)
+
+    if key != "TEST":
+        logger.warning(f"The parameter [{key}] "
+                       + "dose not exist in database!")
+    pram: _DefaultParameter | None = _getDefaultParamIndex().get(key)
+    if pram is None:
         raise KeyError("The parameter does not exist in the database "
                        + "nor the default parameters.")
+    return _coerceValue(pram.value, pram.parameter_type)
+
+
+class ParameterRegistry:
+    """
+    The coerced values of the parameters in this process. Saving a
+    parameter bumps `CACHE.PARAMETERS_VERSION`, every process compares it
+    with the version of its values at most once per
+    `_VERSION_CHECK_INTERVAL` seconds and drops them when it changed.
+    """
+
+    def __init__(self) -> None:
+        self.values: dict[str, ParameterValue] = {}
+        self.version: int | None = None
+        self.checked_at: float = 0
+        self.lock: Lock = Lock()
+
+    def get(self, key: str) -> ParameterValue:
+        self._checkVersion()
+        # A value loaded while the values are invalidated goes to the
+        # dropped dictionary
+        values: dict[str, ParameterValue] = self.values
+        try:
+            return values[key]
+        except KeyError:
+            value: ParameterValue = _loadParameterValue(key)
+            values[key] = value
+            return value
+
+    def invalidate(self) -> None:
+        self.values = {}
+
+    def _checkVersion(self) -> None:
+        now: float = time.monotonic()
+        if now - self.checked_at < _VERSION_CHECK_INTERVAL:
+            return
+        with self.lock:
+            if now - self.checked_at < _VERSION_CHECK_INTERVAL:
+                return
+            version: int | None = cache.get(CACHE.PARAMETERS_VERSION)
+            if version != self.version:
+                self.invalidate()
+                self.version = version
+            self.checked_at = now
+
+
+_parameter_registry: ParameterRegistry = ParameterRegistry()
+
+
+def getParameterRegistry() -> ParameterRegistry:
+    return _parameter_registry
+
+
+def bumpParametersVersion() -> None:
+    """
+    Invalidates the parameters of this process and of the other processes
+    on their next version check.
+    """
+    if not cache.add(CACHE.PARAMETERS_VERSION, 1, None):
+        cache.incr(CACHE.PARAMETERS_VERSION)
+    _parameter_registry.invalidate()
+
+
+def getParameterValue(key: str) -> ParameterValue:
+    if not isinstance(key, str):
+        raise ValueError("The key must be a string.")
+    return _parameter_registry.get(key)
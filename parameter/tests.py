@@ -2,6 +2,7 @@ from django.contrib.admin import site
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
 from django.test import RequestFactory, TestCase, Client
 from django.urls import reverse
 
@@ -9,7 +10,7 @@ from main import constants
 
 from .admin import ParameterAdmin
 from .models import Parameter
-from .service import getParameterValue
+from .service import ParameterRegistry, getParameterValue, preloadParameters
 
 
 class TestInitialization(TestCase):
@@ -158,3 +159,48 @@ class TestParameter(TestCase):
     def test_non_existing_param_in_database_but_exists_in_default_param(self) -> None:
         self.assertEquals(getParameterValue("TEST"), "TEST_PARAMETER")
         self.assertIsInstance(getParameterValue("TEST"), str)
+
+
+class TestParameterRegistry(TestCase):
+
+    def setUp(self) -> None:
+        self.param: Parameter = Parameter.objects.create(
+            name="TEST_PARAM_REGISTRY",
+            value="5",
+            parameter_type=constants.DATA_TYPE.INTEGER,
+        )
+        self.registry = ParameterRegistry()
+
+    def test_value_read_from_process(self) -> None:
+        self.assertEquals(self.registry.get("TEST_PARAM_REGISTRY"), 5)
+        cache.delete("TEST_PARAM_REGISTRY")
+        Parameter.objects.filter(pk=self.param.pk).update(value="6")
+        self.assertEquals(self.registry.get("TEST_PARAM_REGISTRY"), 5)
+
+    def test_version_bump_invalidates_values(self) -> None:
+        self.assertEquals(self.registry.get("TEST_PARAM_REGISTRY"), 5)
+        # Saved by another process
+        self.param.value = "6"
+        self.param.save()
+        self.registry.checked_at = 0
+        self.assertEquals(self.registry.get("TEST_PARAM_REGISTRY"), 6)
+        self.assertEquals(getParameterValue("TEST_PARAM_REGISTRY"), 6)
+
+
+class TestPreloadParameters(TestCase):
+
+    def test_all_parameters_cached_with_one_query(self) -> None:
+        cache.clear()
+        with self.assertNumQueries(2):
+            params = preloadParameters()
+        self.assertIn("TIME_OUT_PERIOD", params)
+        self.assertEquals(cache.get("TIME_OUT_PERIOD").value,
+                          params["TIME_OUT_PERIOD"].value)
+
+    def test_missing_parameter_loads_all_parameters(self) -> None:
+        cache.clear()
+        registry = ParameterRegistry()
+        with self.assertNumQueries(2):
+            registry.get("TIME_OUT_PERIOD")
+        with self.assertNumQueries(0):
+            registry.get("ALLOWED_LOGGED_IN_ATTEMPTS")
@@ -17,7 +17,7 @@ from dateutil.relativedelta import relativedelta
 
 from main import constants
 from main import messages as MSG
-from main.utils import Pagination, sendEmail, logUserActivity
+from main.utils import KeysetPage, Pagination, sendEmail, logUserActivity
 from accounting.models import Account, Bond
 from member.models import Person, Membership
 from parameter.service import getParameterValue
@@ -189,9 +189,10 @@ def membershipPaymentListPage(request: HttpRequest) -> HttpResponse:
         request.GET, queryset=queryset)
     queryset = paymentFilter.qs
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1)
-    page_obj: QuerySet[MembershipPayment] = pagination.getPageObject()
+    pagination = Pagination(queryset, keyset=True,
+                            cursor=request.GET.get('cursor'),
+                            ordering=('-updated', '-id'))
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
     context: dict[str, Any] = {'is_pending_list_empty': is_pending_list_empty, 'page_obj': page_obj,
                                'is_paginated': is_paginated, 'paymentFilter': paymentFilter}
@@ -302,9 +303,9 @@ def membershipPaymentPendingListPage(request: HttpRequest) -> HttpResponse:
         )
     ).order_by('-created')
 
-    page: str = request.GET.get('page')
-    pagination = Pagination(queryset, int(page) if page is not None else 1, 3)
-    page_obj: QuerySet[Person] = pagination.getPageObject()
+    pagination = Pagination(queryset, 3, keyset=True,
+                            cursor=request.GET.get('cursor'))
+    page_obj: KeysetPage = pagination.getPageObject()
     is_paginated: bool = pagination.isPaginated
     context: dict[str, Any] = {'page_obj': page_obj,
                                'is_paginated': is_paginated}
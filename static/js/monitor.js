@@ -53,5 +53,51 @@ function loadFirstVisitCanvas() {
     });
 }
 
+const SECURITY_EVENTS_AR = {
+    'block': 'حظر',
+    'unblock': 'إلغاء حظر',
+    'attack_attempt': 'محاولة هجوم',
+    'suspicious_post': 'طلبات مشتبهة',
+    'logged_failed': 'تسجيل دخول فاشل',
+};
+const MAX_SECURITY_EVENTS_ROWS = 100;
+
+function watchSecurityEvents() {
+    let table = document.getElementById('security-events');
+    // Only served under ASGI
+    if (!table) {
+        return;
+    }
+    let status = document.getElementById('security-events-status');
+    let opened = false;
+    // The browser reconnects by itself and sends the last event id
+    let source = new EventSource(table.getAttribute('data-url'));
+    source.onopen = function () {
+        opened = true;
+        status.textContent = 'متصل';
+        status.className = 'badge bg-success';
+    };
+    source.onerror = function () {
+        status.textContent = 'غير متصل';
+        status.className = 'badge bg-secondary';
+        // Never connected, the stream is not served
+        if (!opened) {
+            source.close();
+        }
+    };
+    source.onmessage = function (message) {
+        let event = JSON.parse(message.data);
+        let row = table.insertRow(0);
+        for (let value of [event.time, SECURITY_EVENTS_AR[event.type] || event.type,
+                           event.ip, event.username, event.detail]) {
+            row.insertCell().textContent = value;
+        }
+        if (table.rows.length > MAX_SECURITY_EVENTS_ROWS) {
+            table.deleteRow(-1);
+        }
+    };
+}
+
 document.addEventListener('DOMContentLoaded', loadMemberFormCanvas);
-document.addEventListener('DOMContentLoaded', loadFirstVisitCanvas);
\ No newline at end of file
+document.addEventListener('DOMContentLoaded', loadFirstVisitCanvas);
+document.addEventListener('DOMContentLoaded', watchSecurityEvents);
\ No newline at end of file